@@ -1,5 +1,13 @@
 import sqlite3
 from datetime import datetime
+from .metrics import DB_SECONDS, DB_ERRORS, timed
+from .tracing import traced
+
+
+def db_call(fn):
+    """Times fn in DB_SECONDS and traces it as a db.<name> span."""
+    return traced("db." + fn.__name__)(timed(DB_SECONDS, DB_ERRORS)(fn))
+
 
 class DatabaseManager:
     def __init__(self, db_file="database.db"):
@@ -11,6 +19,7 @@ class DatabaseManager:
 
         self.create_tables()
 
+    @db_call
     def create_tables(self):
         """Creates all necessary tables if they don't exist."""
         sql_script = """
@@ -88,6 +97,7 @@ class DatabaseManager:
         self.conn.commit()
 
     ### USER MANAGEMENT ###
+    @db_call
     def insert_user(self, email, full_name, name, password_hash=None, phone_number=None, dob=None, address=None, 
                 email_verified=False, profile_picture_url=None, google_id=None):
         """Inserts a new user into the database, supporting Google OAuth users."""
@@ -102,6 +112,7 @@ class DatabaseManager:
         except sqlite3.IntegrityError:
             print(f"User with email {email} already exists!")
 
+    @db_call
     def update_last_login(self, email, last_login_ip=None):
         """Updates the last login time and IP for a user."""
         self.cursor.execute("""
@@ -112,23 +123,27 @@ class DatabaseManager:
         self.conn.commit()
 
 
+    @db_call
     def user_exists(self, email):
         """Checks if a user exists in the database by email."""
         self.cursor.execute("SELECT COUNT(*) FROM users WHERE email = ?", (email,))
         result = self.cursor.fetchone()
         return result[0] > 0  # Returns True if user exists, False otherwise
     
+    @db_call
     def get_user(self, email):
         """Retrieves user details by email."""
         self.cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
         return self.cursor.fetchone()
 
+    @db_call
     def delete_user(self, email):
         """Deletes a user by email."""
         self.cursor.execute("DELETE FROM users WHERE email = ?", (email,))
         self.conn.commit()
 
     ### PRODUCT MANAGEMENT ###
+    @db_call
     def insert_product(self, name, description, price, currency, rating, num_reviews, url, image_url, category, source):
         """Inserts a new product into the database."""
         self.cursor.execute("""
@@ -137,12 +152,14 @@ class DatabaseManager:
         """, (name, description, price, currency, rating, num_reviews, url, image_url, category, source, datetime.now()))
         self.conn.commit()
 
+    @db_call
     def get_product(self, url):
         """Retrieves product details by URL."""
         self.cursor.execute("SELECT * FROM products WHERE url = ?", (url,))
         return self.cursor.fetchone()
 
     ### SEARCH HISTORY ###
+    @db_call
     def log_search(self, user_id, search_query, filters_applied=None, num_results=None):
         """Logs a user's search query."""
         self.cursor.execute("""
@@ -151,12 +168,14 @@ class DatabaseManager:
         """, (user_id, search_query, filters_applied, num_results, datetime.now()))
         self.conn.commit()
 
+    @db_call
     def get_search_history(self, user_id):
         """Retrieves search history for a user."""
         self.cursor.execute("SELECT * FROM search_history WHERE user_id = ? ORDER BY timestamp DESC", (user_id,))
         return self.cursor.fetchall()
 
    ### WISHLIST MANAGEMENT ###
+    @db_call
     def get_wishlist(self, user_id):
         """Retrieves all products in a user's wishlist."""
         self.cursor.execute("""
@@ -166,6 +185,7 @@ class DatabaseManager:
         """, (user_id,))
         return self.cursor.fetchall()
     
+    @db_call
     def is_product_in_wishlist(self, user_id, product_id):
         self.cursor.execute('''
             SELECT 1 FROM wishlists WHERE user_id = ? AND product_id = ?
@@ -179,12 +199,14 @@ class DatabaseManager:
     #     ''', (user_id, title, image, price, website, rating))
     #     self.conn.commit()
 
+    @db_call
     def remove_from_wishlist(self, user_id, product_id):
         self.cursor.execute('''
             DELETE FROM wishlists WHERE user_id = ? AND id = ?
         ''', (user_id, product_id))
         self.conn.commit()
 
+    @db_call
     def add_to_wishlist(self, user_id, product_id):
         """Adds a product to the user's wishlists, preventing duplicates."""
         self.cursor.execute("""
@@ -202,6 +224,7 @@ class DatabaseManager:
 
 
     ### COMMENTS MANAGEMENT ###
+    @db_call
     def add_comment(self, user_id, product_id, comment, rating_given=None):
         """Adds a comment to a product."""
         self.cursor.execute("""
@@ -210,6 +233,7 @@ class DatabaseManager:
         """, (user_id, product_id, comment, rating_given, datetime.now()))
         self.conn.commit()
 
+    @db_call
     def get_comments(self, product_id):
         """Retrieves all comments for a product."""
         self.cursor.execute("""
@@ -221,6 +245,7 @@ class DatabaseManager:
         """, (product_id,))
         return self.cursor.fetchall()
 
+    @db_call
     def close(self):
         """Closes the database connection."""
         self.conn.close()
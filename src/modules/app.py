@@ -5,13 +5,19 @@ See the LICENSE file in the project root for the full license information.
 """
 import time
 import os
+import hmac
 import csv
 import sqlite3
-from flask import Flask, session, render_template, request, redirect, url_for, jsonify
+from flask import Flask, session, render_template, request, redirect, url_for, jsonify, Response, abort
 from google.oauth2 import id_token
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport import requests
-from .scraper import driver
+from .scraper import driver, filter as filter_products, SITE_HEALTH, PARSE_POOL
+from .formatter import sortList
+from .cache import SearchCache, canonical_query
+from .metrics import METRICS, CONTENT_TYPE
+from .tracing import TRACER, chrome_trace
+from .retailers import RETAILERS, parse_sites, select_sites
 from .features import (
     create_user, check_user, wishlist_add_item,
     read_wishlist, wishlist_remove_list, share_wishlist
@@ -22,7 +28,10 @@ from .DatabaseManager import DatabaseManager
 # Initialize Flask app
 app = Flask(__name__, template_folder=".")
 app.secret_key = Config.SECRET_KEY
+# Start the parser processes (if any) in the background, not on the first large page.
+PARSE_POOL.warm(wait=False)
 db = DatabaseManager()
+search_cache = SearchCache()
 
 # Google OAuth2 setup (Use secure transport in production)
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
@@ -37,6 +46,33 @@ flow = Flow.from_client_secrets_file(
     redirect_uri=Config.GOOGLE_REDIRECT_URI
 )
 
+# sortList arguments of the sort options on the results page.
+SORTS = {"rades": ("ra", False), "raasc": ("ra", True), "pasc": ("pr", False), "pdes": ("pr", True)}
+
+
+@app.context_processor
+def retailer_choices():
+    """Lets every page offer the registered retailers as search sites."""
+    return {"retailers": list(RETAILERS)}
+
+
+def request_sites():
+    """The sites a form or query string asked for (repeated or comma-separated), or None for all."""
+    return parse_sites(request.args.getlist("sites") or request.form.getlist("sites"))
+
+
+def cached_search(product, sites, currency=None):
+    """Runs driver for a search through search_cache."""
+    return search_cache.get(
+        canonical_query(product, currency, sites=sites), lambda: driver(product, currency=currency, sites=sites)
+    )
+
+
+def is_operator():
+    """True when the logged-in user is one of Config.OPERATORS, who may see other users' traces."""
+    return session.get('username') in Config.OPERATORS
+
+
 def load_comments():
     """Load comments from comments.csv."""
     comments = {}
@@ -166,8 +202,14 @@ def search():
         return render_template(
             "./static/result.html", error="Please enter a search term.", total_pages=0
         )
+    sites = request_sites()
+    try:
+        select_sites(sites)
+    except ValueError as e:
+        return render_template("./static/result.html", error=str(e), total_pages=0)
     start_time = time.time()
-    data = driver(product, currency=None)
+    with TRACER.trace("search", force=request.args.get("trace") == "1" and is_operator(), query=product):
+        data = cached_search(product, sites)
     if data is None or data.empty:
         return render_template(
             "./static/result.html", error="No results found for your search.", total_pages=0
@@ -175,15 +217,52 @@ def search():
     end_time = time.time()
     processing_time = end_time - start_time
     print("Processing time:", processing_time, "seconds")
+    if data.attrs.get("timed_out"):
+        print("Timed out sites:", ", ".join(data.attrs["timed_out"]))
 
     comments = load_comments()
     total_pages = (len(data) + 19) // 20
     return render_template(
         "./static/result.html", data=data.to_dict(orient='records'), prod=product,
-        total_pages=total_pages, comments=comments
+        total_pages=total_pages, comments=comments, sites=sites or []
     )
 
 
+@app.route('/stats')
+def stats():
+    """Reports per-site health and circuit breaker state to logged-in users."""
+    if 'username' not in session:
+        abort(401)
+    return jsonify({"sites": SITE_HEALTH.stats()})
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Exposes scraper, cache and database metrics in the Prometheus text format, to operators
+    and to scrapers that send Config.METRICS_TOKEN as a bearer token.
+    """
+    token = request.headers.get("Authorization", "")
+    scraper_allowed = Config.METRICS_TOKEN and hmac.compare_digest(token, f"Bearer {Config.METRICS_TOKEN}")
+    if not (scraper_allowed or is_operator()):
+        abort(403)
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/traces')
+def traces():
+    """
+    Returns the recently sampled search traces as span trees, or as a Chrome trace with
+    ?format=chrome. Traces hold other users' queries, so only operators may read them.
+    """
+    if not is_operator():
+        abort(403)
+    recent = TRACER.traces()
+    if request.args.get("format") == "chrome":
+        return jsonify(chrome_trace(recent))
+    return jsonify({"traces": [trace.tree() for trace in recent]})
+
+
 @app.route('/add_comment', methods=['POST'])
 def add_comment():
     product_name = request.form.get('product_name')
@@ -200,6 +279,10 @@ def add_comment():
 
 @app.route("/filter", methods=["POST", "GET"])
 def product_search_filtered():
+    """Sorts, converts and filters the results of a search over the same sites."""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
     product = request.args.get("product_name")
     sort = request.form.get("sort")
     currency = request.form.get("currency")
@@ -210,14 +293,25 @@ def product_search_filtered():
             request.form.get("min_rating")
         ]
     )
-    return product_search_filtered(
-        product, sort if sort != "default" else None,
-        currency if currency != "usd" else None, None,
-        min_price, max_price, min_rating
+    sites = request_sites()
+    try:
+        select_sites(sites)
+    except ValueError as e:
+        return render_template("./static/result.html", error=str(e), total_pages=0)
+    data = cached_search(product, sites, currency if currency != "usd" else None)
+    if data is None or data.empty:
+        return render_template(
+            "./static/result.html", error="No results found for your search.", total_pages=0
+        )
+    if sort in SORTS:
+        data = sortList(data, *SORTS[sort])
+    data = filter_products(data.to_dict(orient='records'), min_price, max_price, min_rating)
+    return render_template(
+        "./static/result.html", data=data, prod=product, total_pages=(len(data) + 19) // 20,
+        comments=load_comments(), sites=sites or []
     )
 
 
-
 @app.route('/wishlist')
 def wishlist():
     user = db.get_user(session['username'])
@@ -0,0 +1,210 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The benchmark module times the scrape-parse-format pipeline against stored retailer
+pages, with no network. Run it from the project root:
+
+    python -m src.modules.benchmark --output bench.json --baseline old.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from . import scraper
+from .extractors import EXTRACTORS, extract_values, format_values
+from .formatter import sortList
+from .recorder import REPLAY
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         "benchmarks", "pages")
+QUERY = "tv"
+
+# Sites with a stored page; HTML pages run through EXTRACTORS, JSON ones through the site's decoder.
+HTML_SITES = ("amazon", "walmart", "google", "bjs", "bestbuy")
+JSON_SITES = ("target", "ebay")
+
+
+def site_request(site):
+    """Returns the (url, params) the site's searcher sends for QUERY."""
+    query = scraper.formatSearchQuery(QUERY)
+    return {
+        "amazon": (f"https://www.amazon.com/s?k={query}", None),
+        "walmart": (f"https://www.walmart.com/search?q={query}", None),
+        "google": (f"https://www.google.com/search?tbm=shop&q={query}", None),
+        "bjs": (f"https://www.bjs.com/search/{query}", None),
+        "bestbuy": (f"https://www.bestbuy.com/site/searchpage.jsp?st={query}", None),
+        "target": (scraper.TARGET_API_URL, scraper.targetParams(QUERY)),
+        "ebay": (scraper.EBAY_API_URL, scraper.ebayParams(QUERY)),
+    }[site]
+
+
+def load_corpus(pages_dir, corpus_dir):
+    """Stores every page in pages_dir as the recorded response to its site's request."""
+    recorder = scraper.Recorder(REPLAY, corpus_dir)
+    for site in HTML_SITES + JSON_SITES:
+        with open(os.path.join(pages_dir, site + (".html" if site in HTML_SITES else ".json")), "rb") as f:
+            recorder.corpus.save(*site_request(site), 200, f.read(), {}, 0.0)
+    return recorder
+
+
+class Timings:
+    """Accumulates elapsed time, item counts and memory peaks per stage for one run."""
+
+    def __init__(self):
+        self.stages = {}
+        self.sites = {}
+
+    def run(self, stage, fn, *args, site=None, items=None):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "items": 0, "peak_kb": 0.0})
+        entry["seconds"] += elapsed
+        entry["items"] += items(result) if items else len(result)
+        if tracemalloc.is_tracing():
+            entry["peak_kb"] = max(entry["peak_kb"], (tracemalloc.get_traced_memory()[1] - base) / 1024)
+        if site is not None:
+            self.sites.setdefault(site, {})[stage] = elapsed
+        return result
+
+
+def run_pipeline(timings):
+    """Runs every stage once against the replay corpus RECORDER currently serves."""
+    results = []
+    for site in HTML_SITES:
+        url, params = site_request(site)
+        response = timings.run("fetch", scraper.fetch, url, None, params, site=site, items=lambda r: 1)
+        page = timings.run("parse", scraper.parsePage, response.content, scraper.PAGE_STRAINERS.get(site),
+                           site=site, items=lambda r: 1)
+        spec = EXTRACTORS[site]
+        values = timings.run("extract", extract_values, spec, page, site=site)
+        products = timings.run("format", lambda: [format_values(spec, v, 0, None) for v in values], site=site)
+        results.append(products)
+    for site, decode, parse in (("target", scraper.decodeTarget, scraper.parseTarget),
+                                ("ebay", scraper.decodeEbay, scraper.parseEbay)):
+        url, params = site_request(site)
+        response = timings.run("fetch", scraper.fetch, url, None, params, site=site, items=lambda r: 1)
+        data = timings.run("parse", decode, response, site=site, items=lambda r: 1)
+        products = timings.run("format", parse, data, 0, None, site=site)
+        results.append(products)
+    df = timings.run("dataframe", scraper.build_report, results, QUERY, None)
+    timings.run("sort", lambda: [sortList(df.copy(), "pr", False), sortList(df.copy(), "ra", True)],
+                items=lambda r: len(df) * len(r))
+    timings.run("filter", scraper.filter, df.to_dict(orient="records"), 50, 500, 4.0, items=lambda r: len(df))
+    sites = list(HTML_SITES + JSON_SITES)
+    timings.run("driver", scraper.driver, QUERY, None, None, 0, False, None, False, None, None, sites)
+
+
+def run(pages_dir=PAGES_DIR, repeat=5):
+    """
+    Runs the pipeline repeat times (after one warm-up run) and returns the JSON report:
+    the median seconds per stage, items/sec, and the memory peak per stage from one
+    extra traced run.
+    """
+    saved = scraper.RECORDER, scraper.RESPONSE_CACHE
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        scraper.RECORDER, scraper.RESPONSE_CACHE = load_corpus(pages_dir, corpus_dir), None
+        try:
+            run_pipeline(Timings())
+            runs = []
+            for _ in range(repeat):
+                timings = Timings()
+                run_pipeline(timings)
+                runs.append(timings)
+            traced = Timings()
+            tracemalloc.start()
+            try:
+                run_pipeline(traced)
+            finally:
+                tracemalloc.stop()
+        finally:
+            scraper.RECORDER, scraper.RESPONSE_CACHE = saved
+    stages = {}
+    for stage, entry in runs[0].stages.items():
+        seconds = statistics.median(run.stages[stage]["seconds"] for run in runs)
+        stages[stage] = {
+            "seconds": seconds,
+            "items": entry["items"],
+            "items_per_sec": entry["items"] / seconds if seconds else None,
+            "peak_kb": round(traced.stages[stage]["peak_kb"], 1),
+        }
+    sites = {
+        site: {stage: statistics.median(run.sites[site][stage] for run in runs) for stage in site_stages}
+        for site, site_stages in runs[0].sites.items()
+    }
+    return {"meta": metadata(repeat), "stages": stages, "sites": sites}
+
+
+def metadata(repeat):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "repeat": repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(report, baseline, threshold=0.2, min_seconds=0.0005):
+    """
+    Returns (stage, baseline_seconds, seconds) for every stage more than threshold slower
+    than in baseline. Stages faster than min_seconds in both reports are too noisy to judge.
+    """
+    regressions = []
+    for stage, entry in report["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base is None or max(base["seconds"], entry["seconds"]) < min_seconds:
+            continue
+        if entry["seconds"] > base["seconds"] * (1 + threshold):
+            regressions.append((stage, base["seconds"], entry["seconds"]))
+    return regressions
+
+
+def print_report(report):
+    print(f"{'stage':<10} {'ms':>9} {'items':>7} {'items/s':>11} {'peak KiB':>9}")
+    for stage, entry in report["stages"].items():
+        rate = f"{entry['items_per_sec']:.0f}" if entry["items_per_sec"] else "-"
+        print(f"{stage:<10} {entry['seconds'] * 1000:>9.2f} {entry['items']:>7} {rate:>11} {entry['peak_kb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Slash scraping pipeline")
+    parser.add_argument("--pages", default=PAGES_DIR, help="Directory of stored retailer pages")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage (the median is reported)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Fail when a stage is this fraction slower than the baseline")
+    args = parser.parse_args(argv)
+
+    report = run(args.pages, args.repeat)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for stage, before, after in regressions:
+            print(f"REGRESSION {stage}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
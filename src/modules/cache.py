@@ -0,0 +1,353 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The cache module stores retailer responses and whole search results so repeated searches skip the network.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Seconds a cached response stays fresh, by retailer domain.
+DEFAULT_TTL = 300
+SITE_TTLS = {
+    "amazon.com": 900,
+    "walmart.com": 900,
+    "bestbuy.com": 900,
+    "target.com": 900,
+    "ebay.com": 900,
+    "etsy.com": 1800,
+    "bjs.com": 1800,
+    "google.com": 300,
+}
+
+CACHE_DB = os.getenv(
+    "SLASH_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "responses.db")
+)
+
+
+def normalize_key(url, params=None):
+    """
+    Builds the cache key for a request: scheme and host are lower-cased, the fragment
+    is dropped and the query string (including params) is sorted.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(sorted(query)), ""
+    ))
+
+
+def ttl_for(url):
+    """Returns the TTL of the retailer that serves url."""
+    host = urlsplit(url).netloc.lower()
+    for domain, ttl in SITE_TTLS.items():
+        if host == domain or host.endswith("." + domain):
+            return ttl
+    return DEFAULT_TTL
+
+
+class MemoryCache:
+    """In-memory LRU tier bounded by the total size of the stored bodies."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (content, headers, expires_at) or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, content, headers, expires_at):
+        if len(content) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (content, headers, expires_at)
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        content, _, _ = self.entries.pop(key)
+        self.size -= len(content)
+
+
+class SQLiteCache:
+    """
+    On-disk tier that survives restarts; least recently used rows go first once max_bytes is exceeded.
+    Reads only note their access time; the notes are written in one batch on the next set or once
+    touch_batch of them have piled up, so a read never commits.
+    """
+
+    def __init__(self, db_file=CACHE_DB, max_bytes=256 * 1024 * 1024, touch_batch=64):
+        if db_file != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.touched = {}
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                headers TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, key):
+        """Returns (content, headers, expires_at) or None if missing or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT content, headers, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                # Expired rows are deleted by the next set's eviction.
+                return None
+            self.touched[key] = now
+            if len(self.touched) >= self.touch_batch:
+                self._flush_touched()
+                self.conn.commit()
+        return bytes(row[0]), json.loads(row[1]), row[2]
+
+    def set(self, key, content, headers, expires_at):
+        if len(content) > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, content, json.dumps(headers), len(content), expires_at, now)
+            )
+            self.touched.pop(key, None)
+            self._flush_touched()
+            self._evict(now)
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.touched.clear()
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def _flush_touched(self):
+        if self.touched:
+            self.conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                  [(at, key) for key, at in self.touched.items()])
+            self.touched.clear()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        excess = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: the memory LRU answers first, the SQLite tier backs it.
+    Either tier can be None. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, url, params=None, disk=True):
+        """
+        Returns (content, headers) for a fresh cached response, else None. With disk=False
+        a memory miss is left uncounted when there is a disk tier, for async callers that then
+        look up the disk tier off the event loop.
+        """
+        key = normalize_key(url, params)
+        entry = self.memory.get(key) if self.memory is not None else None
+        if entry is not None:
+            self._count("memory_hits")
+            return entry[0], entry[1]
+        if not disk and self.disk is not None:
+            return None
+        entry = self.disk.get(key) if self.disk is not None else None
+        if entry is not None:
+            self._count("disk_hits")
+            if self.memory is not None:
+                self.memory.set(key, *entry)
+            return entry[0], entry[1]
+        self._count("misses")
+        return None
+
+    def set(self, url, params, content, headers=None, ttl=None):
+        key = normalize_key(url, params)
+        expires_at = time.time() + (ttl_for(url) if ttl is None else ttl)
+        headers = dict(headers or {})
+        for tier in (self.memory, self.disk):
+            if tier is not None:
+                tier.set(key, content, headers, expires_at)
+        self._count("stores")
+
+    def stats(self):
+        """Returns the hit/miss counters plus evictions per tier."""
+        with self.lock:
+            stats = dict(self.counters)
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        stats["memory_evictions"] = self.memory.evictions if self.memory is not None else 0
+        stats["disk_evictions"] = self.disk.evictions if self.disk is not None else 0
+        return stats
+
+    def clear(self):
+        for tier in (self.memory, self.disk):
+            if tier is not None:
+                tier.clear()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+
+def canonical_query(product, currency=None, num=None, sort=None, sites=None):
+    """
+    Builds the result cache key for a search: the query is case-folded and its
+    whitespace-separated tokens are sorted, so "AirPods  Pro" and "pro airpods" match.
+    The selected sites are part of the key regardless of order or case.
+    """
+    tokens = sorted((product or "").casefold().split())
+    sites = tuple(sorted({site.lower() for site in sites})) if sites is not None else None
+    return " ".join(tokens), (currency or "").lower(), num, sort, sites
+
+
+def answered(result):
+    """The sites that answered "ok" in a search result's attrs["site_status"]."""
+    status = getattr(result, "attrs", {}).get("site_status", {})
+    return {site for site, outcome in status.items() if outcome == "ok"}
+
+
+def degraded(result):
+    """True if any site timed out or failed in a search result."""
+    status = getattr(result, "attrs", {}).get("site_status", {})
+    return any(outcome in ("timed_out", "error") for outcome in status.values())
+
+
+class SearchCache:
+    """
+    Memoizes whole search results with stale-while-revalidate.
+    Entries younger than fresh_ttl are returned as is. Entries between fresh_ttl and
+    stale_ttl are returned immediately while one background refresh recomputes them.
+    Older or missing entries are computed in the calling thread. Results that some
+    site timed out or failed on are not stored, and a refresh never replaces a live
+    entry with one fewer sites answered.
+    """
+
+    def __init__(self, fresh_ttl=60, stale_ttl=900, max_entries=256, workers=2):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="slash-refresh")
+        self.counters = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+    def get(self, key, compute):
+        """Returns the cached result for key, calling compute() to fill or refresh it."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            age = now - entry[1] if entry is not None else None
+            if age is not None and age < self.fresh_ttl:
+                self.entries.move_to_end(key)
+                self.counters["fresh_hits"] += 1
+                return entry[0]
+            if age is not None and age < self.stale_ttl:
+                self.entries.move_to_end(key)
+                self.counters["stale_hits"] += 1
+                if key not in self.refreshing:
+                    self.refreshing.add(key)
+                    self.executor.submit(self._refresh, key, compute)
+                return entry[0]
+            self.counters["misses"] += 1
+        value = compute()
+        self._store(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+        return stats
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _refresh(self, key, compute):
+        try:
+            self._store(key, compute())
+            with self.lock:
+                self.counters["refreshes"] += 1
+        except Exception as e:
+            print(f"Background refresh of {key} failed: {e!r}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def _store(self, key, value):
+        # Empty results (every site failed or timed out) are not worth serving again, and
+        # neither are results some sites timed out or failed on: the next search may get them.
+        if value is None or len(value) == 0 or degraded(value):
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[1] < self.stale_ttl and len(answered(value)) < len(answered(entry[0])):
+                # A refresh that lost sites (say to an open circuit breaker) keeps the fuller entry.
+                return
+            self.entries[key] = (value, now)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
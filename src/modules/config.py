@@ -25,6 +25,10 @@ class Config(object):
     )
     GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
     GOOGLE_REDIRECT_URI = "http://localhost:5000/callback"
+    # Usernames allowed to read /traces, /metrics and force a trace, comma-separated.
+    OPERATORS = frozenset(name.strip() for name in os.getenv('SLASH_OPERATORS', '').split(',') if name.strip())
+    # Bearer token a Prometheus scraper can send to /metrics instead of logging in.
+    METRICS_TOKEN = os.getenv('SLASH_METRICS_TOKEN')
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,168 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The embedded module reads products from the JSON state blob some retailers ship in
+their search page (Next.js __NEXT_DATA__ and the like). The blob is sliced straight
+out of the raw bytes, so no DOM is built; callers fall back to the DOM extractors
+whenever a page has no usable blob.
+"""
+
+import json
+import re
+from collections import deque
+from .extractors import COLUMN_SOURCES, Products, format_values, has_title, spec_fields
+from .metrics import STAGE_SECONDS, EXTRACTION_PATHS
+from .tracing import span
+
+try:
+    import orjson
+    loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+
+class Blob:
+    """A state blob that starts right after the match of pattern and runs to the end of its script element."""
+
+    def __init__(self, pattern):
+        self.pattern = re.compile(pattern)
+
+    def __call__(self, content):
+        match = self.pattern.search(content)
+        if match is None:
+            return None
+        end = content.find(b"</script>", match.end())
+        if end == -1:
+            return None
+        return content[match.end():end].strip().rstrip(b";")
+
+
+# The page state of Next.js sites: <script id="__NEXT_DATA__" type="application/json">{...}</script>
+NEXT_DATA = Blob(rb'<script[^>]*\bid="__NEXT_DATA__"[^>]*>')
+
+
+def assignment(name):
+    """A blob assigned to a global in an inline script: window.<name> = {...};"""
+    return Blob(rb"window\." + re.escape(name.encode()) + rb"\s*=\s*")
+
+
+class Key:
+    """The value at the first dotted path that is present and not empty in an item, or None."""
+
+    def __init__(self, *paths):
+        self.paths = [path.split(".") for path in paths]
+
+    def __call__(self, item):
+        for path in self.paths:
+            value = item
+            for name in path:
+                value = value.get(name) if isinstance(value, dict) else None
+            if value not in (None, "", [], {}):
+                return value
+        return None
+
+
+def find_items(data, keys):
+    """
+    Returns the dicts holding every one of keys in the shallowest list that has any,
+    so the blob's layout around the product list may change without breaking extraction.
+    """
+    queue = deque([data])
+    while queue:
+        node = queue.popleft()
+        children = node.values() if isinstance(node, dict) else node if isinstance(node, list) else ()
+        if isinstance(node, list):
+            items = [child for child in node if isinstance(child, dict) and all(key in child for key in keys)]
+            if items:
+                return items
+        queue.extend(child for child in children if isinstance(child, (dict, list)))
+    return []
+
+
+class EmbeddedSpec:
+    """
+    Embedded-JSON spec for one retailer: where the blobs sit in the page, the keys
+    every product record has, and a Key per formatResult argument.
+    """
+
+    def __init__(self, website, blobs, keys, fields, post=None):
+        self.website = website
+        self.blobs = blobs
+        self.keys = keys
+        self.fields = fields
+        self.post = post
+        self.sources = COLUMN_SOURCES
+
+    def items(self, content):
+        """Returns the product records of the first blob that decodes and has any, or None."""
+        for blob in self.blobs:
+            raw = blob(content)
+            if not raw:
+                continue
+            try:
+                data = loads(raw)
+            except (JSONDecodeError, ValueError):
+                continue
+            items = find_items(data, self.keys)
+            if items:
+                return items
+        return None
+
+
+class EmbeddedPage:
+    """The product records read from a page's state blob, standing in for its parsed DOM."""
+
+    def __init__(self, spec, items):
+        self.spec = spec
+        self.items = items
+
+    def products(self, df_flag, currency, limit=None, fields=None):
+        """
+        Returns the formatted products with the columns in fields, stopping once limit of
+        them have a title. Timed as the site's format stage.
+        """
+        website = self.spec.website
+        selected = spec_fields(self.spec, fields)
+        with STAGE_SECONDS.time(site=website, stage="format"), span("format", site=website, items=len(self.items)):
+            products, valid = Products(), 0
+            for index, item in enumerate(self.items):
+                if limit is not None and valid >= limit:
+                    products.skipped = len(self.items) - index
+                    break
+                values = {name: field(item) for name, field in selected}
+                products.append(format_values(self.spec, values, df_flag, currency, fields))
+                valid += has_title(values.get("titles"))
+            return products
+
+
+def read_embedded(spec, content):
+    """Returns an EmbeddedPage for content, or None when it has no usable blob and has to be parsed."""
+    items = spec.items(content)
+    EXTRACTION_PATHS.inc(site=spec.website, path="dom" if items is None else "embedded")
+    return EmbeddedPage(spec, items) if items is not None else None
+
+
+EMBEDDED = {
+    "walmart": EmbeddedSpec("walmart", [NEXT_DATA], ("name", "canonicalUrl"), {
+        "titles": Key("name"),
+        "prices": Key("priceInfo.linePrice", "priceInfo.currentPrice.priceString", "price"),
+        "links": Key("canonicalUrl"),
+        "ratings": Key("averageRating", "rating.averageRating"),
+        "num_ratings": Key("numberOfReviews", "rating.numberOfReviews"),
+        "img_links": Key("imageInfo.thumbnailUrl", "image"),
+    }),
+    "bestbuy": EmbeddedSpec("bestbuy", [NEXT_DATA, assignment("__INITIAL_STATE__")], ("skuId", "name"), {
+        "titles": Key("name.short", "name"),
+        "prices": Key("price.customerPrice", "priceInfo.customerPrice", "customerPrice", "salePrice"),
+        "links": Key("url", "pdpUrl"),
+        "ratings": Key("customerRating", "reviewInfo.averageRating", "rating.averageRating"),
+        "num_ratings": Key("customerReviewCount", "reviewInfo.reviewCount", "rating.reviewCount"),
+        "img_links": Key("image", "thumbnailImage", "primaryImage.url"),
+    }),
+}
@@ -0,0 +1,218 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The extractors module describes what to pull out of each retailer's search page.
+Every CSS selector is compiled once at import; extract() runs any spec.
+"""
+
+import re
+import soupsieve as sv
+from .formatter import formatResult
+from .metrics import STAGE_SECONDS
+from .tracing import span
+
+
+class Select:
+    """All elements under the result container matching css."""
+
+    def __init__(self, css):
+        self.css = css
+        self.compiled = sv.compile(css)
+
+    def __call__(self, res):
+        return self.compiled.select(res)
+
+
+class First(Select):
+    """The first element matching css, or None."""
+
+    def __call__(self, res):
+        return self.compiled.select_one(res)
+
+
+class MatchText(Select):
+    """Elements matching css whose own text matches pattern."""
+
+    def __init__(self, css, pattern):
+        super().__init__(css)
+        self.pattern = re.compile(pattern)
+
+    def __call__(self, res):
+        return [el for el in self.compiled.select(res) if el.string and self.pattern.search(el.string)]
+
+
+class TextGroup(Select):
+    """The first regex group of the first element matching css, or None."""
+
+    def __init__(self, css, pattern):
+        super().__init__(css)
+        self.pattern = re.compile(pattern)
+
+    def __call__(self, res):
+        el = self.compiled.select_one(res)
+        match = self.pattern.search(el.get_text()) if el is not None else None
+        return match.group(1) if match else None
+
+
+# The fields formatResult takes, in order; a spec may define extra fields for its post hook.
+RESULT_FIELDS = ("titles", "prices", "links", "ratings", "num_ratings", "trending", "img_links")
+
+
+# The fields each product column is built from; a spec's sources may add its extra fields.
+COLUMN_SOURCES = {
+    "title": ("titles",),
+    "price": ("prices",),
+    "converted_price": ("prices",),
+    "link": ("links",),
+    "rating": ("ratings",),
+    "no_of_ratings": ("num_ratings",),
+    "trending": ("trending",),
+    "img_link": ("img_links",),
+}
+
+
+class SiteSpec:
+    """
+    Extraction spec for one retailer: the result container selector, a field
+    extractor per formatResult argument and an optional post(product, values)
+    hook that adjusts the formatted product. sources maps a column to the fields
+    it is built from where that differs from COLUMN_SOURCES.
+    """
+
+    def __init__(self, website, container, fields, post=None, sources=None):
+        self.website = website
+        self.container = Select(container)
+        self.fields = fields
+        self.post = post
+        self.sources = dict(COLUMN_SOURCES, **(sources or {}))
+
+
+def spec_fields(spec, fields=None):
+    """The (name, extractor) pairs of spec that the columns in fields need; all of them for None."""
+    if fields is None:
+        return list(spec.fields.items())
+    needed = {source for column in fields for source in spec.sources.get(column, ())}
+    return [(name, field) for name, field in spec.fields.items() if name in needed]
+
+
+class Products(list):
+    """A list of products (or their raw values) that also counts the results skipped once a limit was reached."""
+
+    def __init__(self, items=(), skipped=0):
+        super().__init__(items)
+        self.skipped = skipped
+
+
+def skipped(products):
+    """The results a searcher left unread for products, 0 for a plain list."""
+    return getattr(products, "skipped", 0)
+
+
+def has_title(titles):
+    """Whether formatResult gives a product with these titles a non-empty title."""
+    if isinstance(titles, str):
+        return bool(titles.strip())
+    if titles and isinstance(titles, list):
+        return bool(titles[0].get_text().strip())
+    return True
+
+
+def extract(spec, page, df_flag, currency, limit=None, fields=None):
+    """
+    Runs spec over a parsed page and returns the formatted products, stopping once limit
+    of them have a title; with fields, only the selectors those columns need run. Both
+    steps are timed as the site's extract and format stages in STAGE_SECONDS and traced as spans.
+    """
+    with STAGE_SECONDS.time(site=spec.website, stage="extract"), span("extract", site=spec.website) as extract_span:
+        found = extract_values(spec, page, limit, fields)
+        if extract_span is not None and found.skipped:
+            extract_span.set(skipped=found.skipped)
+    with STAGE_SECONDS.time(site=spec.website, stage="format"), span("format", site=spec.website, items=len(found)):
+        return Products([format_values(spec, values, df_flag, currency, fields) for values in found], found.skipped)
+
+
+def extract_values(spec, page, limit=None, fields=None):
+    """
+    Returns the raw field values of the result containers on the page. With a limit,
+    containers are read only until limit of them have a title; the rest are counted as skipped.
+    With fields, only the values those columns are built from are read.
+    """
+    selected = spec_fields(spec, fields)
+    containers = spec.container(page)
+    if limit is None:
+        return Products({name: field(res) for name, field in selected} for res in containers)
+    found, valid = Products(), 0
+    for index, res in enumerate(containers):
+        if valid >= limit:
+            found.skipped = len(containers) - index
+            break
+        values = {name: field(res) for name, field in selected}
+        found.append(values)
+        valid += has_title(values.get("titles"))
+    return found
+
+
+def format_values(spec, values, df_flag, currency, fields=None):
+    """Turns one container's field values into a product dict with the columns in fields."""
+    product = formatResult(spec.website, *(values.get(name) for name in RESULT_FIELDS[:6]),
+                           df_flag, currency, values.get("img_links"), fields)
+    if spec.post is not None:
+        spec.post(product, values)
+    return product
+
+
+def bjsRating(product, values):
+    # BJ's shows one filled star span per rating point.
+    if values.get("stars") and "rating" in product:
+        product["rating"] = len(values["stars"])
+
+
+EXTRACTORS = {
+    "amazon": SiteSpec("amazon", 'div[data-component-type="s-search-result"]', {
+        "titles": Select("h2 a span"),
+        "prices": Select("span.a-price span"),
+        "links": Select("h2 a.a-link-normal"),
+        "ratings": Select("span.a-icon-alt"),
+        "num_ratings": Select("span.a-size-base"),
+        "trending": First("span.a-badge-text"),
+        "img_links": Select("img.s-image"),
+    }),
+    "walmart": SiteSpec("walmart", "div[data-item-id]", {
+        "titles": Select("span.lh-title"),
+        "prices": Select("div.lh-copy"),
+        "links": Select("a"),
+        "ratings": MatchText("span.w_iUH7", r"out of 5 Stars"),
+        "num_ratings": Select("span.sans-serif.gray.f7"),
+        "trending": First("span.w_Cs"),
+        "img_links": Select("div.relative.overflow-hidden img"),
+    }),
+    "google": SiteSpec("google", "div.sh-dgr__grid-result", {
+        "titles": Select("h3"),
+        "prices": Select("span.a8Pemb"),
+        "links": Select("a"),
+        "ratings": Select("span.Rsc7Yb"),
+        "num_ratings": TextGroup("span.QIrs8", r"(\d+,\d+)"),
+        "trending": First("span.Ib8pOd"),
+        "img_links": Select("div.SirUVb.sh-img__image img"),
+    }),
+    "bjs": SiteSpec("bjs", "div.product", {
+        "titles": Select("p.no-select.d-none.auto-height"),
+        "prices": Select("span.price"),
+        "links": Select("a"),
+        "num_ratings": Select("span.prod-comments-count"),
+        "trending": First("p.instantSavings"),
+        "stars": Select("span.on"),
+    }, post=bjsRating, sources={"rating": ("stars",)}),
+    "bestbuy": SiteSpec("bestbuy", "li.sku-item", {
+        "titles": Select("h4.sku-title a"),
+        "prices": Select("div.priceView-customer-price span"),
+        "links": Select("a"),
+        "ratings": MatchText("div.c-ratings-reviews p", r"out of 5 stars with"),
+        "num_ratings": Select("span.c-reviews"),
+        "img_links": Select("img.product-image"),
+    }),
+}
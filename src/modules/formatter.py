@@ -2,6 +2,7 @@ from datetime import datetime
 import requests
 import re
 from ast import literal_eval
+import pandas as pd
 
 CURRENCY_URL = "https://api.exchangerate-api.com/v4/latest/usd"
 try:
@@ -11,10 +12,62 @@ except requests.RequestException as e:
     EXCHANGES = {}
 
 
-def formatResult(website, titles, prices, links, ratings, num_ratings, trending, df_flag, currency, img_link=None):
+# Columns of a product, in the order formatResult builds them.
+PRODUCT_FIELDS = ("timestamp", "title", "price", "img_link", "link", "website", "rating", "no_of_ratings",
+                  "trending", "converted_price")
+# Columns every product keeps whatever the projection: results are condensed by title and grouped by website.
+REQUIRED_FIELDS = ("title", "website")
+# Typed columns normalize derives from the raw text, and the column each is parsed from.
+TYPED_FIELDS = {"price_value": "price", "price_currency": "price", "num_ratings": "no_of_ratings"}
+# Columns computed from another one, which a projection has to keep.
+SOURCE_FIELDS = dict(TYPED_FIELDS, converted_price="price")
+
+# Precompiled patterns shared by formatResult and the columnar normalize stage.
+PRICE_JUNK = re.compile(r"\s|,")
+PRICE_PARTS = re.compile(r"(?P<currency>[A-Z]{3}|[^\w.])?(?P<value>\d[\d.]*|\.\d[\d.]*)")
+RATING_NUMBER = re.compile(r"(\d+(?:\.\d+)?)")
+NON_DIGITS = re.compile(r"[^\d]")
+
+
+def product_fields(fields=None):
+    """
+    Normalizes a fields projection (names or a comma-separated string) to a frozenset that
+    includes REQUIRED_FIELDS and the raw column of every SOURCE_FIELDS name, or None for every
+    column. Unknown names raise ValueError.
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    names = {name.strip() for name in fields if name.strip()}
+    known = PRODUCT_FIELDS + tuple(TYPED_FIELDS)
+    unknown = sorted(names - set(known))
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(known)}")
+    sources = {SOURCE_FIELDS[name] for name in names if name in SOURCE_FIELDS}
+    return frozenset(names.union(REQUIRED_FIELDS, sources))
+
+
+def project(product, fields=None):
+    """The product with only the columns in fields (all of them for None)."""
+    if fields is None:
+        return product
+    return {name: value for name, value in product.items() if name in fields}
+
+
+def formatResult(website, titles, prices, links, ratings, num_ratings, trending, df_flag, currency, img_link=None,
+                 fields=None):
+    """
+    Builds one product dict from the raw values a searcher scraped. With fields (see
+    product_fields), only those columns are cleaned up, converted and returned. The price,
+    rating and review count are parsed with the precompiled patterns into the display
+    values and the typed TYPED_FIELDS columns; rating is a float (None when missing).
+    """
+    want = PRODUCT_FIELDS if fields is None else fields
     title, price, link, rating, num_rating, converted_cur, trending_stmt = (
         "", "", "", "", "", "", ""
     )
+    timestamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S") if "timestamp" in want else ""
 
     if website not in ['ebay', 'target']:
         if titles and isinstance(titles, list) and titles:
@@ -24,43 +77,36 @@ def formatResult(website, titles, prices, links, ratings, num_ratings, trending,
         else:
             title = "Title not available"  # Default message if title is missing
 
-        if prices:
-            price = prices[0].get_text().strip()
-            price = re.sub(r'\s|,', '', price)
-            price_match = re.search(r"[0-9\.]+", price)
-            price = "$" + price_match.group() if price_match else "Price not available"
-
-        link = links[0]["href"] if links else ""
-
-        if ratings:
-            try:
-                if website == "bestbuy":
-                    match = re.search(r"Rating (\d+\.\d+) out of 5 stars", ratings[0].get_text().strip())
-                    rating = float(match.group(1)) if match else None
-                elif isinstance(ratings, list):
-                    rating = float(ratings[0].get_text().strip().split()[0])
-                else:
-                    rating = float(ratings)
-            except (ValueError, AttributeError, IndexError):
-                rating = None
-
-        if num_ratings:
-            if isinstance(num_ratings, int):
-                num_rating = num_ratings
-            elif isinstance(num_ratings, str):
-                num_rating = re.sub(r"[^\d]", "", num_ratings)
+        if prices and "price" in want:
+            price = str(prices) if isinstance(prices, (str, int, float)) else prices[0].get_text()
+        price, price_value, price_currency = parse_price(price)
+
+        if "link" in want:
+            if isinstance(links, str):
+                link = links
             else:
-                num_rating = re.sub(r"[^\d]", "", num_ratings[0].get_text()) if num_ratings else ""
+                link = links[0]["href"] if links else ""
+            link = link if link.startswith('http') else f"https://www.{website}.com{link}"
 
-        converted_cur = getCurrency(currency, price) if currency else None
-        img_link = img_link[0].get('src') if img_link and not isinstance(img_link, str) else img_link
+        if ratings and "rating" in want:
+            rating = parse_rating(ratings[0].get_text() if isinstance(ratings, list) else ratings)
+        else:
+            rating = None
+
+        if num_ratings and "no_of_ratings" in want:
+            num_rating = num_ratings if isinstance(num_ratings, int) else NON_DIGITS.sub(
+                "", num_ratings if isinstance(num_ratings, str) else num_ratings[0].get_text())
+
+        converted_cur = convert(currency, price_value) if currency and "converted_price" in want else None
+        if "img_link" in want:
+            img_link = img_link[0].get('src') if img_link and not isinstance(img_link, str) else img_link
 
         product = {
-            "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+            "timestamp": timestamp,
             "title": title,
             "price": price,
             "img_link": img_link or "https://odoo-community.org/web/image/product.product/19823/image_1024/Default%20Product%20Images?unique=638e17b",
-            "link": link if link.startswith('http') else f"https://www.{website}.com{link}",
+            "link": link,
             "website": website,
             "rating": rating,
             "no_of_ratings": num_rating,
@@ -68,34 +114,125 @@ def formatResult(website, titles, prices, links, ratings, num_ratings, trending,
             "converted_price": converted_cur,
         }
     else:
-        converted_cur = getCurrency(currency, prices) if currency else None
+        price, price_value, price_currency = parse_price(prices)
+        num_rating = num_ratings
+        converted_cur = convert(currency, price_value) if currency and "converted_price" in want else None
         product = {
-            "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+            "timestamp": timestamp,
             "title": titles,
-            "price": prices,
+            "price": price,
             "link": links,
             "img_link": img_link or "https://avatars.githubusercontent.com/u/56881419",
             "website": website,
-            "rating": ratings,
+            "rating": parse_rating(ratings),
             "no_of_ratings": num_ratings,
             "trending": trending,
             "converted_price": converted_cur,
         }
+    product["price_value"] = price_value
+    product["price_currency"] = price_currency
+    product["num_ratings"] = int(num_rating) if num_rating not in (None, "") else 0
+
+    return project(product, fields)
+
+
+def parse_price(text):
+    """
+    The display price ("$" and the amount, "Price not available" when there is none, or ""
+    for no price), its float value and the currency symbol or code in front of it.
+    """
+    if not text:
+        return "", None, None
+    parts = PRICE_PARTS.search(PRICE_JUNK.sub("", str(text)))
+    if parts is None:
+        return "Price not available", None, None
+    return "$" + parts["value"], to_number(parts["value"]), parts["currency"]
 
-    return product
+
+def parse_rating(rating):
+    """The first number in a rating (e.g. "4.5 out of 5 stars") as a float, or None."""
+    if rating is None or isinstance(rating, (int, float)):
+        return to_number(rating)
+    found = RATING_NUMBER.search(str(rating))
+    return float(found.group(1)) if found else None
+
+
+def to_number(value):
+    """value as a float, or None when it is missing or not a number."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number
+
+
+def convert(currency, value):
+    """A price value in currency, formatted as "<CODE> <amount>" (0.0 without a value)."""
+    if value is None:
+        return 0.0
+    return f"{currency.upper()} {round(value * EXCHANGES.get('rates', {}).get(currency.upper(), 1), 2)}"
 
 
 def sortList(arr, sortBy, reverse):
-    if sortBy == "pr":
-        return arr.sort_values(
-            key=lambda x: x.apply(lambda y: getNumbers(y)),
-            by=["price"],
-            ascending=reverse,
-        )
-    elif sortBy == "ra":
-        arr["rating"] = arr["rating"].apply(lambda x: None if x == "" else float(x) if x is not None else None)
-        return arr.sort_values(by=["rating"], ascending=reverse)
-    return arr
+    column = {"pr": "price_value", "ra": "rating"}.get(sortBy)
+    if column is None:
+        return arr
+    if column in arr:
+        keys = parse_numbers(arr[column], RATING_NUMBER)
+    else:
+        keys = normalize(arr, {column})[column]
+    return arr.loc[keys.sort_values(ascending=reverse).index]
+
+
+def parse_numbers(values, pattern):
+    """The first group of pattern in each value as a float (NaN where it does not match), in one pass."""
+    try:
+        return pd.to_numeric(values).astype(float)
+    except (ValueError, TypeError):
+        found = values.astype(str).str.extract(pattern, expand=False)
+        return pd.to_numeric(found, errors="coerce")
+
+
+def normalize(frame, fields=None, currency=None):
+    """
+    Returns a copy of a products DataFrame with its raw price, rating and review-count
+    columns cleaned up the way formatResult does it and the TYPED_FIELDS columns in fields (all of
+    them for None) added: price_value (float), price_currency (the symbol or code in front
+    of the price) and num_ratings (int). Typed columns the frame already has are kept.
+    With currency, converted_price is filled in from price_value.
+    Each column is parsed as a whole; values that do not parse become NaN (0 ratings).
+    """
+    wanted = TYPED_FIELDS if fields is None else [name for name in TYPED_FIELDS if name in fields]
+    columns = {}
+    if "price" in frame and "price_value" not in frame:
+        raw = frame["price"]
+        parts = raw.astype(str).str.replace(PRICE_JUNK, "", regex=True).str.extract(PRICE_PARTS)
+        empty = raw.isna() | (raw.astype(str) == "")
+        columns["price"] = ("$" + parts["value"]).fillna("Price not available").where(~empty, "")
+        value = pd.to_numeric(parts["value"], errors="coerce")
+        if "price_value" in wanted:
+            columns["price_value"] = value
+        if "price_currency" in wanted and "price_currency" not in frame:
+            columns["price_currency"] = parts["currency"].where(parts["currency"].notna(), None)
+        if currency and "converted_price" in frame:
+            rate = EXCHANGES.get("rates", {}).get(currency.upper(), 1)
+            converted = currency.upper() + " " + (value * rate).round(2).astype(str)
+            columns["converted_price"] = converted.where(value.notna(), 0.0)
+    if "rating" in frame:
+        columns["rating"] = parse_numbers(frame["rating"], RATING_NUMBER)
+    if "no_of_ratings" in frame and "num_ratings" not in frame:
+        raw = frame["no_of_ratings"]
+        digits = raw.astype(str).str.replace(NON_DIGITS, "", regex=True)
+        if raw.dtype == object:
+            columns["no_of_ratings"] = digits.where(raw.map(type) == str, raw)
+        if "num_ratings" in wanted:
+            columns["num_ratings"] = pd.to_numeric(digits, errors="coerce").fillna(0).astype(int)
+    return frame.assign(**columns)
+
+
+def with_none(frame):
+    """The frame with its missing values as None, the way reports and pages show them."""
+    return frame.astype(object).where(frame.notna(), None)
 
 
 def formatSearchQuery(query):
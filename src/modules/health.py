@@ -0,0 +1,174 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The health module tracks how each retailer has been answering and trips a
+per-site circuit breaker, so a failing site is skipped instead of waited on.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Upper bounds in seconds of the latency histogram buckets; the last bucket is unbounded.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Outcomes that count against a site. An empty result only does when the page looked
+# blocked (a captcha or interstitial page, or a non-200 response); a query with no
+# matches is just "empty" and is tracked in empty_rate alone.
+FAILURES = ("error", "timed_out", "blocked")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+    Trips open once at least failure_rate of the last window calls (and no fewer than
+    min_calls) failed. An open breaker rejects calls for cooldown seconds, then lets
+    half_open_max probe calls through: a successful probe closes it, a failed one
+    reopens it with the cooldown doubled, up to max_cooldown.
+    """
+
+    def __init__(self, failure_rate=0.5, min_calls=5, window=20, cooldown=30.0, max_cooldown=600.0,
+                 half_open_max=1):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.half_open_max = half_open_max
+        self.calls = deque(maxlen=window)
+        self.state = CLOSED
+        self.trips = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def current_cooldown(self):
+        return min(self.cooldown * 2 ** max(self.trips - 1, 0), self.max_cooldown)
+
+    def allow(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.current_cooldown():
+            self.state, self.probes = HALF_OPEN, 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_max:
+                return False
+            self.probes += 1
+            return True
+        return self.state == CLOSED
+
+    def record(self, failed, now):
+        if self.state == HALF_OPEN:
+            if failed:
+                self._open(now)
+            else:
+                self.state, self.trips = CLOSED, 0
+                self.calls.clear()
+            return
+        if self.state == OPEN:
+            return
+        self.calls.append(failed)
+        if len(self.calls) >= self.min_calls and sum(self.calls) >= self.failure_rate * len(self.calls):
+            self._open(now)
+
+    def abandon(self):
+        """Frees the probe slot of a call that was cancelled before it had an outcome."""
+        if self.state == HALF_OPEN:
+            self.probes = max(self.probes - 1, 0)
+
+    def _open(self, now):
+        self.state, self.opened_at, self.probes = OPEN, now, 0
+        self.trips += 1
+        self.calls.clear()
+
+
+class SiteHealth:
+    """Rolling record of the last window outcomes and latencies of one site."""
+
+    def __init__(self, window=100):
+        self.outcomes = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, outcome):
+        self.outcomes.append(outcome)
+        self.latencies.append(latency)
+
+    def stats(self):
+        calls = len(self.outcomes)
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in self.latencies:
+            histogram[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        latencies = sorted(self.latencies)
+        return {
+            "calls": calls,
+            "error_rate": self._rate("error", calls),
+            "timeout_rate": self._rate("timed_out", calls),
+            "empty_rate": self._rate("empty", calls),
+            "blocked_rate": self._rate("blocked", calls),
+            "latency_p50": latencies[int(0.5 * (calls - 1))] if calls else None,
+            "latency_p95": latencies[int(0.95 * (calls - 1))] if calls else None,
+            "latency_histogram": dict(zip([f"le_{b}" for b in LATENCY_BUCKETS] + ["inf"], histogram)),
+        }
+
+    def _rate(self, outcome, calls):
+        return self.outcomes.count(outcome) / calls if calls else 0.0
+
+
+class HealthMonitor:
+    """
+    Per-site health tracking plus a CircuitBreaker per site.
+    breaker_options are passed to every site's CircuitBreaker.
+    """
+
+    def __init__(self, window=100, clock=time.monotonic, **breaker_options):
+        self.window = window
+        self.clock = clock
+        self.breaker_options = breaker_options
+        self.sites = {}
+        self.skipped = {}
+        self.lock = threading.Lock()
+
+    def allow(self, site):
+        """Returns False when site's breaker is open; the call is then counted as skipped."""
+        with self.lock:
+            allowed = self._site(site)[1].allow(self.clock())
+            if not allowed:
+                self.skipped[site] = self.skipped.get(site, 0) + 1
+            return allowed
+
+    def record(self, site, latency, outcome):
+        """Records a finished call: outcome is "ok", "empty", "blocked", "error" or "timed_out"."""
+        with self.lock:
+            health, breaker = self._site(site)
+            health.record(latency, outcome)
+            breaker.record(outcome in FAILURES, self.clock())
+
+    def abandon(self, site):
+        with self.lock:
+            self._site(site)[1].abandon()
+
+    def state(self, site):
+        with self.lock:
+            return self._site(site)[1].state
+
+    def stats(self):
+        """Returns each site's health stats with its breaker state and skip count."""
+        with self.lock:
+            return {
+                site: dict(health.stats(), breaker=breaker.state, trips=breaker.trips,
+                           skipped=self.skipped.get(site, 0))
+                for site, (health, breaker) in self.sites.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.sites.clear()
+            self.skipped.clear()
+
+    def _site(self, site):
+        entry = self.sites.get(site)
+        if entry is None:
+            entry = self.sites[site] = (SiteHealth(self.window), CircuitBreaker(**self.breaker_options))
+        return entry
@@ -0,0 +1,236 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The metrics module keeps process-wide counters and latency histograms for the
+scraping hot path and renders them in the Prometheus text exposition format.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the latency histogram buckets (Prometheus client defaults).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """
+    A named metric with one series per combination of label values. With a callback,
+    the series are read from callback() at render time as {label values tuple: value}.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        if self.callback is not None:
+            values = self.callback()
+            with self.lock:
+                self.series = {tuple(str(v) for v in key): value for key, value in values.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            series = sorted(self.series.items())
+            lines.extend(self.samples(key, value) for key, value in series)
+        return lines
+
+    def samples(self, key, value):
+        return f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.series.get(self.key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = value
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram of observed values, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is None:
+                entry = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time spent in the with block, even when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self.lock:
+            entry = self.series.get(self.key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def samples(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = format_labels(self.labelnames, key, [("le", format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """Ordered collection of metrics rendered together on /metrics."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Returns every metric in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A broken callback must not take the whole endpoint down.
+                lines.append(f"# {metric.name} unavailable: {e!r}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Drops every recorded series; callback metrics refill on the next render."""
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = Registry()
+
+SEARCH_SECONDS = METRICS.histogram(
+    "slash_search_seconds", "Time spent in driver for one search across all sites.")
+STAGE_SECONDS = METRICS.histogram(
+    "slash_stage_seconds", "Time spent per site in each pipeline stage (fetch, parse, extract, format).",
+    ["site", "stage"])
+SITE_SEARCH_SECONDS = METRICS.histogram(
+    "slash_site_search_seconds", "Time spent in one site searcher, including all its pages.", ["site"])
+SITE_SEARCHES = METRICS.counter(
+    "slash_site_searches_total", "Finished site searches by outcome (ok, empty, error, timed_out, rejected, skipped).",
+    ["site", "status"])
+DOWNLOADED_BYTES = METRICS.counter(
+    "slash_downloaded_bytes_total", "Response body bytes received from the network.", ["site"])
+FETCH_SOURCES = METRICS.counter(
+    "slash_fetches_total", "Retailer requests by where the response came from (network, cache, replay).",
+    ["site", "source"])
+ITEMS_EXTRACTED = METRICS.counter(
+    "slash_items_extracted_total", "Products returned by the site searchers.", ["site"])
+EXTRACTION_PATHS = METRICS.counter(
+    "slash_extraction_paths_total", "Pages of sites with an embedded-JSON spec, by how they were read (embedded, dom).",
+    ["site", "path"])
+ITEMS_SKIPPED = METRICS.counter(
+    "slash_items_skipped_total", "Results left unextracted because a site already had enough products.", ["site"])
+DB_SECONDS = METRICS.histogram(
+    "slash_db_seconds", "Time spent in DatabaseManager calls.", ["operation"])
+DB_ERRORS = METRICS.counter(
+    "slash_db_errors_total", "DatabaseManager calls that raised.", ["operation"])
+
+
+def site_label(url):
+    """The retailer name for a request URL: the label before the public suffix (www.bestbuy.com -> bestbuy)."""
+    host = urlsplit(url).netloc.split(":")[0].lower()
+    parts = host.split(".")
+    return parts[-2] if len(parts) >= 2 else host or "unknown"
+
+
+def timed(histogram, errors=None):
+    """Decorator observing each call of a method in histogram, labelled operation=<method name>."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(operation=fn.__name__):
+                try:
+                    return fn(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(operation=fn.__name__)
+                    raise
+        return wrapper
+    return decorate
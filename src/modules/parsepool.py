@@ -0,0 +1,128 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The parsepool module moves HTML parsing and extraction off the GIL: raw page bytes
+go to a pool of warm worker processes, which send back compact product records.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+from .extractors import EXTRACTORS, Products, extract_values, format_values
+
+# Worker processes for parsing; 0 parses in threads as before.
+PARSE_WORKERS = int(os.getenv("SLASH_PARSE_WORKERS", "0"))
+# Pages smaller than this are parsed in-thread; shipping them to a process costs more than it saves.
+PARSE_POOL_MIN_BYTES = 32 * 1024
+
+
+def parse_products(site, content, parse_only, df_flag, currency, limit=None, fields=None):
+    """
+    Worker entry point: parses content, runs the site's extractor (stopping once limit
+    products have a title, reading only the columns in fields) and returns (columns,
+    rows, skipped, timings). Rows are value tuples in columns order, which pickle much
+    smaller than one dict per product. timings holds the (start, end) perf_counter
+    readings of the parse, extract and format steps.
+    """
+    spec = EXTRACTORS[site]
+    started = time.perf_counter()
+    if parse_only is None:
+        page = BeautifulSoup(content, "lxml")
+    else:
+        page = BeautifulSoup(content, "lxml", parse_only=parse_only)
+    parsed = time.perf_counter()
+    found = extract_values(spec, page, limit, fields)
+    extracted = time.perf_counter()
+    products = [format_values(spec, values, df_flag, currency, fields) for values in found]
+    timings = {"parse": (started, parsed), "extract": (parsed, extracted), "format": (extracted, time.perf_counter())}
+    columns = tuple(products[0]) if products else ()
+    return columns, [tuple(product[column] for column in columns) for product in products], found.skipped, timings
+
+
+def unpack(columns, rows, skipped=0):
+    return Products((dict(zip(columns, row)) for row in rows), skipped)
+
+
+def _ready(_=None):
+    return os.getpid()
+
+
+class ParsePool:
+    """
+    Lazily started pool of parser processes. Pages of at least min_bytes are
+    parsed in the pool; smaller ones, and every page while workers is 0, are left to
+    the caller to parse in-thread. Workers are started with the forkserver method
+    where available, so they never inherit the scraper's threads or sockets.
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, min_bytes=PARSE_POOL_MIN_BYTES, start_method=None):
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self.start_method = start_method or (
+            "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+        self.executor = None
+        self.lock = threading.Lock()
+        self.counters = {"offloaded": 0, "in_thread": 0}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def accepts(self, content):
+        """Whether a page of this size should go to the pool; counts the decision."""
+        offload = self.enabled and len(content) >= self.min_bytes
+        with self.lock:
+            self.counters["offloaded" if offload else "in_thread"] += 1
+        return offload
+
+    def pool(self):
+        with self.lock:
+            if self.executor is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self.start_method == "forkserver":
+                    context.set_forkserver_preload([__name__])
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self.executor
+
+    def warm(self, wait=True):
+        """
+        Starts the worker processes now, so the first large page does not pay for their
+        startup inside a search deadline. Returns the pids that answered, or [] without wait.
+        """
+        if not self.enabled:
+            return []
+        futures = [self.pool().submit(_ready) for _ in range(self.workers)]
+        return sorted({future.result() for future in futures}) if wait else []
+
+    async def parse(self, site, content, parse_only, df_flag, currency, limit=None, fields=None):
+        """Parses and extracts one page in the pool; returns (products, timings)."""
+        loop = asyncio.get_running_loop()
+        columns, rows, skipped, timings = await loop.run_in_executor(
+            self.pool(), parse_products, site, content, parse_only, df_flag, currency, limit, fields)
+        return unpack(columns, rows, skipped), timings
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, workers=self.workers)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def configure(self, workers=None, min_bytes=None):
+        """Changes the worker count or size threshold; a running pool is restarted on next use."""
+        self.shutdown()
+        if workers is not None:
+            self.workers = workers
+        if min_bytes is not None:
+            self.min_bytes = min_bytes
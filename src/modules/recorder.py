@@ -0,0 +1,118 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The recorder module captures retailer responses into an on-disk corpus and serves
+them back, so the scrapers can be tested and benchmarked without the live sites.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+from .cache import normalize_key
+
+RECORD, REPLAY = "record", "replay"
+
+CORPUS_DIR = os.getenv(
+    "SLASH_CORPUS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "corpus")
+)
+
+
+class MissingRecording(LookupError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+class Corpus:
+    """
+    Directory of recorded responses, one gzipped JSON file per request under a
+    folder per host. Files are named after the normalized request key.
+    """
+
+    def __init__(self, directory=CORPUS_DIR):
+        self.directory = directory
+
+    def path(self, url, params=None):
+        key = normalize_key(url, params)
+        host = urlsplit(key).netloc or "unknown"
+        return os.path.join(self.directory, host, hashlib.sha1(key.encode()).hexdigest()[:20] + ".json.gz")
+
+    def save(self, url, params, status_code, content, headers, elapsed):
+        path = self.path(url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "key": normalize_key(url, params),
+            "status_code": status_code,
+            "headers": dict(headers),
+            "elapsed": elapsed,
+            "body": base64.b64encode(content).decode("ascii"),
+        }
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(path + ".tmp", path)
+
+    def load(self, url, params=None):
+        """Returns (status_code, content, headers, elapsed) for a recorded request."""
+        path = self.path(url, params)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            raise MissingRecording(f"No recorded response for {normalize_key(url, params)}") from None
+        return entry["status_code"], base64.b64decode(entry["body"]), entry["headers"], entry["elapsed"]
+
+    def __len__(self):
+        return sum(len([f for f in files if f.endswith(".json.gz")]) for _, _, files in os.walk(self.directory))
+
+
+class Recorder:
+    """
+    Switch between live traffic (mode None), capturing it (RECORD) and serving it
+    from the corpus (REPLAY). With replay_latency, replayed responses take as long
+    as the recorded ones did.
+    """
+
+    def __init__(self, mode=None, directory=CORPUS_DIR, replay_latency=False):
+        self.lock = threading.Lock()
+        self.counters = {"recorded": 0, "replayed": 0}
+        self.configure(mode, directory, replay_latency)
+
+    def configure(self, mode=None, directory=CORPUS_DIR, replay_latency=False):
+        if mode not in (None, RECORD, REPLAY):
+            raise ValueError(f"Unknown recorder mode: {mode!r}")
+        self.mode = mode
+        self.corpus = Corpus(directory)
+        self.replay_latency = replay_latency
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def record(self, url, params, status_code, content, headers, elapsed):
+        self.corpus.save(url, params, status_code, content, headers, elapsed)
+        self._count("recorded")
+
+    def replay(self, url, params=None):
+        """Returns (status_code, content, headers, delay); delay is 0 unless replay_latency is set."""
+        status_code, content, headers, elapsed = self.corpus.load(url, params)
+        self._count("replayed")
+        return status_code, content, headers, elapsed if self.replay_latency else 0
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, mode=self.mode)
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
@@ -0,0 +1,70 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The retailers module is the plugin registry behind driver: each retailer registers
+its searchers here, and a search only runs the retailers it asks for.
+"""
+
+
+class Retailer:
+    """
+    A retailer plugin. async_search(query, df_flag, currency) is awaited by the drivers
+    and returns a list of product dicts; search is the optional blocking equivalent.
+    A paginated retailer's searchers also take page (1-based) and limit keyword
+    arguments, and a limited one takes limit alone; limit is a hint the retailer may
+    push into its request and extraction. A projected retailer's searchers take a fields
+    keyword and only build those product columns; other retailers' products are cut down
+    to fields after the search.
+    """
+
+    def __init__(self, name, async_search, search=None, paginated=False, limited=False, projected=False):
+        self.name = name
+        self.async_search = async_search
+        self.search = search
+        self.paginated = paginated
+        self.limited = limited
+        self.projected = projected
+
+
+# Registered retailers in the order their results are reported.
+RETAILERS = {}
+
+
+def register(retailer):
+    """Adds retailer to the registry, replacing any plugin with the same name."""
+    RETAILERS[retailer.name] = retailer
+    return retailer
+
+
+def unregister(name):
+    return RETAILERS.pop(name, None)
+
+
+def select_sites(sites=None):
+    """
+    Returns the Retailer plugins to search, in registry order.
+    sites is a list of names (matched case-insensitively) or None for every retailer;
+    an unknown name raises ValueError.
+    """
+    if sites is None:
+        return list(RETAILERS.values())
+    wanted = {name.strip().lower() for name in sites if name.strip()}
+    known = {name.lower() for name in RETAILERS}
+    unknown = sorted(wanted - known)
+    if unknown:
+        raise ValueError(f"Unknown retailer(s): {', '.join(unknown)}. Choose from: {', '.join(RETAILERS)}")
+    return [retailer for name, retailer in RETAILERS.items() if name.lower() in wanted]
+
+
+def parse_sites(value):
+    """Splits a comma-separated sites string (or list of them) into names; empty means every site."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    names = [name.strip() for item in value for name in item.split(",") if name.strip()]
+    return names or None
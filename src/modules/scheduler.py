@@ -0,0 +1,143 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The scheduler module bounds how much scraping work runs at once: a fixed number of
+concurrent site searches, a separate cap per retailer and a bounded wait queue.
+"""
+
+import asyncio
+import contextvars
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SchedulerSaturated(Exception):
+    """Raised instead of queueing when the scheduler's wait queue is full."""
+
+
+class FairLimiter:
+    """
+    Asyncio concurrency limit whose waiters are served round-robin by request,
+    so one request with many queued searches cannot starve the others.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiting = OrderedDict()
+
+    def available(self):
+        return self.active < self.limit and not self.waiting
+
+    def queued(self):
+        return sum(len(waiters) for waiters in self.waiting.values())
+
+    async def acquire(self, request_id):
+        if self.available():
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(request_id, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on.
+                self.release()
+            else:
+                self._forget(request_id, waiter)
+            raise
+
+    def release(self):
+        while self.waiting:
+            request_id, waiters = next(iter(self.waiting.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self.waiting.move_to_end(request_id)
+            else:
+                del self.waiting[request_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _forget(self, request_id, waiter):
+        waiters = self.waiting.get(request_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.waiting[request_id]
+
+
+class Scheduler:
+    """
+    Process-wide scheduler for site searches.
+    At most max_workers searches run at once, at most site_limits[site] (or
+    default_site_limit) of them against the same retailer, and at most max_queue
+    wait for a slot; beyond that run() raises SchedulerSaturated. Blocking work
+    such as HTML parsing goes to a fixed pool of blocking_workers threads.
+    """
+
+    def __init__(self, max_workers=32, default_site_limit=8, site_limits=None, max_queue=256, blocking_workers=8):
+        self.max_workers = max_workers
+        self.default_site_limit = default_site_limit
+        self.site_limits = dict(site_limits or {})
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=blocking_workers, thread_name_prefix="slash-worker")
+        self.rejected = 0
+        # Limiters hold asyncio futures, so each event loop gets its own set.
+        self.limiters = weakref.WeakKeyDictionary()
+
+    async def run(self, site, request_id, factory):
+        """Awaits factory() once a worker slot and a slot for site are free."""
+        workers, sites = self._limiters()
+        bulkhead = sites.get(site)
+        if bulkhead is None:
+            bulkhead = sites[site] = FairLimiter(self.site_limits.get(site, self.default_site_limit))
+        must_wait = not (bulkhead.available() and workers.available())
+        if must_wait and self._queued(workers, sites) >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerSaturated(f"scrape queue is full ({self.max_queue} waiting)")
+        await bulkhead.acquire(request_id)
+        try:
+            await workers.acquire(request_id)
+            try:
+                return await factory()
+            finally:
+                workers.release()
+        finally:
+            bulkhead.release()
+
+    async def run_blocking(self, fn, *args):
+        """Runs a blocking call on the scheduler's thread pool, in a copy of the caller's context."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, *args)
+
+    def stats(self):
+        """Returns active and queued counts overall and per site, rejections and the blocking pool's backlog."""
+        stats = {"active": 0, "queued": 0, "rejected": self.rejected,
+                 "blocking_queued": self.executor._work_queue.qsize(), "sites": {}}
+        for workers, sites in list(self.limiters.values()):
+            stats["active"] += workers.active
+            stats["queued"] += self._queued(workers, sites)
+            for site, bulkhead in sites.items():
+                site_stats = stats["sites"].setdefault(site, {"active": 0, "queued": 0})
+                site_stats["active"] += bulkhead.active
+                site_stats["queued"] += bulkhead.queued()
+        return stats
+
+    def _limiters(self):
+        loop = asyncio.get_running_loop()
+        limiters = self.limiters.get(loop)
+        if limiters is None:
+            limiters = self.limiters[loop] = (FairLimiter(self.max_workers), {})
+        return limiters
+
+    @staticmethod
+    def _queued(workers, sites):
+        return workers.queued() + sum(bulkhead.queued() for bulkhead in sites.values())
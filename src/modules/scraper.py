@@ -8,84 +8,632 @@ You should have received a copy of the MIT license with this file. If not, pleas
 The scraper module contains functions that scrape various e-commerce websites.
 """
 
+import asyncio
+import atexit
+import contextvars
+import json
+import queue
+import threading
+import time
+import weakref
+import aiohttp
 import requests
 import os
 import re
 import pandas as pd
-from bs4 import BeautifulSoup
+from collections import namedtuple
+from contextlib import aclosing
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime
-from ebaysdk.finding import Connection
-from .formatter import formatSearchQuery, formatResult, getCurrency, sortList
-from concurrent.futures import ThreadPoolExecutor
+from .formatter import (formatSearchQuery, formatResult, getCurrency, sortList, parse_price, parse_rating,
+                        product_fields, project, with_none)
+from .cache import ResponseCache, MemoryCache, SQLiteCache, normalize_key
+from .singleflight import SingleFlight, AsyncSingleFlight
+from .scheduler import Scheduler, SchedulerSaturated
+from .extractors import EXTRACTORS, Products, extract, skipped
+from .retailers import Retailer, register, select_sites
+from .health import HealthMonitor, CLOSED
+from .transport import Transport, RetryPolicy, RateLimiter
+from .recorder import Recorder
+from .streaming import ContainerParser, STREAM_CHUNK
+from .parsepool import ParsePool
+from .embedded import EMBEDDED, EmbeddedPage, read_embedded
+from .metrics import (
+    METRICS, STAGE_SECONDS, SEARCH_SECONDS, SITE_SEARCH_SECONDS, SITE_SEARCHES, DOWNLOADED_BYTES, FETCH_SOURCES,
+    ITEMS_EXTRACTED, ITEMS_SKIPPED, site_label
+)
+from .tracing import TRACER, CURRENT_SPAN, span, record_span, in_current_span
 
 # Create a global session to enable connection pooling.
 SESSION = requests.Session()
 
-def httpsGet(URL):
+# Shared cache under every retailer fetch; set to None to always go to the network.
+RESPONSE_CACHE = ResponseCache(MemoryCache(), SQLiteCache())
+
+FetchResult = namedtuple("FetchResult", ["status_code", "content", "headers"])
+StreamedPage = namedtuple("StreamedPage", ["status_code", "headers", "parser", "complete"])
+
+# Retries and per-host rate limits applied to every request made on SESSION or the aiohttp session.
+TRANSPORT = Transport(RetryPolicy(), RateLimiter())
+
+# Captures responses to, or replays them from, an on-disk corpus (SLASH_RECORD=record|replay).
+RECORDER = Recorder(os.getenv("SLASH_RECORD") or None)
+
+# Concurrent requests for the same URL share one network round trip (and, for
+# httpsGet, one parsed page) instead of each going to the retailer.
+FETCHES = SingleFlight()
+PAGES = SingleFlight()
+ASYNC_FETCHES = AsyncSingleFlight()
+ASYNC_PAGES = AsyncSingleFlight()
+
+# Process-wide limits on concurrent site searches, per retailer and overall.
+SCHEDULER = Scheduler()
+
+# Per-site health and circuit breakers; a site whose breaker is open is skipped.
+SITE_HEALTH = HealthMonitor()
+
+
+def _scheduler_depth():
+    stats = SCHEDULER.stats()
+    depth = {("all", "active"): stats["active"], ("all", "queued"): stats["queued"],
+             ("parser_pool", "queued"): stats["blocking_queued"]}
+    for site, site_stats in stats["sites"].items():
+        depth[(site.lower(), "active")] = site_stats["active"]
+        depth[(site.lower(), "queued")] = site_stats["queued"]
+    return depth
+
+
+# Gauges and counters read from the components above each time /metrics is scraped.
+METRICS.gauge("slash_scheduler_tasks", "Site searches running or waiting in SCHEDULER, and parse jobs queued "
+              "for its thread pool.", ["site", "state"], _scheduler_depth)
+METRICS.counter("slash_scheduler_rejected_total", "Site searches rejected because the scheduler queue was full.",
+                callback=lambda: {(): SCHEDULER.rejected})
+METRICS.counter("slash_cache_events_total", "RESPONSE_CACHE hits, misses, stores and evictions.", ["event"],
+                lambda: {(event,): n for event, n in (RESPONSE_CACHE.stats() if RESPONSE_CACHE else {}).items()})
+METRICS.counter("slash_transport_events_total", "Request attempts, retries and rate-limit waits in TRANSPORT.",
+                ["event"], lambda: {(event,): n for event, n in TRANSPORT.stats().items()})
+METRICS.gauge("slash_circuit_open", "1 while a site's circuit breaker is open or half-open.", ["site"],
+              lambda: {(site.lower(),): int(s["breaker"] != CLOSED) for site, s in SITE_HEALTH.stats().items()})
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/78.0.3904.108 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'no-cache'
+}
+
+ETSY_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_2) AppleWebKit/601.3.9 (KHTML, like Gecko) Version/9.0.2 Safari/601.3.9"
+}
+
+TARGET_API_URL = 'https://redsky.target.com/redsky_aggregations/v1/web/plp_search_v1'
+TARGET_PAGE_SIZE = 24
+
+EBAY_API_URL = 'https://svcs.ebay.com/services/search/FindingService/v1'
+EBAY_APP = 'BradleyE-slash-PRD-2ddd2999f-2ae39cfa'
+EBAY_PAGE_SIZE = 100
+
+# (connect, read) timeouts in seconds for a single request, tunable per site.
+DEFAULT_TIMEOUT = (1.0, 2.0)
+SITE_TIMEOUTS = {
+    "amazon": DEFAULT_TIMEOUT,
+    "walmart": DEFAULT_TIMEOUT,
+    "Etsy": DEFAULT_TIMEOUT,
+    "google": DEFAULT_TIMEOUT,
+    "bjs": DEFAULT_TIMEOUT,
+    "ebay": DEFAULT_TIMEOUT,
+    "bestbuy": DEFAULT_TIMEOUT,
+    "target": DEFAULT_TIMEOUT,
+}
+# Total budget in seconds for one search across all sites; None waits for every site.
+SEARCH_DEADLINE = 2.5
+# A multi-page sweep fetches page 1 and then pages 2..N in parallel, so it gets this many deadlines.
+PAGED_DEADLINE_FACTOR = 2
+
+# The result containers each HTML searcher reads. Only these subtrees are built when
+# PARTIAL_PARSING is on; set it to False to fall back to parsing whole pages.
+PARTIAL_PARSING = True
+PAGE_STRAINERS = {
+    "amazon": SoupStrainer("div", attrs={"data-component-type": "s-search-result"}),
+    "walmart": SoupStrainer("div", attrs={"data-item-id": True}),
+    "bjs": SoupStrainer("div", class_="product"),
+    "bestbuy": SoupStrainer("li", class_="sku-item"),
+}
+
+# With STREAM_PARSING on, a searcher asked for at most limit products reads its page
+# incrementally and stops downloading once limit result containers have arrived.
+STREAM_PARSING = os.getenv("SLASH_STREAM") == "1"
+
+# Worker processes that parse large search pages off the GIL (SLASH_PARSE_WORKERS);
+# with no workers every page is parsed on the scheduler's threads.
+PARSE_POOL = ParsePool()
+atexit.register(lambda: PARSE_POOL.shutdown())
+
+# One event loop, run on a daemon thread, serves every synchronous driver call
+# so concurrent searches share a single aiohttp connection pool.
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_ASYNC_SESSIONS = weakref.WeakKeyDictionary()
+
+
+def _get_loop():
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="slash-scraper", daemon=True).start()
+    return _LOOP
+
+
+def run_async(coro):
+    """Runs a coroutine on the shared scraper event loop and blocks until it returns."""
+    return asyncio.run_coroutine_threadsafe(in_current_span(coro), _get_loop()).result()
+
+
+def get_async_session():
+    """Returns the aiohttp session of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    session = _ASYNC_SESSIONS.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100), trace_configs=[_trace_config()])
+        _ASYNC_SESSIONS[loop] = session
+    return session
+
+
+def _trace_config():
+    """aiohttp hooks adding dns and connect spans (TCP plus TLS) to the traced fetch."""
+    config = aiohttp.TraceConfig()
+
+    def hooks(name):
+        async def start(session, context, params):
+            if CURRENT_SPAN.get() is not None:
+                setattr(context, name, time.perf_counter())
+
+        async def end(session, context, params):
+            started = getattr(context, name, None)
+            if started is not None:
+                record_span(name, started, time.perf_counter())
+        return start, end
+
+    dns_start, dns_end = hooks("dns")
+    connect_start, connect_end = hooks("connect")
+    config.on_dns_resolvehost_start.append(dns_start)
+    config.on_dns_resolvehost_end.append(dns_end)
+    config.on_connection_create_start.append(connect_start)
+    config.on_connection_create_end.append(connect_end)
+    return config
+
+
+def client_timeout(timeout):
+    """Converts a (connect, read) timeout tuple to an aiohttp.ClientTimeout."""
+    connect, read = timeout
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+@atexit.register
+def _close_loop_session():
+    loop = _LOOP
+    session = _ASYNC_SESSIONS.get(loop) if loop is not None else None
+    if session is not None and not session.closed and loop.is_running():
+        asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+
+
+# Markers of captcha and interstitial pages retailers serve instead of search results.
+BLOCKED_PAGE = re.compile(rb"captcha|robot check|access denied|pardon our interruption|are you a human"
+                          rb"|verify you are (?:a )?human|request blocked", re.I)
+# The (status, body) of every response a site search fetched, while _search_site runs it.
+SITE_RESPONSES = contextvars.ContextVar("site_responses", default=None)
+
+
+def note_response(status, content):
+    """Keeps a response for the running site search, so an empty result can be told from a blocked one."""
+    responses = SITE_RESPONSES.get()
+    if responses is not None:
+        responses.append((status, content))
+
+
+def looks_blocked(responses):
+    """True if any response was not a 200 or was a captcha or interstitial page."""
+    return any(status != 200 or BLOCKED_PAGE.search(content) for status, content in responses)
+
+
+def coalesce(flight, key, get):
+    """
+    Runs get through a SingleFlight and notes the responses it fetched for every caller,
+    not only the one whose call was shared, so each site search can tell if it was blocked.
+    """
+    def shared():
+        responses = []
+        token = SITE_RESPONSES.set(responses)
+        try:
+            return get(), responses
+        finally:
+            SITE_RESPONSES.reset(token)
+    result, responses = flight.do(key, shared)
+    for status, content in responses:
+        note_response(status, content)
+    return result
+
+
+async def async_coalesce(flight, key, get):
+    """Asynchronous version of coalesce for an AsyncSingleFlight, whose shared task runs in its own context."""
+    async def shared():
+        responses = []
+        SITE_RESPONSES.set(responses)
+        return await get(), responses
+    result, responses = await flight.do(key, shared)
+    for status, content in responses:
+        note_response(status, content)
+    return result
+
+
+def cacheable(status, content):
+    """True for a 200 response that is not a captcha or interstitial page, the only kind RESPONSE_CACHE keeps."""
+    return status == 200 and not BLOCKED_PAGE.search(content)
+
+
+def fetch(url, headers=HEADERS, params=None, timeout=DEFAULT_TIMEOUT, allow_redirects=True):
+    """
+    GETs a retailer URL on the global SESSION, answering from RESPONSE_CACHE when possible.
+    Identical concurrent requests are coalesced, and network requests go through TRANSPORT
+    (rate limits and retries). Only cacheable responses are stored in the cache.
+    In RECORDER's replay mode the response comes from the corpus instead; in record
+    mode the cache is skipped and every response is saved to the corpus.
+    The time spent is recorded as the site's fetch stage in STAGE_SECONDS and as a fetch span.
+    """
+    site = site_label(url)
+    with STAGE_SECONDS.time(site=site, stage="fetch"), span("fetch", url=url):
+        result = _fetch(site, url, headers, params, timeout, allow_redirects)
+    note_response(result.status_code, result.content)
+    return result
+
+
+def _fetch(site, url, headers, params, timeout, allow_redirects):
+    if RECORDER.replaying:
+        status_code, content, response_headers, delay = RECORDER.replay(url, params)
+        count_fetch(site, "replay")
+        time.sleep(delay)
+        return FetchResult(status_code, content, response_headers)
+    if RESPONSE_CACHE is not None and not RECORDER.recording:
+        cached = RESPONSE_CACHE.get(url, params)
+        if cached is not None:
+            count_fetch(site, "cache")
+            return FetchResult(200, *cached)
+
+    def send():
+        with span("request"):
+            response = SESSION.get(url, headers=headers, params=params,
+                                   allow_redirects=allow_redirects, timeout=timeout)
+        return FetchResult(response.status_code, response.content, dict(response.headers))
+
+    def get():
+        started = time.monotonic()
+        result = TRANSPORT.request(url, send)
+        count_fetch(site, "network", len(result.content))
+        if RECORDER.recording:
+            RECORDER.record(url, params, *result, time.monotonic() - started)
+        if RESPONSE_CACHE is not None and cacheable(result.status_code, result.content):
+            RESPONSE_CACHE.set(url, params, result.content, result.headers)
+        return result
+    return FETCHES.do(normalize_key(url, params), get)
+
+
+async def async_fetch(url, headers=HEADERS, params=None, timeout=DEFAULT_TIMEOUT, allow_redirects=True):
+    """Asynchronous version of fetch built on the shared aiohttp session."""
+    site = site_label(url)
+    with STAGE_SECONDS.time(site=site, stage="fetch"), span("fetch", url=url):
+        result = await _async_fetch(site, url, headers, params, timeout, allow_redirects)
+    note_response(result.status_code, result.content)
+    return result
+
+
+async def _async_fetch(site, url, headers, params, timeout, allow_redirects):
+    if RECORDER.replaying:
+        status_code, content, response_headers, delay = RECORDER.replay(url, params)
+        count_fetch(site, "replay")
+        await asyncio.sleep(delay)
+        return FetchResult(status_code, content, response_headers)
+    if RESPONSE_CACHE is not None and not RECORDER.recording:
+        # The SQLite tier blocks, so it is only asked off the event loop on a memory miss.
+        cached = RESPONSE_CACHE.get(url, params, disk=False)
+        if cached is None and RESPONSE_CACHE.disk is not None:
+            cached = await SCHEDULER.run_blocking(RESPONSE_CACHE.get, url, params)
+        if cached is not None:
+            count_fetch(site, "cache")
+            return FetchResult(200, *cached)
+
+    async def send():
+        with span("request") as request_span:
+            async with get_async_session().get(url, headers=headers, params=params, allow_redirects=allow_redirects,
+                                               timeout=client_timeout(timeout)) as response:
+                with span("download"):
+                    content = await response.read()
+                if request_span is not None:
+                    request_span.set(status=response.status, bytes=len(content))
+                return FetchResult(response.status, content, dict(response.headers))
+
+    async def get():
+        started = time.monotonic()
+        result = await TRANSPORT.async_request(url, send)
+        count_fetch(site, "network", len(result.content))
+        if RECORDER.recording:
+            await SCHEDULER.run_blocking(RECORDER.record, url, params, *result, time.monotonic() - started)
+        if RESPONSE_CACHE is not None and cacheable(result.status_code, result.content):
+            await SCHEDULER.run_blocking(RESPONSE_CACHE.set, url, params, result.content, result.headers)
+        return result
+    return await ASYNC_FETCHES.do(normalize_key(url, params), get)
+
+
+def count_fetch(site, source, size=None):
+    """Counts where a fetch was answered from, plus the bytes downloaded, and notes it on the fetch span."""
+    FETCH_SOURCES.inc(site=site, source=source)
+    if size is not None:
+        DOWNLOADED_BYTES.inc(size, site=site)
+    current = CURRENT_SPAN.get()
+    if current is not None:
+        current.set(source=source)
+
+
+def pageParam(name, page):
+    """Query string suffix selecting result page; page 1 keeps the retailer's plain search URL."""
+    return f"&{name}={page}" if page > 1 else ""
+
+
+def parsePage(content, parse_only=None):
+    """
+    Parses a page with the fast "lxml" parser.
+    With a parse_only strainer only the matching subtrees are built, unless PARTIAL_PARSING is off.
+    """
+    if parse_only is None or not PARTIAL_PARSING:
+        return BeautifulSoup(content, "lxml")
+    return BeautifulSoup(content, "lxml", parse_only=parse_only)
+
+
+def readPage(site, content, parse_only=None):
+    """
+    Reads a fetched page. A search page (one read with a strainer) of a site with an
+    EMBEDDED spec comes back as an EmbeddedPage when its JSON state blob lists products,
+    without building a DOM; every other page is parsed with parsePage.
+    """
+    if parse_only is not None and site in EMBEDDED:
+        page = read_embedded(EMBEDDED[site], content)
+        if page is not None:
+            return page
+    return parsePage(content, parse_only)
+
+
+def observed(site, stage, fn, *args):
+    """Calls fn(*args), recording the time it takes as site's stage in STAGE_SECONDS and as a span."""
+    with STAGE_SECONDS.time(site=site, stage=stage), span(stage, site=site):
+        return fn(*args)
+
+
+def httpsGet(URL, timeout=DEFAULT_TIMEOUT, parse_only=None):
     """
     Makes an HTTP GET request to the specified URL with custom headers.
     Reuses the global SESSION for connection pooling.
     Uses the "lxml" parser without an extra prettify call.
+    Concurrent calls for the same URL share the parsed page, which callers must not modify.
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/78.0.3904.108 Safari/537.36',
-        'Accept-Encoding': 'gzip, deflate',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'no-cache'
-    }
-    response = SESSION.get(URL, headers=headers, allow_redirects=False)
-    # Parse once using the fast "lxml" parser.
-    return BeautifulSoup(response.content, "lxml")
+    def get():
+        response = fetch(URL, allow_redirects=False, timeout=timeout)
+        site = site_label(URL)
+        return observed(site, "parse", readPage, site, response.content, parse_only)
+    with span("httpsGet", url=URL):
+        return coalesce(PAGES, (normalize_key(URL), id(parse_only)), get)
 
 
-def searchAmazon(query, df_flag, currency):
-    query = formatSearchQuery(query)
-    URL = f"https://www.amazon.com/s?k={query}"
-    page = httpsGet(URL)
-    results = page.findAll("div", {"data-component-type": "s-search-result"})
-    products = []
-    for res in results:
-        titles, prices, links = (
-            res.select("h2 a span"),
-            res.select("span.a-price span"),
-            res.select("h2 a.a-link-normal")
-        )
-        ratings = res.select("span.a-icon-alt")
-        num_ratings = res.select("span.a-size-base")
-        trending = res.select("span.a-badge-text")
-        img_links = res.select("img.s-image")
-        trending = trending[0] if trending else None
-        product = formatResult("amazon", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency, img_links)
-        products.append(product)
+async def async_httpsGet(URL, timeout=DEFAULT_TIMEOUT, parse_only=None):
+    """
+    Asynchronous version of httpsGet built on the shared aiohttp session.
+    The page is parsed on the scheduler's thread pool so the event loop keeps serving other fetches.
+    """
+    async def get():
+        response = await async_fetch(URL, allow_redirects=False, timeout=timeout)
+        site = site_label(URL)
+        return await SCHEDULER.run_blocking(observed, site, "parse", readPage, site, response.content, parse_only)
+    with span("httpsGet", url=URL):
+        return await async_coalesce(ASYNC_PAGES, (normalize_key(URL), id(parse_only)), get)
+
+
+def body_charset(headers):
+    """The charset named in a Content-Type header, defaulting to UTF-8."""
+    for name, value in headers.items():
+        if name.lower() == "content-type" and "charset=" in value:
+            return value.split("charset=", 1)[1].split(";")[0].strip().strip('"') or "utf-8"
+    return "utf-8"
+
+
+def parseContainers(chunks, parse_only, limit=None, encoding="utf-8"):
+    """Runs chunks through a ContainerParser and returns it once limit containers are found or the body ends."""
+    parser = ContainerParser(parse_only, limit, encoding)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            return parser
+    parser.close()
+    return parser
+
+
+def stored_body(URL):
+    """The body of URL from the recorder or RESPONSE_CACHE, or None when it has to be downloaded."""
+    if RECORDER.replaying or RECORDER.recording:
+        return fetch(URL, allow_redirects=False).content
+    cached = RESPONSE_CACHE.get(URL) if RESPONSE_CACHE is not None else None
+    if cached is not None:
+        count_fetch(site_label(URL), "cache")
+        return cached[0]
+    return None
+
+
+def streamPage(URL, timeout=DEFAULT_TIMEOUT, parse_only=None, limit=None):
+    """
+    Streaming version of httpsGet that returns a page holding only the result containers
+    matching parse_only. The body is parsed as it downloads, and the download stops once
+    limit containers have arrived. Only a body that was read to the end is cached.
+    """
+    site = site_label(URL)
+
+    def get():
+        with span("fetch", url=URL, streamed=True):
+            body = stored_body(URL)
+            if body is not None:
+                parser = observed(site, "parse", parseContainers, [body], parse_only, limit)
+                return observed(site, "parse", parsePage, parser.html())
+
+            def send():
+                with span("request"), SESSION.get(URL, headers=HEADERS, allow_redirects=False, timeout=timeout,
+                                                  stream=True) as response:
+                    if response.status_code != 200:
+                        return StreamedPage(response.status_code, dict(response.headers), None, False)
+                    headers = dict(response.headers)
+                    chunks = response.iter_content(STREAM_CHUNK)
+                    with span("download"):
+                        parser = observed(site, "parse", parseContainers, chunks, parse_only, limit,
+                                          body_charset(headers))
+                    return StreamedPage(200, headers, parser, not parser.done)
+            # The fetch stage of a streamed page includes the parsing interleaved with the download.
+            with STAGE_SECONDS.time(site=site, stage="fetch"):
+                result = TRANSPORT.request(URL, send)
+            return finishStream(URL, site, result)
+    return coalesce(PAGES, ("stream", normalize_key(URL), id(parse_only), limit), get)
+
+
+async def async_streamPage(URL, timeout=DEFAULT_TIMEOUT, parse_only=None, limit=None):
+    """
+    Asynchronous version of streamPage. Each chunk is parsed on the scheduler's thread
+    pool as soon as it arrives, overlapping the download with parsing.
+    """
+    site = site_label(URL)
+
+    async def get():
+        with span("fetch", url=URL, streamed=True):
+            body = await SCHEDULER.run_blocking(stored_body, URL)
+            if body is not None:
+                parser = await SCHEDULER.run_blocking(observed, site, "parse", parseContainers, [body], parse_only,
+                                                      limit)
+                return await SCHEDULER.run_blocking(observed, site, "parse", parsePage, parser.html())
+
+            async def send():
+                with span("request"):
+                    async with get_async_session().get(URL, headers=HEADERS, allow_redirects=False,
+                                                       timeout=client_timeout(timeout)) as response:
+                        headers = dict(response.headers)
+                        if response.status != 200:
+                            return StreamedPage(response.status, headers, None, False)
+                        parser = ContainerParser(parse_only, limit, body_charset(headers))
+                        with span("download"):
+                            async for chunk in response.content.iter_chunked(STREAM_CHUNK):
+                                await SCHEDULER.run_blocking(observed, site, "parse", parser.feed, chunk)
+                                if parser.done:
+                                    break
+                            else:
+                                await SCHEDULER.run_blocking(observed, site, "parse", parser.close)
+                        return StreamedPage(200, headers, parser, not parser.done)
+            # The fetch stage of a streamed page includes the parsing interleaved with the download.
+            with STAGE_SECONDS.time(site=site, stage="fetch"):
+                result = await TRANSPORT.async_request(URL, send)
+            return await SCHEDULER.run_blocking(finishStream, URL, site, result)
+    return await async_coalesce(ASYNC_PAGES, ("stream", normalize_key(URL), id(parse_only), limit), get)
+
+
+def finishStream(URL, site, result):
+    """Counts a streamed download, caches a completely read (cacheable) body and parses the kept containers."""
+    if result.parser is None:
+        count_fetch(site, "network", 0)
+        note_response(result.status_code, b"")
+        return parsePage(b"")
+    count_fetch(site, "network", result.parser.bytes)
+    if result.complete and RESPONSE_CACHE is not None:
+        body = result.parser.body()
+        if cacheable(result.status_code, body):
+            RESPONSE_CACHE.set(URL, None, body, result.headers)
+    return observed(site, "parse", parsePage, result.parser.html())
+
+
+def streams(site, limit):
+    return STREAM_PARSING and limit and site in PAGE_STRAINERS
+
+
+def searchPage(URL, site, limit=None):
+    """Fetches and parses a site's search page, streaming it when STREAM_PARSING is on and a limit is given."""
+    if streams(site, limit):
+        return streamPage(URL, SITE_TIMEOUTS[site], PAGE_STRAINERS[site], limit)
+    return httpsGet(URL, SITE_TIMEOUTS[site], PAGE_STRAINERS.get(site))
+
+
+async def async_searchPage(URL, site, limit=None):
+    """Asynchronous version of searchPage."""
+    if streams(site, limit):
+        return await async_streamPage(URL, SITE_TIMEOUTS[site], PAGE_STRAINERS[site], limit)
+    return await async_httpsGet(URL, SITE_TIMEOUTS[site], PAGE_STRAINERS.get(site))
+
+
+async def async_searchProducts(URL, site, parse, df_flag, currency, limit=None, fields=None):
+    """
+    Returns the products on a site's search page, read with parse(page, df_flag, currency, limit, fields).
+    While PARSE_POOL has workers, a large page is parsed and extracted with the site's
+    EXTRACTORS spec in a worker process instead, and only the product records come back.
+    A page with a usable EMBEDDED state blob is read from the blob, which costs less than shipping it.
+    Extraction and formatting run on the scheduler's thread pool, off the event loop.
+    """
+    if not PARSE_POOL.enabled or streams(site, limit):
+        page = await async_searchPage(URL, site, limit)
+        return await SCHEDULER.run_blocking(parse, page, df_flag, currency, limit, fields)
+    response = await async_fetch(URL, allow_redirects=False, timeout=SITE_TIMEOUTS[site])
+    if site in EMBEDDED:
+        page = await SCHEDULER.run_blocking(observed, site, "parse", read_embedded, EMBEDDED[site], response.content)
+        if page is not None:
+            return await SCHEDULER.run_blocking(parse, page, df_flag, currency, limit, fields)
+    parse_only = PAGE_STRAINERS.get(site) if PARTIAL_PARSING else None
+    if not PARSE_POOL.accepts(response.content):
+        page = await SCHEDULER.run_blocking(observed, site, "parse", parsePage, response.content, parse_only)
+        return await SCHEDULER.run_blocking(parse, page, df_flag, currency, limit, fields)
+    with span("parse_pool", site=site, bytes=len(response.content)):
+        products, timings = await PARSE_POOL.parse(site, response.content, parse_only, df_flag, currency, limit,
+                                                     fields)
+        for stage, (start, end) in timings.items():
+            # perf_counter is the system-wide monotonic clock, so worker readings line up with ours.
+            STAGE_SECONDS.observe(end - start, site=site, stage=stage)
+            record_span(stage, start, end, site=site)
     return products
 
 
-def searchWalmart(query, df_flag, currency):
+def searchAmazon(query, df_flag, currency, page=1, limit=None, fields=None):
     query = formatSearchQuery(query)
-    URL = f"https://www.walmart.com/search?q={query}"
-    page = httpsGet(URL)
-    results = page.findAll("div", {"data-item-id": True})
-    products = []
-    pattern = re.compile(r"out of 5 Stars")
-    for res in results:
-        titles, prices, links = (
-            res.select("span.lh-title"),
-            res.select("div.lh-copy"),
-            res.select("a")
-        )
-        ratings = res.findAll("span", {"class": "w_iUH7"}, text=pattern)
-        num_ratings = res.findAll("span", {"class": "sans-serif gray f7"})
-        trending = res.select("span.w_Cs")
-        img_links = res.select("div.relative.overflow-hidden img")
-        trending = trending[0] if trending else None
-        product = formatResult("walmart", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency, img_links)
-        products.append(product)
-    return products
+    URL = f"https://www.amazon.com/s?k={query}" + pageParam("page", page)
+    return parseAmazon(searchPage(URL, "amazon", limit), df_flag, currency, limit, fields)
+
+
+async def async_searchAmazon(query, df_flag, currency, page=1, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    URL = f"https://www.amazon.com/s?k={query}" + pageParam("page", page)
+    return await async_searchProducts(URL, "amazon", parseAmazon, df_flag, currency, limit, fields)
+
+
+def parseAmazon(page, df_flag, currency, limit=None, fields=None):
+    return extract(EXTRACTORS["amazon"], page, df_flag, currency, limit, fields)
+
+
+def searchWalmart(query, df_flag, currency, page=1, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    URL = f"https://www.walmart.com/search?q={query}" + pageParam("page", page)
+    return parseWalmart(searchPage(URL, "walmart", limit), df_flag, currency, limit, fields)
+
+
+async def async_searchWalmart(query, df_flag, currency, page=1, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    URL = f"https://www.walmart.com/search?q={query}" + pageParam("page", page)
+    return await async_searchProducts(URL, "walmart", parseWalmart, df_flag, currency, limit, fields)
+
+
+def parseWalmart(page, df_flag, currency, limit=None, fields=None):
+    if isinstance(page, EmbeddedPage):
+        return page.products(df_flag, currency, limit, fields)
+    return extract(EXTRACTORS["walmart"], page, df_flag, currency, limit, fields)
 
 
 def google_scraper(link):
@@ -142,14 +690,23 @@ def target_scraper(link):
         return None
 
 
-def searchEtsy(query, df_flag, currency):
+def searchEtsy(query, df_flag, currency, page=1, limit=None, fields=None):
     query = formatSearchQuery(query)
-    url = f"https://www.etsy.com/search?q={query}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_2) AppleWebKit/601.3.9 (KHTML, like Gecko) Version/9.0.2 Safari/601.3.9"
-    }
-    response = SESSION.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, "lxml")
+    url = f"https://www.etsy.com/search?q={query}" + pageParam("page", page)
+    response = fetch(url, headers=ETSY_HEADERS, timeout=SITE_TIMEOUTS["Etsy"])
+    soup = observed("etsy", "parse", BeautifulSoup, response.content, "lxml")
+    return observed("etsy", "format", parseEtsy, soup, df_flag, currency, fields)
+
+
+async def async_searchEtsy(query, df_flag, currency, page=1, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    url = f"https://www.etsy.com/search?q={query}" + pageParam("page", page)
+    response = await async_fetch(url, headers=ETSY_HEADERS, timeout=SITE_TIMEOUTS["Etsy"])
+    soup = await SCHEDULER.run_blocking(observed, "etsy", "parse", BeautifulSoup, response.content, "lxml")
+    return await SCHEDULER.run_blocking(observed, "etsy", "format", parseEtsy, soup, df_flag, currency, fields)
+
+
+def parseEtsy(soup, df_flag, currency, fields=None):
     products = []
     for item in soup.findAll(".wt-grid__item-xs-6"):
         links = item.select("a")
@@ -163,126 +720,147 @@ def searchEtsy(query, df_flag, currency):
             ratings, num_ratings = ratings_text.get_text().split()[:2]
         trending = item.select("span.wt-badge")[0] if item.select("span.wt-badge") else None
         product = formatResult("Etsy", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency)
+                                num_ratings, trending, df_flag, currency, fields=fields)
         products.append(product)
     return products
 
 
-def searchGoogleShopping(query, df_flag, currency):
+def searchGoogleShopping(query, df_flag, currency, limit=None, fields=None):
     query = formatSearchQuery(query)
     URL = f"https://www.google.com/search?tbm=shop&q={query}"
-    page = httpsGet(URL)
-    results = page.findAll("div", {"class": "sh-dgr__grid-result"})
-    results1 = page.find_all()
-    products = []
-    pattern = re.compile(r"[0-9]+ product reviews")
-    for i, res in enumerate(results):
-        titles, prices, links = (
-            res.select("h3"),
-            res.select("span.a8Pemb"),
-            res.select("a"),
-        )
-        ratings = res.findAll("span", {"class": "Rsc7Yb"})
-        num_ratings = None
-        ratings_number = res.find("span", {"class": "QIrs8"}).get_text()
-        if ratings_number:
-            match = re.search(r'(\d+,\d+)', ratings_number)
-            if match:
-                num_ratings = match.group(1)
-        trending = res.select("span.Ib8pOd")
-        img_links = results1[i].select("div.SirUVb.sh-img__image img")
-        trending = trending[0] if trending else None
-        product = formatResult("google", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency, img_links)
-        products.append(product)
-    return products
+    return parseGoogleShopping(httpsGet(URL, SITE_TIMEOUTS["google"]), df_flag, currency, limit, fields)
 
 
-def searchBJs(query, df_flag, currency):
+async def async_searchGoogleShopping(query, df_flag, currency, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    URL = f"https://www.google.com/search?tbm=shop&q={query}"
+    return await async_searchProducts(URL, "google", parseGoogleShopping, df_flag, currency, limit, fields)
+
+
+def parseGoogleShopping(page, df_flag, currency, limit=None, fields=None):
+    return extract(EXTRACTORS["google"], page, df_flag, currency, limit, fields)
+
+
+def searchBJs(query, df_flag, currency, limit=None, fields=None):
     query = formatSearchQuery(query)
     URL = f"https://www.bjs.com/search/{query}"
-    page = httpsGet(URL)
-    results = page.findAll("div", {"class": "product"})
-    products = []
-    for res in results:
-        titles, prices, links = (
-            res.find("p", {"class": "no-select d-none auto-height"}),
-            res.select("span.price"),
-            res.select("a"),
-        )
-        ratings = res.findAll("span", {"class": "on"})
-        num_ratings = res.select("span.prod-comments-count")
-        trending = res.select("p.instantSavings")
-        trending = trending[0] if trending else None
-        product = formatResult("bjs", titles, prices, links, "", num_ratings,
-                                trending, df_flag, currency)
-        if ratings:
-            product["rating"] = len(ratings)
-        products.append(product)
-    return products
+    return parseBJs(httpsGet(URL, SITE_TIMEOUTS["bjs"], PAGE_STRAINERS["bjs"]), df_flag, currency, limit, fields)
 
 
-def searchEbay(query, df_flag, currency):
-    EBAY_APP = 'BradleyE-slash-PRD-2ddd2999f-2ae39cfa'
+async def async_searchBJs(query, df_flag, currency, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    URL = f"https://www.bjs.com/search/{query}"
+    return await async_searchProducts(URL, "bjs", parseBJs, df_flag, currency, limit, fields)
+
+
+def parseBJs(page, df_flag, currency, limit=None, fields=None):
+    return extract(EXTRACTORS["bjs"], page, df_flag, currency, limit, fields)
+
+
+def ebayParams(query, page=1, limit=None):
+    """
+    Finding API findItemsByKeywords parameters for one result page. Only the default
+    output is requested (no extra outputSelector), returned as JSON.
+    """
+    return {
+        'OPERATION-NAME': 'findItemsByKeywords',
+        'SERVICE-VERSION': '1.13.0',
+        'SECURITY-APPNAME': EBAY_APP,
+        'GLOBAL-ID': 'EBAY-US',
+        'RESPONSE-DATA-FORMAT': 'JSON',
+        'keywords': query,
+        'paginationInput.entriesPerPage': str(min(limit, EBAY_PAGE_SIZE) if limit else EBAY_PAGE_SIZE),
+        'paginationInput.pageNumber': str(page),
+    }
+
+
+def searchEbay(query, df_flag, currency, page=1, limit=None, fields=None):
+    response = fetch(EBAY_API_URL, params=ebayParams(query, page, limit), timeout=SITE_TIMEOUTS["ebay"])
+    return observed("ebay", "format", parseEbay, observed("ebay", "parse", decodeEbay, response), df_flag, currency,
+                    fields)
+
+
+async def async_searchEbay(query, df_flag, currency, page=1, limit=None, fields=None):
+    response = await async_fetch(EBAY_API_URL, params=ebayParams(query, page, limit), timeout=SITE_TIMEOUTS["ebay"])
+    items = await SCHEDULER.run_blocking(observed, "ebay", "parse", decodeEbay, response)
+    return await SCHEDULER.run_blocking(observed, "ebay", "format", parseEbay, items, df_flag, currency, fields)
+
+
+def decodeEbay(response):
+    """Returns the item list of a Finding API response, or an empty list on failure."""
+    if response.status_code != 200:
+        print(f"Error: Received status code {response.status_code} from {EBAY_API_URL}")
+        return []
     try:
-        api = Connection(appid=EBAY_APP, config_file=None, siteid='EBAY-US')
-        response = api.execute('findItemsByKeywords', {'keywords': query})
+        result = json.loads(response.content)['findItemsByKeywordsResponse'][0]
+        if result.get('ack', ['Failure'])[0] not in ('Success', 'Warning'):
+            print(f"Error: eBay Finding API returned {result.get('errorMessage')}")
+            return []
+        return result.get('searchResult', [{}])[0].get('item', [])
     except Exception as e:
-        print(e)
+        print(f"Error: Unable to parse JSON response from {EBAY_API_URL}: {e}")
         return []
-    data = response.dict()
+
+
+def parseEbay(items, df_flag, currency, fields=None):
+    # The JSON format wraps every field in a list.
     products = []
-    for p in data['searchResult']['item']:
-        titles = p['title']
-        prices = '$' + p['sellingStatus']['currentPrice']['value']
-        links = p['viewItemURL']
-        img_link = p['galleryURL']
-        ratings = None
-        num_ratings = None
-        trending = None
-        product = formatResult("ebay", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency, img_link)
+    for p in items:
+        titles = p['title'][0]
+        prices = '$' + p['sellingStatus'][0]['currentPrice'][0]['__value__']
+        links = p['viewItemURL'][0]
+        img_link = p.get('galleryURL', [None])[0]
+        product = formatResult("ebay", titles, prices, links, None,
+                                None, None, df_flag, currency, img_link, fields)
         products.append(product)
     return products
 
 
-def searchTarget(query, df_flag, currency):
-    api_url = 'https://redsky.target.com/redsky_aggregations/v1/web/plp_search_v1'
-    page = '/s/' + query
-    params = {
+def targetParams(query, page=1, limit=None):
+    """Target API parameters for one result page; limit (up to TARGET_PAGE_SIZE) is sent as count."""
+    count = min(limit, TARGET_PAGE_SIZE) if limit else TARGET_PAGE_SIZE
+    return {
         'key': 'ff457966e64d5e877fdbad070f276d18ecec4a01',
         'channel': 'WEB',
-        'count': '24',
+        'count': str(count),
         'default_purchasability_filter': 'false',
         'include_sponsored': 'true',
         'keyword': query,
-        'offset': '0',
-        'page': page,
+        'offset': str((page - 1) * count),
+        'page': '/s/' + query,
         'platform': 'desktop',
         'pricing_store_id': '3991',
         'useragent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:91.0) Gecko/20100101 Firefox/91.0',
         'visitor_id': 'AAA',
     }
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/78.0.3904.108 Safari/537.36',
-        'Accept-Encoding': 'gzip, deflate',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'no-cache'
-    }
-    response = SESSION.get(api_url, headers=headers, params=params)
+
+
+def searchTarget(query, df_flag, currency, page=1, limit=None, fields=None):
+    response = fetch(TARGET_API_URL, params=targetParams(query, page, limit), timeout=SITE_TIMEOUTS["target"])
+    return observed("target", "format", parseTarget, observed("target", "parse", decodeTarget, response),
+                    df_flag, currency, fields)
+
+
+async def async_searchTarget(query, df_flag, currency, page=1, limit=None, fields=None):
+    response = await async_fetch(TARGET_API_URL, params=targetParams(query, page, limit),
+                                 timeout=SITE_TIMEOUTS["target"])
+    data = await SCHEDULER.run_blocking(observed, "target", "parse", decodeTarget, response)
+    return await SCHEDULER.run_blocking(observed, "target", "format", parseTarget, data, df_flag, currency, fields)
+
+
+def decodeTarget(response):
+    """Returns the decoded JSON body of a Target API response, or an empty dict on failure."""
     if response.status_code != 200:
-        print(f"Error: Received status code {response.status_code} from {api_url}")
-        print(f"Response content: {response.text}")
-        return []
+        print(f"Error: Received status code {response.status_code} from {TARGET_API_URL}")
+        return {}
     try:
-        data = response.json()
+        return json.loads(response.content)
     except Exception as e:
-        print(f"Error: Unable to parse JSON response from {api_url}: {e}")
-        print(f"Response content: {response.text}")
-        return []
+        print(f"Error: Unable to parse JSON response from {TARGET_API_URL}: {e}")
+        return {}
+
+
+def parseTarget(data, df_flag, currency, fields=None):
     products = []
     for p in data.get('data', {}).get('search', {}).get('products', []):
         titles = p['item']['product_description']['title']
@@ -299,32 +877,27 @@ def searchTarget(query, df_flag, currency):
             num_ratings = None
         trending = None
         product = formatResult("target", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency, img_link)
+                                num_ratings, trending, df_flag, currency, img_link, fields)
         products.append(product)
     return products
 
 
-def searchBestbuy(query, df_flag, currency):
+def searchBestbuy(query, df_flag, currency, page=1, limit=None, fields=None):
     query = formatSearchQuery(query)
-    URL = f"https://www.bestbuy.com/site/searchpage.jsp?st={query}"
-    page = httpsGet(URL)
-    results = page.findAll("li", {'class': 'sku-item'})
-    products = []
-    pattern = re.compile(r"out of 5 stars with")
-    for res in results:
-        titles, prices, links = (
-            res.select("h4.sku-title a"),
-            res.select("div.priceView-customer-price span"),
-            res.select("a"),
-        )
-        ratings = res.find("div", class_="c-ratings-reviews").findAll("p", text=pattern)
-        num_ratings = res.select("span.c-reviews")
-        trending = None
-        img_link = res.select("img.product-image")
-        product = formatResult("bestbuy", titles, prices, links, ratings,
-                                num_ratings, trending, df_flag, currency, img_link)
-        products.append(product)
-    return products
+    URL = f"https://www.bestbuy.com/site/searchpage.jsp?st={query}" + pageParam("cp", page)
+    return parseBestbuy(searchPage(URL, "bestbuy", limit), df_flag, currency, limit, fields)
+
+
+async def async_searchBestbuy(query, df_flag, currency, page=1, limit=None, fields=None):
+    query = formatSearchQuery(query)
+    URL = f"https://www.bestbuy.com/site/searchpage.jsp?st={query}" + pageParam("cp", page)
+    return await async_searchProducts(URL, "bestbuy", parseBestbuy, df_flag, currency, limit, fields)
+
+
+def parseBestbuy(page, df_flag, currency, limit=None, fields=None):
+    if isinstance(page, EmbeddedPage):
+        return page.products(df_flag, currency, limit, fields)
+    return extract(EXTRACTORS["bestbuy"], page, df_flag, currency, limit, fields)
 
 
 def condense_helper(result_condensed, lst, num):
@@ -338,16 +911,15 @@ def condense_helper(result_condensed, lst, num):
 
 
 def filter(data, price_min=None, price_max=None, rating_min=None):
+    """
+    Returns the product dicts within the price and rating bounds, read from the typed
+    price_value and rating formatResult stores (price_value is parsed from price for
+    records without one); a product without a usable value fails that bound.
+    """
     filtered_result = []
     for row in data:
-        try:
-            price = float(row['price'][1:])
-        except:
-            price = None
-        try:
-            rating = float(row['rating'])
-        except:
-            rating = None
+        price = row["price_value"] if "price_value" in row else parse_price(row.get("price"))[1]
+        rating = parse_rating(row.get("rating"))
         if price_min is not None and (price is None or price < price_min):
             continue
         elif price_max is not None and (price is None or price > price_max):
@@ -359,24 +931,433 @@ def filter(data, price_min=None, price_max=None, rating_min=None):
     return filtered_result
 
 
-def driver(product, currency, num=None, df_flag=0, csv=False, cd=None, ui=False, sort=None):
+# Built-in retailer plugins, in the order their results are reported by driver.
+for retailer in (
+    Retailer("amazon", async_searchAmazon, searchAmazon, paginated=True, projected=True),
+    Retailer("walmart", async_searchWalmart, searchWalmart, paginated=True, projected=True),
+    Retailer("Etsy", async_searchEtsy, searchEtsy, paginated=True, projected=True),
+    Retailer("google", async_searchGoogleShopping, searchGoogleShopping, limited=True, projected=True),
+    Retailer("bjs", async_searchBJs, searchBJs, limited=True, projected=True),
+    Retailer("ebay", async_searchEbay, searchEbay, paginated=True, projected=True),
+    Retailer("bestbuy", async_searchBestbuy, searchBestbuy, paginated=True, projected=True),
+    Retailer("target", async_searchTarget, searchTarget, paginated=True, projected=True),
+):
+    register(retailer)
+
+_STREAM_DONE = object()
+
+
+class SearchResults(list):
+    """List of product dicts carrying the same ``attrs`` metadata as a DataFrame result."""
+
+    def __init__(self, products=(), attrs=None):
+        super().__init__(products)
+        self.attrs = dict(attrs or {})
+
+
+async def search_site(website, search, product, df_flag, currency, request_id=None):
+    """
+    Runs one site searcher under SCHEDULER and returns (website, products, status).
+    status is "ok", "timed_out", "rejected" (scheduler saturated), "skipped" (circuit
+    breaker open) or "error"; a failing site contributes an empty list instead of
+    failing the whole search. Every finished call is recorded in SITE_HEALTH and METRICS.
+    """
+    with span("site", concurrent=True, site=website) as site_span:
+        found = await _search_site(website, search, product, df_flag, currency, request_id)
+        if site_span is not None:
+            site_span.set(status=found[2], items=len(found[1]))
+        return found
+
+
+async def _search_site(website, search, product, df_flag, currency, request_id):
+    if not SITE_HEALTH.allow(website):
+        SITE_SEARCHES.inc(site=website.lower(), status="skipped")
+        return website, [], "skipped"
+    started = time.monotonic()
+    responses = []
+    token = SITE_RESPONSES.set(responses)
+    try:
+        products = await SCHEDULER.run(website, request_id, lambda: search(product, df_flag, currency))
+        outcome = "ok" if products else "blocked" if looks_blocked(responses) else "empty"
+        record_site(website, time.monotonic() - started, outcome, len(products), skipped(products))
+        return website, products, "ok"
+    except SchedulerSaturated as e:
+        SITE_HEALTH.abandon(website)
+        SITE_SEARCHES.inc(site=website.lower(), status="rejected")
+        print(f'Skipped scraping {website}: {e}')
+        return website, [], "rejected"
+    except asyncio.TimeoutError:
+        record_site(website, time.monotonic() - started, "timed_out")
+        print(f'Timed out scraping {website}')
+        return website, partial_products(search), "timed_out"
+    except asyncio.CancelledError:
+        SITE_HEALTH.abandon(website)
+        raise
+    except Exception as e:
+        record_site(website, time.monotonic() - started, "error")
+        print(f'There was an error in scraping {website}, Error is {e!r}')
+        return website, [], "error"
+    finally:
+        SITE_RESPONSES.reset(token)
+
+
+def record_site(website, latency, outcome, items=0, skipped_items=0):
+    """Records a finished site search in SITE_HEALTH and the per-site metrics."""
+    SITE_HEALTH.record(website, latency, outcome)
+    site = website.lower()
+    SITE_SEARCH_SECONDS.observe(latency, site=site)
+    SITE_SEARCHES.inc(site=site, status=outcome)
+    if items:
+        ITEMS_EXTRACTED.inc(items, site=site)
+    if skipped_items:
+        ITEMS_SKIPPED.inc(skipped_items, site=site)
+
+
+def site_limit(num=None, max_results=None):
+    """The most products needed from any one site, or None for no limit."""
+    limits = [int(n) for n in (num, max_results) if n is not None]
+    return min(limits) if limits else None
+
+
+def search_deadline(deadline, pages=1):
+    """The deadline of a search reading pages result pages per site (see PAGED_DEADLINE_FACTOR)."""
+    if deadline is None or pages <= 1:
+        return deadline
+    return deadline * PAGED_DEADLINE_FACTOR
+
+
+def site_searcher(retailer, pages=1, limit=None, fields=None):
+    """
+    Returns a search(query, df_flag, currency) coroutine function fetching up to pages pages.
+    Its found dict holds the pages read so far, so a search cut off by the deadline can
+    still return them (see partial_products).
+    """
+    async def search(query, df_flag, currency):
+        return await search_pages(retailer, query, df_flag, currency, pages, limit, fields, search.found)
+    search.found = {}
+    search.limit = limit
+    return search
+
+
+def partial_products(search):
+    """The products of the leading pages a site searcher had read before it was cut off."""
+    found = getattr(search, "found", {})
+    kept = []
+    while len(kept) + 1 in found and found[len(kept) + 1]:
+        kept.append(found[len(kept) + 1])
+    products = [product for page_products in kept for product in page_products]
+    return first_products(products, getattr(search, "limit", None),
+                          sum(skipped(page_products) for page_products in kept))
+
+
+async def search_pages(retailer, query, df_flag, currency, pages=1, limit=None, fields=None, found=None):
+    """
+    Searches one retailer and returns up to limit products from its first pages result pages.
+    Page 1 is fetched first; if more are needed, pages 2..pages are fetched in parallel.
+    Collection stops at the first empty or failed page, and the pages still in flight are
+    cancelled as soon as limit products have been collected. Retailers that are not
+    paginated return their single page. The result's skipped counts the results the
+    searchers left unread on the pages kept. With fields, products only have those columns.
+    Every page read is also stored in found (page number to products) as it arrives.
+    """
+    found = {} if found is None else found
+    async def search_page(**kwargs):
+        if retailer.projected:
+            return await retailer.async_search(query, df_flag, currency, fields=fields, **kwargs)
+        products = await retailer.async_search(query, df_flag, currency, **kwargs)
+        return products if fields is None else Products((project(p, fields) for p in products), skipped(products))
+
+    if not retailer.paginated:
+        products = await (search_page(limit=limit) if retailer.limited else search_page())
+        return first_products(products, limit)
+    first = found[1] = await search_page(page=1, limit=limit)
+    if pages <= 1 or not first or (limit is not None and len(first) >= limit):
+        return first_products(first, limit)
+
+    async def fetch_page(page):
+        try:
+            with span("page", concurrent=True, site=retailer.name, page=page):
+                return page, await search_page(page=page, limit=limit)
+        except Exception as e:
+            print(f'There was an error in scraping page {page} of {retailer.name}, Error is {e!r}')
+            return page, []
+
+    last_page = pages
+    tasks = {page: asyncio.ensure_future(fetch_page(page)) for page in range(2, pages + 1)}
+    try:
+        for next_done in asyncio.as_completed(list(tasks.values())):
+            page, products = await next_done
+            found[page] = products
+            if not products:
+                last_page = min(last_page, page - 1)
+            collected, contiguous = 0, 0
+            while contiguous < last_page and contiguous + 1 in found:
+                contiguous += 1
+                collected += len(found[contiguous])
+            if contiguous == last_page or (limit is not None and collected >= limit):
+                break
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    kept = [found.get(page, []) for page in range(1, last_page + 1)]
+    products = [product for page_products in kept for product in page_products]
+    return first_products(products, limit, sum(skipped(page_products) for page_products in kept))
+
+
+def first_products(products, limit, skipped_results=None):
+    """Cuts products to limit, keeping the count of skipped results (by default the one products carries)."""
+    return Products(products[:limit] if limit is not None else products,
+                    skipped(products) if skipped_results is None else skipped_results)
+
+
+async def search_all(product, df_flag, currency, deadline=SEARCH_DEADLINE, sites=None, pages=1, limit=None,
+                     fields=None):
+    """
+    Runs the selected site searchers (every registered retailer by default) concurrently
+    and returns (results, site_status). results holds the product lists in site order.
+    Sites still running when the deadline expires are cancelled and reported as
+    "timed_out" with the products of the result pages they had already read.
+    See search_pages for pages, limit and fields, and search_deadline for a multi-page
+    sweep's deadline.
+    """
+    retailers = select_sites(sites)
+    deadline = search_deadline(deadline, pages)
+    request_id = object()
+    searchers = [site_searcher(r, pages, limit, fields) for r in retailers]
+    tasks = [
+        asyncio.ensure_future(search_site(r.name, search, product, df_flag, currency, request_id))
+        for r, search in zip(retailers, searchers)
+    ]
+    if tasks:
+        await asyncio.wait(tasks, timeout=deadline)
+    results, site_status = [], {}
+    for website, search, task in zip((r.name for r in retailers), searchers, tasks):
+        if task.done():
+            _, products, status = task.result()
+        else:
+            record_site(website, deadline, "timed_out")
+            task.cancel()
+            products, status = partial_products(search), "timed_out"
+        results.append(products)
+        site_status[website] = status
+    return results, site_status
+
+
+async def async_driver_stream(product, currency, num=None, df_flag=0, deadline=SEARCH_DEADLINE, sites=None,
+                              pages=1, max_results=None, fields=None):
+    """
+    Async iterator over (website, products) batches in the order the sites finish.
+    Sites that miss the deadline are yielded last with the result pages they had read,
+    if any. Leaving the loop early cancels the searches that are still running.
+    """
+    retailers = select_sites(sites)
+    limit = site_limit(num, max_results)
+    fields = product_fields(fields)
+    deadline = search_deadline(deadline, pages)
+    request_id = object()
+    searchers = [site_searcher(r, pages, limit, fields) for r in retailers]
+    tasks = [
+        asyncio.ensure_future(search_site(r.name, search, product, df_flag, currency, request_id))
+        for r, search in zip(retailers, searchers)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline):
+            website, products, _ = await next_done
+            yield website, products
+    except asyncio.TimeoutError:
+        late = [(r, search) for r, search, task in zip(retailers, searchers, tasks) if not task.done()]
+        for retailer, search in late:
+            record_site(retailer.name, deadline, "timed_out")
+        for retailer, search in late:
+            products = partial_products(search)
+            if products:
+                yield retailer.name, products
+        return
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def driver_stream(product, currency, num=None, df_flag=0, deadline=SEARCH_DEADLINE, sites=None,
+                  pages=1, max_results=None, fields=None):
+    """
+    Generator version of async_driver_stream for synchronous callers such as the CLI.
+    Batches are handed over from the shared scraper event loop as each site completes.
+    """
+    select_sites(sites)
+    product_fields(fields)
+    yield from iterate_async(
+        async_driver_stream(product, currency, num, df_flag, deadline, sites, pages, max_results, fields))
+
+
+def iterate_async(stream):
+    """
+    Iterates an async generator on the shared scraper event loop from synchronous code.
+    Stopping early cancels the generator and whatever it is waiting on.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async with aclosing(stream):
+                async for item in stream:
+                    items.put(item)
+        finally:
+            items.put(_STREAM_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(in_current_span(pump()), _get_loop())
+    try:
+        while True:
+            item = items.get()
+            if item is _STREAM_DONE:
+                break
+            yield item
+    except BaseException:
+        # The consumer stopped early; stop the searches still in flight.
+        future.cancel()
+        raise
+    future.result()
+
+
+BatchResult = namedtuple("BatchResult", ["query", "products", "site_status", "elapsed"])
+
+
+async def async_driver_batch(queries, currency=None, num=None, df_flag=0, deadline=SEARCH_DEADLINE, sites=None,
+                             concurrency=16, pages=1, max_results=None, fields=None):
+    """
+    Async iterator that searches many queries in one process and yields a BatchResult
+    per query as soon as all of its sites have finished.
+    Every (query, site) pair is a unit of work, and at most concurrency pairs run at
+    once across all queries. Each pair gets its own deadline seconds once it starts
+    (see search_deadline), and keeps the result pages it had read if it runs out.
+    A pair that fails is reported with status "error" instead of stopping the batch.
+    """
+    retailers = select_sites(sites)
+    limit = site_limit(num, max_results)
+    fields = product_fields(fields)
+    deadline = search_deadline(deadline, pages)
+    queries = list(queries)
+    pairs = asyncio.Queue()
+    for index in range(len(queries)):
+        for position, retailer in enumerate(retailers):
+            pairs.put_nowait((index, position, retailer))
+    pending = {index: len(retailers) for index in range(len(queries))}
+    found = {index: [None] * len(retailers) for index in range(len(queries))}
+    status = {index: {} for index in range(len(queries))}
+    started = {}
+    done = asyncio.Queue()
+    request_id = object()
+
+    async def run_pair(index, position, retailer):
+        started.setdefault(index, time.monotonic())
+        try:
+            searcher = site_searcher(retailer, pages, limit, fields)
+            search = search_site(retailer.name, searcher, queries[index], df_flag, currency, request_id)
+            try:
+                _, products, site_status = await asyncio.wait_for(search, deadline)
+            except asyncio.TimeoutError:
+                record_site(retailer.name, deadline, "timed_out")
+                products, site_status = partial_products(searcher), "timed_out"
+        except Exception as e:
+            print(f"Error searching {retailer.name} for {queries[index]!r}: {e}")
+            products, site_status = [], "error"
+        found[index][position] = products
+        status[index][retailer.name] = site_status
+        pending[index] -= 1
+        if pending[index] == 0:
+            await done.put(index)
+
+    async def worker():
+        while not pairs.empty():
+            await run_pair(*pairs.get_nowait())
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max(1, min(concurrency, pairs.qsize())))]
+    if not retailers:
+        for index in range(len(queries)):
+            done.put_nowait(index)
+    try:
+        for _ in range(len(queries)):
+            index = await done.get()
+            products = [product for site_products in found.pop(index) for product in site_products]
+            elapsed = time.monotonic() - started.pop(index, time.monotonic())
+            yield BatchResult(queries[index], products, status.pop(index), elapsed)
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def driver_batch(queries, currency=None, num=None, df_flag=0, deadline=SEARCH_DEADLINE, sites=None, concurrency=16,
+                 pages=1, max_results=None, fields=None):
+    """Generator version of async_driver_batch; results arrive in the order queries finish."""
+    select_sites(sites)
+    product_fields(fields)
+    yield from iterate_async(
+        async_driver_batch(queries, currency, num, df_flag, deadline, sites, concurrency, pages, max_results,
+                           fields))
+
+
+async def async_driver(product, currency, num=None, df_flag=0, csv=False, cd=None, ui=False, sort=None,
+                       deadline=SEARCH_DEADLINE, sites=None, pages=1, max_results=None, fields=None):
+    """
+    Asynchronous version of driver for callers that already run an event loop.
+    All site fetches are multiplexed on that loop instead of one thread per site.
+    """
+    with SEARCH_SECONDS.time(), TRACER.trace("driver", query=product):
+        limit = site_limit(None if csv else num, max_results)
+        fields = product_fields(fields)
+        results, site_status = await search_all(product, df_flag, currency, deadline, sites, pages, limit, fields)
+        with span("build_report"):
+            report = build_report(results, product, currency, num, csv, cd, ui, sort)
+        return attach_site_status(report, site_status, results)
+
+
+def driver(product, currency, num=None, df_flag=0, csv=False, cd=None, ui=False, sort=None,
+           deadline=SEARCH_DEADLINE, sites=None, pages=1, max_results=None, fields=None):
     """
     Returns CSV if the user enters the --csv arg,
     else displays the result table in the terminal based on the args entered by the user.
-    This version uses ThreadPoolExecutor with a global requests.Session for faster concurrent scraping.
-    """
-    with ThreadPoolExecutor(max_workers=16) as executor:
-        futures = []
-        futures.append(executor.submit(searchAmazon, product, df_flag, currency))
-        futures.append(executor.submit(searchWalmart, product, df_flag, currency))
-        futures.append(executor.submit(searchEtsy, product, df_flag, currency))
-        futures.append(executor.submit(searchGoogleShopping, product, df_flag, currency))
-        futures.append(executor.submit(searchBJs, product, df_flag, currency))
-        futures.append(executor.submit(searchEbay, product, df_flag, currency))
-        futures.append(executor.submit(searchBestbuy, product, df_flag, currency))
-        futures.append(executor.submit(searchTarget, product, df_flag, currency))
-        results = [future.result() for future in futures]
+    sites names the retailers to search (see retailers.RETAILERS); None searches all of them.
+    pages result pages are read from each paginated retailer, stopping once max_results
+    (or num, except when saving the full CSV) products have been collected from it.
+    The sites are fetched on the shared scraper event loop; the report is built in the calling thread.
+    Sites that miss the deadline are listed in the result's attrs["timed_out"] and keep the
+    result pages they had read; with pages > 1 the deadline is scaled by search_deadline.
+    With a limit, each site stops extracting once it has enough titled products;
+    attrs["skipped"] holds how many results each site left unread.
+    fields names the columns to return (see formatter.PRODUCT_FIELDS); title and website
+    are always kept, and columns left out are neither extracted nor formatted.
+    Products carry the typed price_value, price_currency and num_ratings columns (those in
+    fields, if given) and a float rating, filled in by formatter.formatResult; missing
+    values are None.
+    """
+    with SEARCH_SECONDS.time(), TRACER.trace("driver", query=product):
+        limit = site_limit(None if csv else num, max_results)
+        fields = product_fields(fields)
+        results, site_status = run_async(search_all(product, df_flag, currency, deadline, sites, pages, limit, fields))
+        with span("build_report"):
+            report = build_report(results, product, currency, num, csv, cd, ui, sort)
+        return attach_site_status(report, site_status, results)
+
 
+def attach_site_status(report, site_status, results=()):
+    """
+    Records per-site status, circuit breaker state and the number of results each site
+    skipped once it had enough products in the report's attrs metadata.
+    """
+    if isinstance(report, list):
+        report = SearchResults(report)
+    report.attrs["site_status"] = site_status
+    report.attrs["skipped"] = {website: skipped(products) for website, products in zip(site_status, results)}
+    report.attrs["breakers"] = {website: SITE_HEALTH.state(website) for website in site_status}
+    report.attrs["timed_out"] = [website for website, status in site_status.items() if status == "timed_out"]
+    return report
+
+
+def build_report(results, product, currency, num=None, csv=False, cd=None, ui=False, sort=None):
+    """
+    Condenses the per-site product lists into the table returned by driver. Missing values
+    are None rather than NaN on every path, as the pages and CSV files show them.
+    """
     if not ui:
         all_results = []
         result_condensed = []
@@ -391,6 +1372,7 @@ def driver(product, currency, num=None, df_flag=0, csv=False, cd=None, ui=False,
         if not currency:
             result_condensed = result_condensed.drop(columns="converted_price", errors='ignore')
             all_results = all_results.drop(columns="converted_price", errors='ignore')
+        result_condensed = with_none(result_condensed)
         if csv:
             file_name = os.path.join(cd, product + datetime.now().strftime("%y%m%d_%H%M") + ".csv")
             print("CSV Saved at: ", cd)
@@ -399,26 +1381,23 @@ def driver(product, currency, num=None, df_flag=0, csv=False, cd=None, ui=False,
         return result_condensed
     else:
         result_condensed = []
-        condense_helper(result_condensed, results[0], num)
-        condense_helper(result_condensed, results[1], num)
-        condense_helper(result_condensed, results[2], num)
-        condense_helper(result_condensed, results[3], num)
-        condense_helper(result_condensed, results[4], num)
-        condense_helper(result_condensed, results[5], num)
-        condense_helper(result_condensed, results[6], num)
-        condense_helper(result_condensed, results[7], num)
+        for product_list in results:
+            condense_helper(result_condensed, product_list, num)
         if currency is not None:
             for p in result_condensed:
-                p["price"] = getCurrency(currency, p["price"])
+                if "price" in p:
+                    p["price"] = getCurrency(currency, p["price"])
         for p in result_condensed:
-            link = p["link"]
+            link = p.get("link")
+            if link is None:
+                continue
             if p["website"] == "Etsy":
                 link = link[12:]
                 p["link"] = link
             elif "http" not in link:
                 p["link"] = "http://" + link
+        result_condensed = pd.DataFrame(result_condensed)
         if sort is not None:
-            result_condensed = pd.DataFrame(result_condensed)
             if sort == "rades":
                 result_condensed = sortList(result_condensed, "ra", False)
             elif sort == "raasc":
@@ -427,7 +1406,7 @@ def driver(product, currency, num=None, df_flag=0, csv=False, cd=None, ui=False,
                 result_condensed = sortList(result_condensed, "pr", False)
             else:
                 result_condensed = sortList(result_condensed, "pr", True)
-            result_condensed = result_condensed.to_dict(orient="records")
+        result_condensed = with_none(result_condensed).to_dict(orient="records")
         if csv:
             file_name = os.path.join(cd, product + datetime.now().strftime("%y%m%d_%H%M") + ".csv")
             result_condensed = pd.DataFrame(result_condensed)
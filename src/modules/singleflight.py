@@ -0,0 +1,95 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The singleflight module coalesces identical concurrent calls, so a burst of
+searches for the same product sends one request per retailer URL.
+"""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time across threads.
+    Callers that arrive while a call is in flight wait for it and share its result
+    or exception. Nothing is remembered once the call finishes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.counters = {"calls": 0, "shared": 0}
+
+    def do(self, key, fn):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+                self.counters["calls"] += 1
+            else:
+                self.counters["shared"] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, in_flight=len(self.calls))
+
+    def _finish(self, key):
+        with self.lock:
+            self.calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio version of SingleFlight. The shared call runs as its own task; a caller
+    that is cancelled stops waiting without affecting the others, and the task is
+    only cancelled once every caller waiting on it has gone.
+    """
+
+    def __init__(self):
+        self.calls = weakref.WeakKeyDictionary()
+        self.counters = {"calls": 0, "shared": 0}
+
+    async def do(self, key, factory):
+        loop = asyncio.get_running_loop()
+        calls = self.calls.setdefault(loop, {})
+        entry = calls.get(key)
+        if entry is None:
+            entry = [loop.create_task(factory()), 0]
+            calls[key] = entry
+            entry[0].add_done_callback(lambda _: calls.pop(key, None) if calls.get(key) is entry else None)
+            self.counters["calls"] += 1
+        else:
+            self.counters["shared"] += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                if calls.get(key) is entry:
+                    del calls[key]
+                task.cancel()
+
+    def stats(self):
+        return dict(self.counters, in_flight=sum(len(calls) for calls in self.calls.values()))
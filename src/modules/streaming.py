@@ -0,0 +1,107 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The streaming module parses a search page incrementally as its body arrives, keeping
+only the result containers, so extraction can start (and the download can stop)
+before the whole page has been received.
+"""
+
+import codecs
+from html.parser import HTMLParser
+
+# Bytes read from the response per parser feed.
+STREAM_CHUNK = 64 * 1024
+
+
+class ContainerParser(HTMLParser):
+    """
+    Incremental tokenizer that keeps the markup of every element matching strainer
+    (a bs4 SoupStrainer) and skips everything else. With a limit, done turns True
+    once limit containers have closed and the rest of the page is not needed.
+    The standard library tokenizer is used because libxml2's push parser can hold
+    back all events until the document is closed, which defeats streaming.
+    """
+
+    def __init__(self, strainer, limit=None, encoding="utf-8"):
+        super().__init__(convert_charrefs=False)
+        self.strainer = strainer
+        self.limit = limit
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.fragments = []
+        self.current = None
+        self.container_tag = None
+        self.depth = 0
+        self.chunks = []
+
+    @property
+    def bytes(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    @property
+    def done(self):
+        return self.limit is not None and len(self.fragments) >= self.limit
+
+    def feed(self, chunk):
+        """Parses one chunk of the body; returns how many containers it completed."""
+        self.chunks.append(chunk)
+        before = len(self.fragments)
+        if not self.done:
+            super().feed(self.decoder.decode(chunk))
+        return len(self.fragments) - before
+
+    def close(self):
+        """Flushes the tokenizer once the whole body has been fed."""
+        if not self.done:
+            super().feed(self.decoder.decode(b"", final=True))
+            super().close()
+
+    def body(self):
+        """Returns the raw bytes fed so far."""
+        return b"".join(self.chunks)
+
+    def html(self):
+        """Returns the collected containers as one small HTML document."""
+        return "<html><body>" + "".join(self.fragments) + "</body></html>"
+
+    def handle_starttag(self, tag, attrs):
+        if self.current is None:
+            if self.done or not self._matches(tag, attrs):
+                return
+            self.current, self.container_tag, self.depth = [], tag, 0
+        if tag == self.container_tag:
+            self.depth += 1
+        self.current.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        if self.current is not None:
+            self.current.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if self.current is None:
+            return
+        self.current.append(f"</{tag}>")
+        if tag == self.container_tag:
+            self.depth -= 1
+            if self.depth == 0:
+                self.fragments.append("".join(self.current))
+                self.current = None
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.current.append(data)
+
+    def handle_entityref(self, name):
+        if self.current is not None:
+            self.current.append(f"&{name};")
+
+    def handle_charref(self, name):
+        if self.current is not None:
+            self.current.append(f"&#{name};")
+
+    def _matches(self, tag, attrs):
+        values = {name: (value or "").split() if name == "class" else (value or "") for name, value in attrs}
+        return bool(self.strainer.search_tag(tag, values))
@@ -0,0 +1,232 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The tracing module records request-scoped span trees (driver -> site -> fetch ->
+parse/format, plus database calls) in a context variable, so one search can be
+broken down afterwards. Only a sampled fraction of searches is traced.
+"""
+
+import functools
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The span the running code belongs to, or None outside a sampled trace.
+CURRENT_SPAN = ContextVar("slash_current_span", default=None)
+
+_IDS = itertools.count(1)
+
+
+class Span:
+    """
+    One timed operation in a trace. A span opened with concurrent=True starts its own
+    lane (a row in the Chrome trace view); other spans stay in their parent's lane.
+    """
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "lane", "start", "end", "attrs", "thread")
+
+    def __init__(self, trace, name, parent=None, concurrent=False, attrs=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = next(_IDS)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.lane = self.span_id if concurrent or parent is None else parent.lane
+        self.start = time.perf_counter()
+        self.end = None
+        self.attrs = dict(attrs or {})
+        self.thread = threading.current_thread().name
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start - self.trace.start,
+            "duration": self.duration,
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class Trace:
+    """The spans of one traced search, kept in the order they finished."""
+
+    def __init__(self, name):
+        self.trace_id = next(_IDS)
+        self.name = name
+        self.start = time.perf_counter()
+        self.wall_time = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def tree(self):
+        """Returns the root span as nested dicts, each with its children in start order."""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        nodes = {span.span_id: dict(span.to_dict(), children=[]) for span in spans}
+        roots = []
+        for span in spans:
+            parent = nodes.get(span.parent_id)
+            (parent["children"] if parent is not None else roots).append(nodes[span.span_id])
+        return {"trace_id": self.trace_id, "name": self.name, "wall_time": self.wall_time, "spans": roots}
+
+    def chrome(self):
+        """Returns the trace in the Chrome trace-event format (chrome://tracing, Perfetto)."""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "traceEvents": [{
+                "name": span.name,
+                "ph": "X",
+                "ts": round((span.start - self.start) * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": self.trace_id,
+                "tid": span.lane,
+                "args": dict(span.attrs, thread=span.thread),
+            } for span in spans],
+            "displayTimeUnit": "ms",
+            "otherData": {"trace": self.name, "wall_time": self.wall_time},
+        }
+
+
+class Tracer:
+    """
+    Starts traces for sample_rate of the searches (0 disables tracing, 1 traces all)
+    and keeps the last max_traces finished ones.
+    """
+
+    def __init__(self, sample_rate=0.0, max_traces=100):
+        self.sample_rate = sample_rate
+        self.finished = deque(maxlen=max_traces)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name, force=False, **attrs):
+        """
+        Opens a span named name. Outside a trace this starts a new trace when sampled
+        (always with force); the with block gets the span, or None when not traced.
+        """
+        parent = CURRENT_SPAN.get()
+        if parent is not None:
+            with span(name, **attrs) as child:
+                yield child
+            return
+        if not (force or (self.sample_rate > 0 and random.random() < self.sample_rate)):
+            yield None
+            return
+        trace = Trace(name)
+        root = Span(trace, name, attrs=attrs)
+        token = CURRENT_SPAN.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.set(error=repr(e))
+            raise
+        finally:
+            CURRENT_SPAN.reset(token)
+            root.end = time.perf_counter()
+            trace.add(root)
+            with self.lock:
+                self.finished.append(trace)
+
+    def traces(self):
+        with self.lock:
+            return list(self.finished)
+
+    def clear(self):
+        with self.lock:
+            self.finished.clear()
+
+
+@contextmanager
+def span(name, concurrent=False, **attrs):
+    """
+    Opens a child of the current span for the with block and yields it, or yields
+    None (at the cost of one context variable lookup) when no trace is active.
+    """
+    parent = CURRENT_SPAN.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent, concurrent, attrs)
+    token = CURRENT_SPAN.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set(error=repr(e))
+        raise
+    finally:
+        CURRENT_SPAN.reset(token)
+        child.end = time.perf_counter()
+        parent.trace.add(child)
+
+
+def record_span(name, start, end, **attrs):
+    """Adds an already finished child span (perf_counter start and end) to the current span."""
+    parent = CURRENT_SPAN.get()
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent, attrs=attrs)
+    child.start, child.end = start, end
+    parent.trace.add(child)
+
+
+def traced(name=None):
+    """Decorator running each call of a function in a span named name (default: the function name)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if CURRENT_SPAN.get() is None:
+                return fn(*args, **kwargs)
+            with span(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def in_current_span(coro):
+    """
+    Wraps a coroutine so it runs in the caller's current span even when it is
+    scheduled on another thread's event loop, which does not inherit the caller's context.
+    """
+    parent = CURRENT_SPAN.get()
+
+    async def run():
+        CURRENT_SPAN.set(parent)
+        return await coro
+    return run()
+
+
+def chrome_trace(traces):
+    """Merges traces into one Chrome trace-event document; each trace is its own process row."""
+    return {"traceEvents": [event for trace in traces for event in trace.chrome()["traceEvents"]],
+            "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(traces, path):
+    with open(path, "w") as f:
+        json.dump(chrome_trace(traces), f)
+
+
+TRACER = Tracer(float(os.getenv("SLASH_TRACE_SAMPLE", "0.01")))
@@ -0,0 +1,197 @@
+"""
+Copyright (C) 2021 SE Slash - All Rights Reserved
+You may use, distribute and modify this code under the terms of the MIT license.
+You should have received a copy of the MIT license with this file. If not, please write to: secheaper@gmail.com
+"""
+
+"""
+The transport module is the policy layer under every retailer request: per-host
+token-bucket rate limits and retries with jittered exponential backoff.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import aiohttp
+import requests
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Requests per second and burst size allowed per host, by retailer domain.
+DEFAULT_RATE = (10.0, 20)
+HOST_RATES = {}
+
+# Transport failures worth another attempt.
+RETRYABLE_ERRORS = (
+    requests.ConnectionError, requests.Timeout,
+    aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError, asyncio.TimeoutError,
+)
+
+
+class RetryPolicy:
+    """
+    Retries 429/5xx responses and connection errors up to attempts times in total.
+    The n-th retry waits a random time up to backoff * 2**n seconds (capped at
+    max_backoff), or the server's Retry-After when one is sent. A Retry-After
+    longer than max_retry_after is not waited for; the response is returned as is.
+    """
+
+    def __init__(self, attempts=3, backoff=0.2, max_backoff=2.0, max_retry_after=5.0,
+                 statuses=(429, 500, 502, 503, 504)):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.statuses = frozenset(statuses)
+
+    def delay(self, attempt, retry_after=None):
+        """Returns how long to wait before retry number attempt (0-based), or None to give up."""
+        if attempt + 1 >= self.attempts:
+            return None
+        if retry_after is not None:
+            wait = parse_retry_after(retry_after)
+            if wait is not None:
+                return wait if wait <= self.max_retry_after else None
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+
+
+def parse_retry_after(value):
+    """Returns the seconds a Retry-After header asks for (delta-seconds or HTTP date), or None."""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(headers):
+    for name, value in headers.items():
+        if name.lower() == "retry-after":
+            return value
+    return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at rate tokens per second up to burst tokens."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns how many seconds the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0.0)
+
+
+class RateLimiter:
+    """One TokenBucket per host, shared by every thread and event loop in the process."""
+
+    def __init__(self, default_rate=DEFAULT_RATE, host_rates=None):
+        self.default_rate = default_rate
+        self.host_rates = HOST_RATES if host_rates is None else host_rates
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(*self._rate(host))
+        return bucket.reserve()
+
+    def _rate(self, host):
+        for domain, rate in self.host_rates.items():
+            if host == domain or host.endswith("." + domain):
+                return rate
+        return self.default_rate
+
+
+class Transport:
+    """
+    Runs a request function under the rate limiter and retry policy. send() performs
+    one attempt and returns an object with status_code and headers; either policy may be None.
+    """
+
+    def __init__(self, retry=None, limiter=None):
+        self.retry = retry
+        self.limiter = limiter
+        self.counters = {"attempts": 0, "retries": 0, "throttled": 0}
+        self.lock = threading.Lock()
+
+    def request(self, url, send):
+        """Calls send() until it succeeds, the policy gives up or a non-retryable error is raised."""
+        attempt = 0
+        while True:
+            time.sleep(self._pace(url))
+            try:
+                response = send()
+            except RETRYABLE_ERRORS:
+                wait = self._should_retry(None, attempt)
+                if wait is None:
+                    raise
+            else:
+                wait = self._should_retry(response, attempt)
+                if wait is None:
+                    return response
+            time.sleep(wait)
+            attempt += 1
+
+    async def async_request(self, url, send):
+        """Asynchronous version of request; send is a coroutine function."""
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._pace(url))
+            try:
+                response = await send()
+            except RETRYABLE_ERRORS:
+                wait = self._should_retry(None, attempt)
+                if wait is None:
+                    raise
+            else:
+                wait = self._should_retry(response, attempt)
+                if wait is None:
+                    return response
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def _should_retry(self, response, attempt):
+        self._count("attempts")
+        if self.retry is None:
+            return None
+        if response is None:
+            wait = self.retry.delay(attempt)
+        elif response.status_code in self.retry.statuses:
+            wait = self.retry.delay(attempt, retry_after(response.headers))
+        else:
+            return None
+        if wait is not None:
+            self._count("retries")
+        return wait
+
+    def _pace(self, url):
+        """Returns how long to wait for url's rate limit."""
+        wait = self.limiter.reserve(url) if self.limiter is not None else 0
+        if wait > 0:
+            self._count("throttled")
+        return wait
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
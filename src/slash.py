@@ -8,11 +8,16 @@ this file. If not, please write to: secheaper@gmail.com
 """
 
 import argparse
-from src.modules.scraper import driver
-from src.modules.formatter import sortList
+from src.modules import scraper
+from src.modules.scraper import driver, driver_stream, driver_batch, RECORDER, SEARCH_DEADLINE
+from src.modules.recorder import RECORD, REPLAY
+from src.modules.retailers import RETAILERS, parse_sites, select_sites
+from src.modules.tracing import TRACER, write_chrome_trace
+from src.modules.formatter import PRODUCT_FIELDS, TYPED_FIELDS, product_fields, sortList
 from tabulate import tabulate
 import os
 import csv
+import time
 from src.modules.full_version import full_version
 import pandas as pd
 from shutil import get_terminal_size
@@ -31,7 +36,11 @@ def main():
         default="F",
     )
     parser.add_argument("--search", type=str, help="Product search query")
-    parser.add_argument("--num", type=int, help="Maximum number of records", default=3)
+    parser.add_argument(
+        "--num",
+        type=int,
+        help="Maximum number of records per site (default: 3, or all that --pages/--max-results read)",
+    )
     parser.add_argument(
         "--sort",
         type=str,
@@ -61,19 +70,133 @@ def main():
         type=str,
         help="Display the amount in specified currency(inr, euro, aud, yuan, yen, pound)",
     )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        help="Number of result pages to read from each retailer that supports paging",
+        default=1,
+    )
+    parser.add_argument(
+        "--max-results",
+        type=int,
+        help="Stop reading a retailer's pages once this many products were collected",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help=f"Seconds to wait for the retailers (default: {SEARCH_DEADLINE}, doubled with --pages; 0 waits for all)",
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        help="File with one search query per line; results of all queries are written to one CSV file",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Maximum (query, site) searches running at once in --batch mode",
+        default=16,
+    )
+    parser.add_argument("--record", type=str, metavar="DIR", help="Save every retailer response to this corpus")
+    parser.add_argument("--replay", type=str, metavar="DIR", help="Serve retailer responses from this corpus")
+    parser.add_argument(
+        "--replay-latency", action="store_true", help="Replay responses with their recorded latency"
+    )
+    parser.add_argument(
+        "--sites",
+        type=str,
+        help="Comma-separated retailers to search (default: all of " + ", ".join(RETAILERS) + ")",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse search pages while they download and stop once --num results per site have arrived",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        metavar="N",
+        help="Parse large search pages in N worker processes (default: SLASH_PARSE_WORKERS, else 0)",
+    )
+    parser.add_argument(
+        "--fields",
+        type=str,
+        help="Comma-separated columns to return (default: all of " + ", ".join(PRODUCT_FIELDS) + ")",
+    )
+    parser.add_argument(
+        "--trace", type=str, metavar="FILE", help="Trace this run and save it as a Chrome trace-event JSON file"
+    )
     args = parser.parse_args()
+    if args.num is None:
+        # --num caps what each site returns, so paging on its own would not show any more rows.
+        args.num = args.max_results if args.pages > 1 or args.max_results else 3
+    if args.deadline is None:
+        args.deadline = SEARCH_DEADLINE
+    elif args.deadline <= 0:
+        args.deadline = None
+    sites = parse_sites(args.sites)
+    try:
+        select_sites(sites)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        args.fields = sort_fields(args.fields, args.sort)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.record or args.replay:
+        RECORDER.configure(RECORD if args.record else REPLAY, args.record or args.replay, args.replay_latency)
+
+    if args.stream:
+        scraper.STREAM_PARSING = True
+
+    if args.parse_workers is not None:
+        scraper.PARSE_POOL.configure(workers=args.parse_workers)
+    scraper.PARSE_POOL.warm()
 
     if args.full == "T":
 
         full_version().driver()
         return
 
+    if args.trace:
+        with TRACER.trace("slash", force=True, query=args.search or args.batch) as root:
+            run_search(args, sites)
+        write_chrome_trace([root.trace], args.trace)
+        print("Trace saved at:", args.trace)
+        return
+    run_search(args, sites)
+
+
+def run_search(args, sites):
+    """Runs the search the parsed command line arguments ask for."""
+    if args.batch:
+        run_batch(args.batch, args.currency, args.num, sites, args.concurrency, args.cd, args.pages, args.max_results,
+                  args.fields, args.deadline)
+        return
+
+    if not args.csv and not any(sortBy in ("pr", "ra") for sortBy in args.sort):
+        # Relevance order needs no global sort, so rows are shown as each site answers.
+        print()
+        print()
+        print_stream(args.search, args.currency, args.num, sites, args.pages, args.max_results, args.fields,
+                     args.deadline)
+        print()
+        print()
+        return
+
     results = driver(
         args.search,
         args.currency,
         args.num,
         csv=args.csv,
         cd=args.cd,
+        sites=sites,
+        pages=args.pages,
+        max_results=args.max_results,
+        fields=args.fields,
+        deadline=args.deadline,
     )
 
     for sortBy in args.sort:
@@ -86,5 +209,96 @@ def main():
     print()
 
 
+def sort_fields(fields, sorts):
+    """The --fields projection plus the columns the --sort keys need, or None for every column."""
+    fields = product_fields(fields)
+    if fields is None:
+        return None
+    needed = {"pr": "price", "ra": "rating"}
+    return fields.union(needed[sortBy] for sortBy in sorts if sortBy in needed)
+
+
+# Width of each column in the streamed table, so every site's rows line up under one header.
+STREAM_WIDTHS = {"timestamp": 19, "title": 40, "price": 12, "img_link": 40, "link": 40, "website": 8, "rating": 6,
+                 "no_of_ratings": 13, "trending": 20, "converted_price": 16, "price_value": 11,
+                 "price_currency": 14, "num_ratings": 11}
+
+
+def stream_columns(currency, fields=None):
+    """The columns print_stream shows, in PRODUCT_FIELDS order."""
+    if fields is None:
+        columns = list(PRODUCT_FIELDS)
+    else:
+        columns = [name for name in PRODUCT_FIELDS + tuple(TYPED_FIELDS) if name in fields]
+    return [name for name in columns if currency or name != "converted_price"]
+
+
+def stream_line(cells, columns):
+    """One line of the streamed table with every cell cut or padded to its column's width."""
+    line = []
+    for value, name in zip(cells, columns):
+        text = "" if value is None else str(value)
+        width = STREAM_WIDTHS[name]
+        line.append(text[:width - 3] + "..." if len(text) > width else text.ljust(width))
+    return "  ".join(line).rstrip()
+
+
+def print_stream(search, currency, num, sites=None, pages=1, max_results=None, fields=None,
+                 deadline=SEARCH_DEADLINE):
+    """Prints each site's rows as soon as that site finishes, all under one fixed-width header."""
+    columns = stream_columns(currency, fields)
+    count = 0
+    for website, products in driver_stream(search, currency, num, sites=sites, pages=pages, max_results=max_results,
+                                           fields=fields, deadline=deadline):
+        for product in products:
+            if count == 0:
+                print(" " * 6 + stream_line(columns, columns))
+            print(str(count).ljust(6) + stream_line([product.get(name) for name in columns], columns))
+            count += 1
+    if count == 0:
+        print("No results found.")
+
+
+BATCH_COLUMNS = ["query", "timestamp", "title", "price", "converted_price", "link", "img_link", "website",
+                 "rating", "no_of_ratings", "trending"]
+
+
+def run_batch(batch_file, currency, num, sites, concurrency, cd, pages=1, max_results=None, fields=None,
+              deadline=SEARCH_DEADLINE):
+    """
+    Searches every query in batch_file in this process, appending each query's rows to
+    one CSV file as soon as the query finishes, then prints a throughput summary.
+    """
+    with open(batch_file) as f:
+        queries = [line.strip() for line in f if line.strip()]
+    os.makedirs(cd, exist_ok=True)
+    file_name = os.path.join(cd, "batch_" + time.strftime("%y%m%d_%H%M%S") + ".csv")
+    started = time.monotonic()
+    rows, failed, statuses = 0, 0, {}
+    with open(file_name, "w", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=BATCH_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for result in driver_batch(queries, currency, num, sites=sites, concurrency=concurrency,
+                                   pages=pages, max_results=max_results, fields=fields, deadline=deadline):
+            for product in result.products:
+                writer.writerow(dict(product, query=result.query))
+            out.flush()
+            rows += len(result.products)
+            for status in result.site_status.values():
+                statuses[status] = statuses.get(status, 0) + 1
+            ok = sum(status == "ok" for status in result.site_status.values())
+            if not result.products:
+                failed += 1
+            print(f"{result.query!r}: {len(result.products)} results, "
+                  f"{ok}/{len(result.site_status)} sites ok in {result.elapsed:.2f}s")
+    elapsed = time.monotonic() - started
+    print()
+    print(f"{len(queries)} queries ({failed} with no results), {rows} rows in {elapsed:.1f}s "
+          f"({len(queries) / elapsed if elapsed else 0:.2f} queries/s)")
+    print("Site searches:", ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    print("Results saved at:", file_name)
+    return file_name
+
+
 if __name__ == "__main__":
     main()
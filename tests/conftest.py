@@ -0,0 +1,10 @@
+import pytest
+from slash.src.modules import benchmark, scraper
+
+
+@pytest.fixture
+def replay_corpus(tmp_path, monkeypatch):
+    """Serves retailer requests from the benchmark corpus, uncached; returns the HTML sites it covers."""
+    monkeypatch.setattr(scraper, "RECORDER", benchmark.load_corpus(benchmark.PAGES_DIR, str(tmp_path)))
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", None)
+    return list(benchmark.HTML_SITES)
@@ -0,0 +1,50 @@
+import asyncio
+
+
+class FakeStream:
+    """Hands out a body in fixed-size chunks, noting each chunk read."""
+
+    def __init__(self, body, size, reads=None):
+        self.body = body
+        self.size = size
+        self.reads = reads if reads is not None else []
+
+    async def iter_chunked(self, n):
+        for start in range(0, len(self.body), self.size):
+            chunk = self.body[start:start + self.size]
+            self.reads.append(len(chunk))
+            yield chunk
+
+
+class FakeResponse:
+    """Stands in for both a requests response and an aiohttp one; chunk_size streams the body."""
+
+    def __init__(self, body=b"", status=200, headers=None, chunk_size=None, reads=None, delay=0):
+        self.status = self.status_code = status
+        self.headers = headers or {}
+        self.body = body
+        self.delay = delay
+        self.content = FakeStream(body, chunk_size, reads) if chunk_size else body
+
+    async def __aenter__(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    """Answers every get with response, or with response(url) when it is callable."""
+
+    def __init__(self, response, calls=None):
+        self.response = response
+        self.calls = calls if calls is not None else []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        return self.response(url) if callable(self.response) else self.response
@@ -1,13 +1,19 @@
 import pytest
+import asyncio
+import json
 import sys
 import os
 import re
 import pandas as pd
 from bs4 import BeautifulSoup
 from slash.src.modules.app import app
+from slash.src.modules.cache import SearchCache
+from slash.src.modules.config import Config
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'modules')))
 
+from slash.src.modules import scraper
+from slash.src.modules.benchmark import QUERY
 from slash.src.modules.scraper import (
     httpsGet,
     searchAmazon,
@@ -24,10 +30,22 @@ from slash.src.modules.scraper import (
     formatResult,
     getCurrency,
     sortList,
-    driver
+    driver,
+    async_driver,
+    driver_stream,
+    driver_batch,
+    run_async
 )
   
 
+@pytest.fixture(autouse=True)
+def reset_site_health():
+    """Keep circuit breakers from tripping on failures left over from other tests."""
+    scraper.SITE_HEALTH.reset()
+    yield
+    scraper.SITE_HEALTH.reset()
+
+
 @pytest.fixture
 def client():
     """Set up a test client for Flask app."""
@@ -223,6 +241,148 @@ def test_search_requires_login(client):
     assert '/login' in response.headers['Location']
 
 
+def test_search_memoizes_results(client, monkeypatch):
+    """Test that repeated searches for the same canonical query reuse the cached result."""
+    calls = []
+
+    def fake_driver(product, currency=None, sites=None):
+        calls.append(product)
+        return pd.DataFrame([{"title": "TV", "price": "$10", "link": "http://a.com", "website": "amazon",
+                              "rating": 4.0, "img_link": ""}])
+    monkeypatch.setattr("slash.src.modules.app.driver", fake_driver)
+    monkeypatch.setattr("slash.src.modules.app.search_cache", SearchCache())
+    with client.session_transaction() as session:
+        session['username'] = "TestUser"
+        session['user_info'] = ("test@gmail.com", "TestUser")
+    assert client.get('/search', query_string={'product_name': 'Smart TV'}).status_code == 200
+    assert client.get('/search', query_string={'product_name': 'tv  smart'}).status_code == 200
+    assert calls == ["Smart TV"]
+
+
+def test_search_passes_selected_sites(client, monkeypatch):
+    """Test that the sites form field limits which retailers the search hits."""
+    calls = []
+
+    def fake_driver(product, currency=None, sites=None):
+        calls.append(sites)
+        return pd.DataFrame([{"title": "TV", "price": "$10", "link": "http://a.com", "website": "amazon",
+                              "rating": 4.0, "img_link": ""}])
+    monkeypatch.setattr("slash.src.modules.app.driver", fake_driver)
+    monkeypatch.setattr("slash.src.modules.app.search_cache", SearchCache())
+    with client.session_transaction() as session:
+        session['username'] = "TestUser"
+        session['user_info'] = ("test@gmail.com", "TestUser")
+    assert client.get('/search', query_string={'product_name': 'tv', 'sites': 'amazon,walmart'}).status_code == 200
+    assert client.post('/search', data={'product_name': 'tv', 'sites': ['bestbuy']}).status_code == 200
+    assert client.get('/search', query_string={'product_name': 'tv', 'sites': 'nosuchshop'}).status_code == 200
+    assert calls == [["amazon", "walmart"], ["bestbuy"]]
+
+
+def test_results_page_keeps_selected_sites_through_filter(client, monkeypatch):
+    """Test that the results page offers the sites and the filter form searches the same ones."""
+    calls = []
+
+    def fake_driver(product, currency=None, sites=None):
+        calls.append((sites, currency))
+        return pd.DataFrame([{"title": "TV", "price": "$10", "price_value": 10.0, "link": "http://a.com",
+                              "website": "amazon", "rating": 4.0, "img_link": ""},
+                             {"title": "Radio", "price": "$90", "price_value": 90.0, "link": "http://b.com",
+                              "website": "amazon", "rating": 2.0, "img_link": ""}])
+    monkeypatch.setattr("slash.src.modules.app.driver", fake_driver)
+    monkeypatch.setattr("slash.src.modules.app.search_cache", SearchCache())
+    with client.session_transaction() as session:
+        session['username'] = "TestUser"
+        session['user_info'] = ("test@gmail.com", "TestUser")
+    page = client.get('/search', query_string={'product_name': 'tv', 'sites': 'amazon'}).get_data(as_text=True)
+    assert re.search(r'name="sites" value="amazon"\s+checked', page)
+    assert re.search(r'name="sites" value="walmart"\s+>', page)
+    assert '<input type="hidden" name="sites" value="amazon">' in page
+    response = client.post('/filter?product_name=tv', data={'sites': ['amazon'], 'currency': 'inr',
+                                                             'sort': 'pasc', 'max_price': '50'})
+    assert response.status_code == 200
+    assert calls == [(["amazon"], None), (["amazon"], "inr")]
+    assert "Radio" not in response.get_data(as_text=True)
+
+
+@pytest.fixture
+def operator(client, monkeypatch):
+    """Logs the test client in as one of Config.OPERATORS."""
+    monkeypatch.setattr(Config, "OPERATORS", frozenset({"TestUser"}))
+    with client.session_transaction() as session:
+        session['username'] = "TestUser"
+    return client
+
+
+def test_operational_endpoints_need_an_operator(client, monkeypatch):
+    """Test that stats need a login and traces and metrics need an operator or the metrics token."""
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "secret")
+    assert client.get('/stats').status_code == 401
+    assert client.get('/traces').status_code == 403
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get('/metrics', headers={"Authorization": "Bearer secret"}).status_code == 200
+    with client.session_transaction() as session:
+        session['username'] = "TestUser"
+    assert client.get('/stats').status_code == 200
+    assert client.get('/traces').status_code == 403
+
+
+def test_only_operators_can_force_a_trace(client, monkeypatch):
+    """Test that ?trace=1 is ignored unless the user is an operator."""
+    from slash.src.modules.tracing import TRACER
+    monkeypatch.setattr("slash.src.modules.app.driver", lambda *args, **kwargs: pd.DataFrame())
+    monkeypatch.setattr("slash.src.modules.app.search_cache", SearchCache())
+    monkeypatch.setattr(TRACER, "sample_rate", 0)
+    TRACER.clear()
+    with client.session_transaction() as session:
+        session['username'] = "TestUser"
+        session['user_info'] = ("test@gmail.com", "TestUser")
+    client.get('/search', query_string={'product_name': 'tv', 'trace': '1'})
+    assert TRACER.traces() == []
+    monkeypatch.setattr(Config, "OPERATORS", frozenset({"TestUser"}))
+    client.get('/search', query_string={'product_name': 'radio', 'trace': '1'})
+    assert len(TRACER.traces()) == 1
+
+
+def test_stats_reports_site_health(operator):
+    """Test that the stats endpoint exposes per-site health and breaker state."""
+    scraper.SITE_HEALTH.record("amazon", 0.2, "ok")
+    data = operator.get('/stats').get_json()
+    assert data["sites"]["amazon"]["calls"] == 1
+    assert data["sites"]["amazon"]["breaker"] == "closed"
+
+
+def test_metrics_exposes_prometheus_text(operator, httpsGet):
+    """Test that /metrics reports per-site timings and counts after a search."""
+    driver("test", None, num=1, sites=["amazon", "walmart"])
+    response = operator.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    body = response.get_data(as_text=True)
+    assert '# TYPE slash_stage_seconds histogram' in body
+    assert 'slash_stage_seconds_count{site="amazon",stage="extract"}' in body
+    assert 'slash_site_searches_total{site="walmart",status="ok"}' in body
+    assert 'slash_items_extracted_total{site="amazon"}' in body
+    assert 'slash_scheduler_tasks{site="parser_pool",state="queued"} 0' in body
+    assert 'slash_circuit_open{site="amazon"} 0' in body
+
+
+def test_driver_trace_covers_sites_and_stages(operator, httpsGet):
+    """Test that a traced search nests site, extract and format spans under driver."""
+    from slash.src.modules.tracing import TRACER
+    TRACER.clear()
+    with TRACER.trace("search", force=True):
+        driver("test", None, num=1, sites=["amazon", "walmart"])
+    driver_span = TRACER.traces()[-1].tree()["spans"][0]["children"][0]
+    assert driver_span["name"] == "driver"
+    sites = [child for child in driver_span["children"] if child["name"] == "site"]
+    assert sorted(site["attrs"]["site"] for site in sites) == ["amazon", "walmart"]
+    assert all(site["attrs"]["status"] == "ok" for site in sites)
+    assert [child["name"] for child in sites[0]["children"]] == ["extract", "format"]
+    events = operator.get('/traces?format=chrome').get_json()["traceEvents"]
+    assert {"search", "driver", "site", "extract", "format", "build_report"} <= {e["name"] for e in events}
+
+
 def test_share_wishlist(client, monkeypatch):
     """Test sharing a wishlist with an email."""
     with client.session_transaction() as session:
@@ -324,7 +484,7 @@ sample_target_html = """
 
 @pytest.fixture
 def httpsGet(monkeypatch):
-    def get_(url):
+    def get_(url, timeout=None, parse_only=None):
         if "amazon.com" in url:
             return BeautifulSoup(sample_amazon_html, "lxml")
         elif "walmart.com" in url:
@@ -341,11 +501,19 @@ def httpsGet(monkeypatch):
             return BeautifulSoup(sample_target_html, "lxml")
         else:
             return BeautifulSoup("", "lxml")
+
+    async def async_get_(url, timeout=None, parse_only=None):
+        return get_(url)
     monkeypatch.setattr("slash.src.modules.scraper.httpsGet", get_)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", async_get_)
 
 @pytest.fixture
 def httpsGetempty(monkeypatch):
-    monkeypatch.setattr("slash.src.modules.scraper.httpsGet", lambda url: BeautifulSoup("", "lxml"))
+    async def async_get_(url, timeout=None, parse_only=None):
+        return BeautifulSoup("", "lxml")
+    monkeypatch.setattr("slash.src.modules.scraper.httpsGet",
+                        lambda url, timeout=None, parse_only=None: BeautifulSoup("", "lxml"))
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", async_get_)
 
 
 def test_amazon_(httpsGet):
@@ -382,6 +550,55 @@ def test_ebay_(monkeypatch):
     assert isinstance(products, list)
     assert "Sample Product eBay" in str(products[0].get("title", ""))
 
+sample_ebay_json = {"findItemsByKeywordsResponse": [{
+    "ack": ["Success"],
+    "searchResult": [{"@count": "1", "item": [{
+        "itemId": ["1"],
+        "title": ["Sample Product eBay"],
+        "viewItemURL": ["http://example.com/ebay_link"],
+        "galleryURL": ["http://example.com/img_ebay.jpg"],
+        "sellingStatus": [{"currentPrice": [{"@currencyId": "USD", "__value__": "19.99"}]}],
+    }]}],
+}]}
+
+def test_ebay_parses_finding_api_json(monkeypatch):
+    requests_made = []
+
+    def fake_fetch(url, params=None, **kwargs):
+        requests_made.append(params)
+        return scraper.FetchResult(200, json.dumps(sample_ebay_json).encode(), {})
+    monkeypatch.setattr(scraper, "fetch", fake_fetch)
+    [product] = searchEbay("tv", 0, None, page=2, limit=10)
+    assert product["title"] == "Sample Product eBay"
+    assert product["price"] == "$19.99"
+    assert product["link"] == "http://example.com/ebay_link"
+    assert product["img_link"] == "http://example.com/img_ebay.jpg"
+    assert requests_made[0]["paginationInput.pageNumber"] == "2"
+    assert requests_made[0]["paginationInput.entriesPerPage"] == "10"
+    assert "outputSelector" not in requests_made[0]
+
+def test_ebay_failure_returns_no_products(monkeypatch):
+    failure = {"findItemsByKeywordsResponse": [{"ack": ["Failure"], "errorMessage": [{}]}]}
+    monkeypatch.setattr(scraper, "fetch", lambda url, **kwargs: scraper.FetchResult(200, json.dumps(failure).encode(), {}))
+    assert searchEbay("tv", 0, None) == []
+    monkeypatch.setattr(scraper, "fetch", lambda url, **kwargs: scraper.FetchResult(500, b"", {}))
+    assert searchEbay("tv", 0, None) == []
+
+def test_async_search_formats_off_the_event_loop(monkeypatch):
+    parse = scraper.parseEbay
+
+    async def fake_fetch(url, params=None, **kwargs):
+        return scraper.FetchResult(200, json.dumps(sample_ebay_json).encode(), {})
+
+    def parse_off_loop(*args):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        return parse(*args)
+    monkeypatch.setattr(scraper, "async_fetch", fake_fetch)
+    monkeypatch.setattr(scraper, "parseEbay", parse_off_loop)
+    [product] = scraper.run_async(scraper.async_searchEbay("tv", 0, None))
+    assert product["title"] == "Sample Product eBay"
+
 def test_condense_helper_function():
     sample_list = [{"title": "A"}, {"title": "B"}, {"title": "C"}]
     result = []
@@ -400,6 +617,271 @@ def test_driver_integration_(httpsGet):
     titles = df["title"].astype(str).tolist()
     assert any("Sample" in title for title in titles)
 
+def test_async_driver_integration_(httpsGet):
+    df = run_async(async_driver("test", "usd", num=1))
+    assert isinstance(df, pd.DataFrame)
+    websites = df["website"].astype(str).tolist()
+    assert "amazon" in websites and "bestbuy" in websites
+
+def test_driver_site_error_is_isolated(httpsGet, monkeypatch):
+    async def broken(url, timeout=None, parse_only=None):
+        raise ConnectionError("site down")
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", broken)
+    df = driver("test", None, num=1)
+    assert isinstance(df, pd.DataFrame)
+
+def test_driver_stream_yields_in_completion_order(httpsGet, monkeypatch):
+    get_ = scraper.async_httpsGet
+
+    async def slow_amazon(url, timeout=None, parse_only=None):
+        if "amazon.com" in url:
+            await asyncio.sleep(0.2)
+        return await get_(url)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", slow_amazon)
+    # Etsy, eBay and Target reach the network here and now retry, so only the fixture-backed sites are timed.
+    sites = ["amazon", "walmart", "google", "bjs", "bestbuy"]
+    batches = list(driver_stream("test", None, num=1, sites=sites))
+    websites = [website for website, _ in batches]
+    assert sorted(websites) == sorted(sites)
+    assert websites[-1] == "amazon"
+    assert "Sample Product Amazon" in batches[-1][1][0]["title"]
+
+def test_driver_stream_early_exit(httpsGet):
+    stream = driver_stream("test", None)
+    website, products = next(stream)
+    stream.close()
+    assert isinstance(products, list)
+
+def test_driver_deadline_marks_slow_sites_timed_out(httpsGet, monkeypatch):
+    get_ = scraper.async_httpsGet
+
+    async def hung_walmart(url, timeout=None, parse_only=None):
+        if "walmart.com" in url:
+            await asyncio.sleep(5)
+        return await get_(url)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", hung_walmart)
+    df = driver("test", None, num=1, deadline=0.3)
+    assert "walmart" in df.attrs["timed_out"]
+    assert df.attrs["site_status"]["amazon"] == "ok"
+    assert "walmart" not in df["website"].tolist()
+
+def test_only_blocked_empty_results_trip_the_breaker(monkeypatch):
+    from slash.src.modules.health import HealthMonitor
+    monitor = HealthMonitor(min_calls=2)
+    page = {"body": b"<html><body>No results for zzqx.</body></html>"}
+
+    async def fake_fetch(site, url, *args):
+        return scraper.FetchResult(200, page["body"], {})
+    monkeypatch.setattr(scraper, "SITE_HEALTH", monitor)
+    monkeypatch.setattr(scraper, "_async_fetch", fake_fetch)
+    for _ in range(3):
+        driver("zzqx", None, sites=["amazon"])
+    assert monitor.state("amazon") == "closed"
+    assert monitor.stats()["amazon"]["empty_rate"] == 1.0
+    page["body"] = b"<html><body>Enter the characters you see below. Robot Check</body></html>"
+    for _ in range(3):
+        driver("zzqx", None, sites=["amazon"])
+    assert monitor.state("amazon") == "open"
+
+def test_driver_ui_results_carry_site_status(httpsGet):
+    results = driver("test", None, num=1, ui=True)
+    assert isinstance(results, list)
+    assert results.attrs["site_status"]["bestbuy"] == "ok"
+
+def test_driver_reports_rejected_sites_when_saturated(httpsGet, monkeypatch):
+    from slash.src.modules.scheduler import Scheduler
+    monkeypatch.setattr("slash.src.modules.scraper.SCHEDULER", Scheduler(max_workers=1, max_queue=0))
+    df = driver("test", None, num=1)
+    assert "rejected" in df.attrs["site_status"].values()
+
+def test_driver_searches_only_selected_sites(httpsGet, monkeypatch):
+    searched = []
+    get_ = scraper.async_httpsGet
+
+    async def tracking_get(url, timeout=None, parse_only=None):
+        searched.append(url)
+        return await get_(url)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", tracking_get)
+    df = driver("test", None, num=1, sites=["Amazon", "bestbuy"])
+    assert sorted(df["website"].tolist()) == ["amazon", "bestbuy"]
+    assert list(df.attrs["site_status"]) == ["amazon", "bestbuy"]
+    assert len(searched) == 2
+
+def test_driver_ui_merges_selected_sites(httpsGet):
+    results = driver("test", None, ui=True, sites=["walmart", "google"])
+    assert [p["website"] for p in results] == ["walmart", "google"]
+
+def test_driver_skips_sites_with_open_breaker(httpsGet, monkeypatch):
+    get_ = scraper.async_httpsGet
+    calls = []
+
+    async def failing_walmart(url, timeout=None, parse_only=None):
+        if "walmart.com" in url:
+            calls.append(url)
+            raise ConnectionError("503")
+        return await get_(url)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", failing_walmart)
+    for _ in range(5):
+        df = driver("test", None, num=1, sites=["amazon", "walmart"])
+    assert df.attrs["breakers"]["walmart"] == "open"
+    df = driver("test", None, num=1, sites=["amazon", "walmart"])
+    assert len(calls) == 5
+    assert df.attrs["site_status"] == {"amazon": "ok", "walmart": "skipped"}
+    assert df.attrs["breakers"] == {"amazon": "closed", "walmart": "open"}
+
+def test_driver_batch_runs_every_query(httpsGet):
+    results = list(driver_batch(["tv", "chair", "desk"], num=1, sites=["amazon", "bestbuy"]))
+    assert sorted(r.query for r in results) == ["chair", "desk", "tv"]
+    for result in results:
+        assert [p["website"] for p in result.products] == ["amazon", "bestbuy"]
+        assert result.site_status == {"amazon": "ok", "bestbuy": "ok"}
+
+def test_driver_batch_bounds_query_site_pairs(httpsGet, monkeypatch):
+    get_ = scraper.async_httpsGet
+    running, peak = [0], [0]
+
+    async def counting_get(url, timeout=None, parse_only=None):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.02)
+        running[0] -= 1
+        return await get_(url)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", counting_get)
+    queries = [f"item {i}" for i in range(6)]
+    results = list(driver_batch(queries, sites=["amazon", "walmart", "bestbuy"], concurrency=4))
+    assert len(results) == 6
+    assert peak[0] == 4
+
+def test_driver_batch_times_out_slow_pairs(httpsGet, monkeypatch):
+    get_ = scraper.async_httpsGet
+
+    async def hung_walmart(url, timeout=None, parse_only=None):
+        if "walmart.com" in url:
+            await asyncio.sleep(5)
+        return await get_(url)
+    monkeypatch.setattr("slash.src.modules.scraper.async_httpsGet", hung_walmart)
+    [result] = driver_batch(["tv"], sites=["amazon", "walmart"], deadline=0.2)
+    assert result.site_status == {"amazon": "ok", "walmart": "timed_out"}
+
+def test_driver_batch_reports_failed_pairs(httpsGet, monkeypatch):
+    site_searcher = scraper.site_searcher
+
+    def broken_walmart(retailer, *args):
+        if retailer.name == "walmart":
+            raise RuntimeError("walmart plugin is broken")
+        return site_searcher(retailer, *args)
+    monkeypatch.setattr(scraper, "site_searcher", broken_walmart)
+    results = list(driver_batch(["tv", "desk"], sites=["amazon", "walmart"]))
+    assert [r.site_status for r in results] == [{"amazon": "ok", "walmart": "error"}] * 2
+
+def paged_retailer(pages, delays=None, calls=None):
+    from slash.src.modules.retailers import Retailer
+
+    async def search(query, df_flag, currency, page=1, limit=None):
+        if calls is not None:
+            calls.append(page)
+        await asyncio.sleep((delays or {}).get(page, 0))
+        return [{"title": f"p{page}-{i}", "website": "shop"} for i in range(pages.get(page, 0))]
+    return Retailer("shop", search, paginated=True)
+
+def test_search_pages_fetches_later_pages_in_parallel():
+    from slash.src.modules.retailers import Retailer
+    search_pages = scraper.search_pages
+    running, peak = [0], [0]
+
+    async def search(query, df_flag, currency, page=1, limit=None):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return [{"title": f"p{page}-{i}", "website": "shop"} for i in range(2)]
+    products = asyncio.run(search_pages(Retailer("shop", search, paginated=True), "tv", 0, None, pages=3))
+    assert [p["title"] for p in products] == ["p1-0", "p1-1", "p2-0", "p2-1", "p3-0", "p3-1"]
+    assert peak[0] == 2
+
+def test_search_pages_stops_at_empty_page():
+    search_pages = scraper.search_pages
+    retailer = paged_retailer({1: 2, 2: 1, 4: 2})
+    products = asyncio.run(search_pages(retailer, "tv", 0, None, pages=5))
+    assert [p["title"] for p in products] == ["p1-0", "p1-1", "p2-0"]
+
+def test_search_pages_stops_once_limit_is_collected():
+    search_pages = scraper.search_pages
+    calls = []
+    retailer = paged_retailer({1: 3, 2: 3, 3: 3}, calls=calls)
+    assert len(asyncio.run(search_pages(retailer, "tv", 0, None, pages=3, limit=2))) == 2
+    assert calls == [1]
+    products = asyncio.run(search_pages(retailer, "tv", 0, None, pages=3, limit=5))
+    assert [p["title"] for p in products] == ["p1-0", "p1-1", "p1-2", "p2-0", "p2-1"]
+
+def test_timed_out_sweep_keeps_pages_already_read(monkeypatch):
+    from slash.src.modules import retailers
+    monkeypatch.setitem(retailers.RETAILERS, "shop", paged_retailer({1: 2, 2: 2, 3: 2}, delays={3: 5}))
+    df = driver("tv", None, sites=["shop"], pages=3, deadline=0.1)
+    assert df.attrs["site_status"]["shop"] == "timed_out"
+    assert df["title"].tolist() == ["p1-0", "p1-1", "p2-0", "p2-1"]
+    assert scraper.search_deadline(0.1, pages=3) == 0.2
+
+def test_target_count_is_pushed_down():
+    target_params = scraper.targetParams
+    assert target_params("tv")["count"] == "24"
+    params = target_params("tv", page=3, limit=5)
+    assert params["count"] == "5" and params["offset"] == "10"
+
+def test_driver_reads_extra_pages(httpsGet):
+    df = driver("test", None, sites=["amazon", "google"], pages=3)
+    counts = df["website"].value_counts()
+    assert counts["amazon"] == 3
+    assert counts["google"] == 1
+
+def test_driver_num_skips_unneeded_results(replay_corpus):
+    full = driver(QUERY, None, sites=replay_corpus)
+    limited = driver(QUERY, None, num=3, sites=replay_corpus)
+    assert set(full.attrs["skipped"].values()) == {0}
+    assert all(limited.attrs["skipped"][site] > 0 for site in replay_corpus)
+    for site in replay_corpus:
+        expected = full[full["website"] == site]["title"].tolist()[:3]
+        assert limited[limited["website"] == site]["title"].tolist() == expected
+
+def test_driver_fields_returns_only_projected_columns(replay_corpus):
+    full = driver(QUERY, None, sites=replay_corpus)
+    projected = driver(QUERY, None, sites=replay_corpus, fields="price")
+    assert sorted(projected.columns) == ["price", "title", "website"]
+    assert all(isinstance(value, float) for value in full["price_value"].dropna())
+    assert all(isinstance(value, int) for value in full["num_ratings"])
+    assert "nan" not in full.astype(str).values
+    assert projected.values.tolist() == full[projected.columns].values.tolist()
+    with pytest.raises(ValueError):
+        driver(QUERY, None, sites=replay_corpus, fields=["colour"])
+
+def test_driver_rejects_unknown_sites():
+    with pytest.raises(ValueError, match="nosuchshop"):
+        driver("test", None, sites=["nosuchshop"])
+
+def test_registered_retailer_plugin_is_searched(monkeypatch):
+    from slash.src.modules import retailers
+
+    async def search_shop(query, df_flag, currency):
+        return [{"title": f"{query} at shop", "price": "$1", "link": "http://shop.com/1", "website": "shop"}]
+    monkeypatch.setitem(retailers.RETAILERS, "shop", retailers.Retailer("shop", search_shop))
+    df = driver("chair", None, sites=["shop"])
+    assert df["title"].tolist() == ["chair at shop"]
+
+@pytest.mark.parametrize("site, search, html", [
+    ("amazon", searchAmazon, sample_amazon_html),
+    ("walmart", searchWalmart, sample_walmart_html),
+    ("bjs", searchBJs, sample_bjs_html),
+    ("bestbuy", searchBestbuy, sample_bestbuy_html),
+])
+def test_partial_parsing_matches_full_parse(site, search, html, monkeypatch):
+    page = f"<html><head><script>var x = 1;</script></head><body><nav>menu</nav>{html}<footer>f</footer></body></html>"
+    monkeypatch.setattr(scraper, "fetch", lambda url, **kwargs: scraper.FetchResult(200, page.encode(), {}))
+    partial = search("test", 0, None)
+    monkeypatch.setattr(scraper, "PARTIAL_PARSING", False)
+    full = search("test", 0, None)
+    strip = lambda products: [{k: v for k, v in p.items() if k != "timestamp"} for p in products]
+    assert strip(partial) == strip(full) and len(partial) == 1
+
 def test_amazon_empty(httpsGetempty):
     products = searchAmazon("test", 0, "usd")
     assert products == []
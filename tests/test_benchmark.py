@@ -0,0 +1,21 @@
+from slash.src.modules import benchmark, scraper
+
+
+def test_benchmark_runs_offline():
+    recorder, cache = scraper.RECORDER, scraper.RESPONSE_CACHE
+    report = benchmark.run(repeat=1)
+    assert scraper.RECORDER is recorder and scraper.RESPONSE_CACHE is cache
+    assert set(report["stages"]) == {"fetch", "parse", "extract", "format", "dataframe", "sort", "filter", "driver"}
+    assert report["stages"]["fetch"]["items"] == 7
+    assert report["stages"]["format"]["items"] == report["stages"]["driver"]["items"] > 0
+    assert set(report["sites"]) == set(benchmark.HTML_SITES + benchmark.JSON_SITES)
+    assert benchmark.compare(report, report) == []
+
+
+def test_benchmark_compare_flags_slow_stages():
+    baseline = {"stages": {"parse": {"seconds": 0.1}, "sort": {"seconds": 0.0001}, "format": {"seconds": 0.01}}}
+    report = {"stages": {"parse": {"seconds": 0.13}, "sort": {"seconds": 0.0003}, "format": {"seconds": 0.011},
+                         "driver": {"seconds": 1.0}}}
+    assert benchmark.compare(report, baseline, threshold=0.2) == [("parse", 0.1, 0.13)]
+    assert benchmark.compare(report, baseline, threshold=0.5) == []
+
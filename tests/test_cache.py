@@ -0,0 +1,183 @@
+import time
+import pytest
+from slash.src.modules import scraper
+from slash.src.modules.cache import (
+    SearchCache,
+    canonical_query,
+    ResponseCache,
+    MemoryCache,
+    SQLiteCache,
+    normalize_key,
+    ttl_for
+)
+from .fakes import FakeResponse, FakeSession
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Fixture for a two-tier cache backed by a temporary SQLite file."""
+    cache = ResponseCache(MemoryCache(), SQLiteCache(str(tmp_path / "responses.db")))
+    yield cache
+    cache.disk.conn.close()
+
+
+def test_normalize_key_sorts_params_and_lowercases_host():
+    a = normalize_key("https://WWW.Amazon.com/s?k=tv&b=1#frag")
+    b = normalize_key("https://www.amazon.com/s", {"b": 1, "k": "tv"})
+    assert a == b
+
+
+def test_ttl_for_matches_site_domain():
+    assert ttl_for("https://redsky.target.com/x") == 900
+    assert ttl_for("https://www.google.com/search") == 300
+
+
+def test_cache_miss_then_hit(cache):
+    assert cache.get("https://www.amazon.com/s?k=tv") is None
+    cache.set("https://www.amazon.com/s?k=tv", None, b"<html></html>", {"Content-Type": "text/html"})
+    assert cache.get("https://www.amazon.com/s?k=tv") == (b"<html></html>", {"Content-Type": "text/html"})
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["memory_hits"] == 1 and stats["stores"] == 1
+
+
+def test_disk_tier_survives_memory_clear(cache):
+    cache.set("https://www.walmart.com/search?q=tv", None, b"page")
+    cache.memory.clear()
+    assert cache.get("https://www.walmart.com/search?q=tv")[0] == b"page"
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("https://www.walmart.com/search?q=tv")[0] == b"page"
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set("https://www.bestbuy.com/site?st=tv", None, b"page", ttl=-1)
+    assert cache.get("https://www.bestbuy.com/site?st=tv") is None
+
+
+def test_memory_tier_evicts_least_recently_used():
+    memory = MemoryCache(max_bytes=10)
+    expires_at = time.time() + 60
+    memory.set("a", b"12345", {}, expires_at)
+    memory.set("b", b"12345", {}, expires_at)
+    memory.get("a")
+    memory.set("c", b"12345", {}, expires_at)
+    assert memory.get("b") is None
+    assert memory.get("a") is not None
+    assert memory.evictions == 1
+
+
+def test_disk_tier_evicts_past_max_bytes(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "small.db"), max_bytes=10)
+    expires_at = time.time() + 60
+    disk.set("a", b"12345", {}, expires_at)
+    disk.set("b", b"12345", {}, expires_at)
+    disk.set("c", b"12345", {}, expires_at)
+    assert disk.get("a") is None
+    assert disk.get("c") is not None
+    assert disk.evictions == 1
+
+
+def test_disk_tier_reads_do_not_commit_but_keep_lru_order(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "small.db"), max_bytes=10)
+    expires_at = time.time() + 60
+    disk.set("a", b"12345", {}, expires_at)
+    time.sleep(0.01)
+    disk.set("b", b"12345", {}, expires_at)
+    changes = disk.conn.total_changes
+    assert disk.get("a") is not None
+    assert disk.conn.total_changes == changes and "a" in disk.touched
+    disk.set("c", b"12345", {}, expires_at)
+    assert disk.get("b") is None and disk.get("a") is not None
+
+
+def test_async_fetch_reads_disk_tier_off_the_event_loop(tmp_path, monkeypatch):
+    cache = ResponseCache(MemoryCache(), SQLiteCache(str(tmp_path / "responses.db")))
+    cache.disk.set(normalize_key("https://example.com/x"), b"body", {}, time.time() + 60)
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", cache)
+    blocking = []
+    run_blocking = scraper.SCHEDULER.run_blocking
+
+    async def spy(fn, *args):
+        blocking.append(fn)
+        return await run_blocking(fn, *args)
+    monkeypatch.setattr(scraper.SCHEDULER, "run_blocking", spy)
+    assert scraper.run_async(scraper.async_fetch("https://example.com/x")).content == b"body"
+    assert blocking == [cache.get]
+    assert scraper.run_async(scraper.async_fetch("https://example.com/x")).content == b"body"
+    assert blocking == [cache.get] and cache.stats()["memory_hits"] == 1
+
+
+def test_fetch_serves_repeat_requests_from_cache(cache, monkeypatch):
+    session = FakeSession(FakeResponse(b'{"data": {}}'))
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", cache)
+    monkeypatch.setattr(scraper.SESSION, "get", session.get)
+    scraper.searchTarget("tv", 0, None)
+    scraper.searchTarget("tv", 0, None)
+    assert len(session.calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_fetch_does_not_cache_captcha_pages(cache, monkeypatch):
+    pages = [b"<html><title>Robot Check</title>Enter the characters you see</html>", b"<html>results</html>"]
+    session = FakeSession(lambda url: FakeResponse(pages[len(session.calls) - 1]))
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", cache)
+    monkeypatch.setattr(scraper.SESSION, "get", session.get)
+    assert b"Robot Check" in scraper.fetch("https://www.amazon.com/s?k=tv").content
+    assert scraper.fetch("https://www.amazon.com/s?k=tv").content == b"<html>results</html>"
+    assert scraper.fetch("https://www.amazon.com/s?k=tv").content == b"<html>results</html>"
+    assert len(session.calls) == 2
+
+
+def test_canonical_query_ignores_case_spacing_and_token_order():
+    assert canonical_query("AirPods  Pro") == canonical_query("pro airpods")
+    assert canonical_query("tv", "INR") != canonical_query("tv", None)
+    assert canonical_query("tv", sites=["Walmart", "amazon"]) == canonical_query("tv", sites=["amazon", "walmart"])
+    assert canonical_query("tv", sites=["amazon"]) != canonical_query("tv")
+
+
+def test_search_cache_serves_fresh_entries():
+    cache = SearchCache(fresh_ttl=60)
+    calls = []
+    compute = lambda: calls.append(1) or ["row"]
+    assert cache.get("k", compute) == ["row"]
+    assert cache.get("k", compute) == ["row"]
+    assert len(calls) == 1
+    assert cache.stats()["fresh_hits"] == 1
+
+
+def test_search_cache_serves_stale_and_refreshes_in_background():
+    cache = SearchCache(fresh_ttl=0, stale_ttl=60)
+    cache.get("k", lambda: ["old"])
+    assert cache.get("k", lambda: ["new"]) == ["old"]
+    cache.executor.shutdown(wait=True)
+    assert cache.entries["k"][0] == ["new"]
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_search_cache_does_not_store_empty_results():
+    cache = SearchCache()
+    cache.get("k", lambda: [])
+    assert cache.get("k", lambda: ["row"]) == ["row"]
+    assert cache.stats()["misses"] == 2
+
+
+def site_result(rows, **site_status):
+    result = scraper.SearchResults(rows)
+    result.attrs["site_status"] = site_status
+    return result
+
+
+def test_search_cache_does_not_store_results_with_failed_sites():
+    cache = SearchCache()
+    cache.get("k", lambda: site_result(["row"], amazon="ok", walmart="timed_out"))
+    assert "k" not in cache.entries
+    cache.get("k", lambda: site_result(["row"], amazon="ok", walmart="ok"))
+    assert "k" in cache.entries
+
+
+def test_search_cache_refresh_keeps_entry_covering_more_sites():
+    cache = SearchCache(fresh_ttl=0, stale_ttl=60)
+    cache.get("k", lambda: site_result(["a", "w"], amazon="ok", walmart="ok"))
+    assert cache.get("k", lambda: site_result(["a"], amazon="ok", walmart="skipped")) == ["a", "w"]
+    cache.executor.shutdown(wait=True)
+    assert cache.entries["k"][0] == ["a", "w"]
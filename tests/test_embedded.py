@@ -0,0 +1,76 @@
+import json
+import pytest
+from slash.src.modules import scraper
+from slash.src.modules.embedded import EMBEDDED, NEXT_DATA, Key, assignment, find_items, read_embedded
+from slash.src.modules.metrics import EXTRACTION_PATHS
+from .fakes import FakeResponse
+
+WALMART_STATE = {"props": {"pageProps": {"initialData": {"searchResult": {
+    "breadCrumb": [{"name": "Electronics", "url": "/cp/electronics"}],
+    "itemStacks": [{"items": [
+        {"__typename": "Product", "name": "TV 1", "canonicalUrl": "/ip/tv-1/1",
+         "priceInfo": {"linePrice": "$1,148.00"}, "averageRating": 4.5, "numberOfReviews": 120,
+         "imageInfo": {"thumbnailUrl": "https://i5.walmartimages.com/1.jpg"}},
+        {"__typename": "AdPlaceholder"},
+        {"__typename": "Product", "name": "TV 2 </b>", "canonicalUrl": "/ip/tv-2/2", "price": 98,
+         "averageRating": None, "numberOfReviews": 0},
+    ]}],
+}}}}}
+WALMART_PAGE = ('<html><head><script>var x = 1;</script></head><body><div data-item-id="9">dom</div>'
+                '<script id="__NEXT_DATA__" type="application/json">' + json.dumps(WALMART_STATE)
+                + "</script></body></html>").encode()
+
+
+def test_next_data_is_sliced_from_bytes():
+    assert json.loads(NEXT_DATA(WALMART_PAGE)) == WALMART_STATE
+    assert NEXT_DATA(b"<html><script>{}</script></html>") is None
+
+
+def test_assignment_blob():
+    page = b'<script>window.__INITIAL_STATE__ = {"a": [1, 2]};\n</script>'
+    assert json.loads(assignment("__INITIAL_STATE__")(page)) == {"a": [1, 2]}
+
+
+def test_find_items_and_key():
+    items = find_items(WALMART_STATE, ("name", "canonicalUrl"))
+    assert [item["name"] for item in items] == ["TV 1", "TV 2 </b>"]
+    assert Key("priceInfo.linePrice", "price")(items[1]) == 98
+    assert Key("missing.path")(items[0]) is None
+
+
+def test_walmart_products_from_next_data():
+    products = read_embedded(EMBEDDED["walmart"], WALMART_PAGE).products(0, None)
+    assert [p["title"] for p in products] == ["TV 1", "TV 2 </b>"]
+    assert [p["price"] for p in products] == ["$1148.00", "$98"]
+    assert products[0]["link"] == "https://www.walmart.com/ip/tv-1/1"
+    assert (products[0]["rating"], products[0]["no_of_ratings"]) == (4.5, 120)
+    assert products[0]["img_link"] == "https://i5.walmartimages.com/1.jpg"
+
+
+def test_bestbuy_products_from_initial_state():
+    state = {"shop": {"products": [{"skuId": "1", "name": {"short": "Laptop"}, "url": "/site/laptop/1.p",
+                                    "price": {"customerPrice": 499.99}, "customerRating": 4.8,
+                                    "customerReviewCount": 37}]}}
+    page = ("<html><script>window.__INITIAL_STATE__ = " + json.dumps(state) + ";</script></html>").encode()
+    [product] = read_embedded(EMBEDDED["bestbuy"], page).products(0, None)
+    assert (product["title"], product["price"], product["rating"]) == ("Laptop", "$499.99", 4.8)
+    assert product["link"] == "https://www.bestbuy.com/site/laptop/1.p"
+
+
+@pytest.mark.parametrize("page", [b"<html><body></body></html>",
+                                  b'<script id="__NEXT_DATA__" type="application/json">{"props": </script>',
+                                  b'<script id="__NEXT_DATA__" type="application/json">{"props": {}}</script>'])
+def test_pages_without_usable_blob_fall_back(page):
+    before = EXTRACTION_PATHS.value(site="walmart", path="dom")
+    assert read_embedded(EMBEDDED["walmart"], page) is None
+    assert EXTRACTION_PATHS.value(site="walmart", path="dom") == before + 1
+
+
+def test_search_uses_blob_then_dom(monkeypatch):
+    dom = ('<html><body><div data-item-id="1"><span class="lh-title">DOM TV</span>'
+           '<div class="lh-copy">$5.00</div><a href="/ip/dom/1">x</a></div></body></html>').encode()
+    pages = {"embedded": WALMART_PAGE, "dom": dom}
+    monkeypatch.setattr(scraper, "STREAM_PARSING", False)
+    monkeypatch.setattr(scraper, "fetch", lambda url, **kwargs: FakeResponse(pages[url.split("q=")[1]]))
+    assert [p["title"] for p in scraper.searchWalmart("embedded", 0, None)] == ["TV 1", "TV 2 </b>"]
+    assert [p["title"] for p in scraper.searchWalmart("dom", 0, None)] == ["DOM TV"]
@@ -0,0 +1,71 @@
+import soupsieve as sv
+from bs4 import BeautifulSoup
+from slash.src.modules.extractors import EXTRACTORS, SiteSpec, Select, First, MatchText, TextGroup, extract
+
+
+def test_selectors_are_compiled_at_import():
+    for spec in EXTRACTORS.values():
+        assert isinstance(spec.container.compiled, sv.SoupSieve)
+        for field in spec.fields.values():
+            assert isinstance(field.compiled, sv.SoupSieve)
+
+
+def test_new_retailer_is_just_a_spec():
+    spec = SiteSpec("shop", "li.item", {
+        "titles": Select("h2"),
+        "prices": Select(".price"),
+        "links": Select("a"),
+        "trending": First(".badge"),
+    })
+    page = BeautifulSoup("""
+    <ul>
+      <li class="item"><h2>First</h2><span class="price">$1.50</span><a href="/a">a</a></li>
+      <li class="item"><h2>Second</h2><span class="price">$2,000.00</span><a href="http://x.com/b">b</a></li>
+    </ul>""", "lxml")
+    products = extract(spec, page, 0, None)
+    assert [p["title"] for p in products] == ["First", "Second"]
+    assert [p["price"] for p in products] == ["$1.50", "$2000.00"]
+    assert [p["link"] for p in products] == ["https://www.shop.com/a", "http://x.com/b"]
+
+
+def test_text_fields():
+    page = BeautifulSoup("""<div>
+      <span class="r">4.0 out of 5 Stars</span><span class="r">sponsored</span>
+      <span class="n">1,234 reviews</span>
+    </div>""", "lxml")
+    assert [el.string for el in MatchText("span.r", r"out of 5 Stars")(page)] == ["4.0 out of 5 Stars"]
+    assert TextGroup("span.n", r"(\d+,\d+)")(page) == "1,234"
+    assert TextGroup("span.missing", r"(\d+)")(page) is None
+    assert First("span.missing")(page) is None
+
+
+def test_post_hook_runs_on_each_product():
+    page = BeautifulSoup("""<div class="product">
+      <p class="no-select d-none auto-height"><a href="/p">Chair</a></p>
+      <span class="price">$20.99</span><span class="on"></span><span class="on"></span>
+    </div>""", "lxml")
+    products = extract(EXTRACTORS["bjs"], page, 0, None)
+    assert products[0]["title"] == "Chair"
+    assert products[0]["rating"] == 2
+
+
+def test_extract_stops_after_limit_titled_products():
+    spec = SiteSpec("shop", "li.item", {"titles": Select("h2"), "links": Select("a")})
+    page = BeautifulSoup("<ul>" + "".join(
+        f'<li class="item"><h2>{title}</h2><a href="/{i}">x</a></li>'
+        for i, title in enumerate(["", "One", " ", "Two", "Three", "Four"])) + "</ul>", "lxml")
+    products = extract(spec, page, 0, None, limit=2)
+    assert [p["title"] for p in products] == ["", "One", "", "Two"]
+    assert products.skipped == 2
+    assert extract(spec, page, 0, None).skipped == 0
+
+
+def test_extract_runs_only_the_selected_fields():
+    def unused(node):
+        raise AssertionError("field outside the projection was extracted")
+    spec = SiteSpec("shop", "li.item", {"titles": Select("h2"), "prices": Select(".price"), "links": Select("a"),
+                                        "img_links": unused, "ratings": unused})
+    page = BeautifulSoup('<ul><li class="item"><h2>First</h2><span class="price">$1.50</span>'
+                         '<a href="/a">a</a></li></ul>', "lxml")
+    assert extract(spec, page, 0, None, fields={"title", "website", "price"}) == [
+        {"title": "First", "price": "$1.50", "website": "shop"}]
@@ -0,0 +1,61 @@
+import math
+import pandas as pd
+import pytest
+from slash.src.modules import formatter
+from slash.src.modules.formatter import formatResult, normalize, product_fields, sortList
+from slash.src.modules.scraper import filter as filter_results
+
+PRODUCTS = [
+    {"title": "A", "price": "$1,148.00", "rating": "4.5", "no_of_ratings": "1,234"},
+    {"title": "B", "price": "INR 12", "rating": None, "no_of_ratings": ""},
+    {"title": "C", "price": "Price not available", "rating": 3, "no_of_ratings": 7},
+    {"title": "D", "price": "$98", "rating": "4.8 out of 5 stars", "no_of_ratings": 0},
+]
+
+
+def test_normalize_adds_typed_columns():
+    frame = normalize(pd.DataFrame(PRODUCTS))
+    assert frame["price_value"].tolist()[:2] == [1148.0, 12.0] and math.isnan(frame["price_value"][2])
+    assert frame["price_currency"].tolist() == ["$", "INR", None, "$"]
+    assert frame["rating"].dtype == float and frame["rating"][3] == 4.8 and math.isnan(frame["rating"][1])
+    assert frame["num_ratings"].tolist() == [1234, 0, 7, 0] and frame["num_ratings"].dtype == int
+    assert frame["price"].tolist() == ["$1148.00", "$12", "Price not available", "$98"]
+    assert frame["no_of_ratings"].tolist() == ["1234", "", 7, 0]
+
+
+def test_normalize_follows_fields():
+    frame = normalize(pd.DataFrame(PRODUCTS), {"title", "price", "price_value"})
+    assert "price_currency" not in frame and "num_ratings" not in frame
+    assert normalize(pd.DataFrame()).empty
+    assert product_fields("price_value") == {"title", "website", "price", "price_value"}
+
+
+def test_sort_uses_typed_columns():
+    frame = pd.DataFrame(PRODUCTS)
+    assert sortList(frame, "pr", True)["title"].tolist() == ["B", "D", "A", "C"]
+    assert list(sortList(frame, "pr", True).columns) == list(frame.columns)
+    assert sortList(normalize(frame), "pr", False)["title"].tolist() == ["A", "D", "B", "C"]
+    assert sortList(frame, "ra", False)["title"].tolist() == ["D", "A", "C", "B"]
+
+
+def test_format_result_cleans_and_types_values(monkeypatch):
+    monkeypatch.setattr(formatter, "EXCHANGES", {"rates": {"EUR": 0.5}})
+    first = formatResult("amazon", "A", " $1,148.00 ", "/dp/a", "4.3 out of 5 stars", "(1,234)", None, 0, "eur")
+    assert (first["price"], first["converted_price"], first["price_value"]) == ("$1148.00", "EUR 574.0", 1148.0)
+    assert (first["rating"], first["no_of_ratings"], first["num_ratings"]) == (4.3, "1234", 1234)
+    assert first["price_currency"] == "$"
+    empty = formatResult("amazon", "B", "", "/dp/b", "", "", None, 0, None)
+    assert (empty["price"], empty["price_value"], empty["rating"], empty["num_ratings"]) == ("", None, None, 0)
+    api = formatResult("target", "C", "$5.5", "http://c", 4, 12, None, 0, "eur")
+    assert (api["price_value"], api["rating"], api["num_ratings"], api["converted_price"]) == (5.5, 4.0, 12, "EUR 2.75")
+
+
+@pytest.mark.parametrize("bounds, titles", [
+    ({"price_min": 50}, ["A", "D"]),
+    ({"price_max": 100, "rating_min": 4}, ["D"]),
+    ({}, ["A", "B", "C", "D"]),
+])
+def test_filter_bounds(bounds, titles):
+    assert [p["title"] for p in filter_results(PRODUCTS, **bounds)] == titles
+    assert filter_results([], price_min=1) == []
+
@@ -0,0 +1,70 @@
+from slash.src.modules.health import CircuitBreaker, HealthMonitor, SiteHealth
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_failure_rate_is_reached():
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, cooldown=10)
+    for failed in (False, True, False):
+        breaker.record(failed, 0)
+    assert breaker.state == "closed"
+    breaker.record(True, 0)
+    assert breaker.state == "open"
+    assert not breaker.allow(5)
+
+
+def test_half_open_probe_closes_or_reopens_with_longer_cooldown():
+    breaker = CircuitBreaker(min_calls=1, cooldown=10)
+    breaker.record(True, 0)
+    assert breaker.allow(10)
+    assert breaker.state == "half_open"
+    assert not breaker.allow(10)
+    breaker.record(True, 10)
+    assert breaker.state == "open"
+    assert not breaker.allow(29)
+    assert breaker.allow(30)
+    breaker.record(False, 30)
+    assert breaker.state == "closed"
+    assert breaker.current_cooldown() == 10
+
+
+def test_abandoned_probe_frees_the_slot():
+    breaker = CircuitBreaker(min_calls=1, cooldown=1)
+    breaker.record(True, 0)
+    assert breaker.allow(1)
+    breaker.abandon()
+    assert breaker.allow(1)
+
+
+def test_site_health_rates_and_histogram():
+    health = SiteHealth()
+    for latency, outcome in ((0.05, "ok"), (0.3, "empty"), (3.0, "error"), (9.0, "timed_out"), (0.2, "blocked")):
+        health.record(latency, outcome)
+    stats = health.stats()
+    assert stats["calls"] == 5
+    assert stats["error_rate"] == stats["empty_rate"] == stats["timeout_rate"] == stats["blocked_rate"] == 0.2
+    assert stats["latency_histogram"]["le_0.1"] == 1
+    assert stats["latency_histogram"]["le_0.25"] == 1
+    assert stats["latency_histogram"]["le_0.5"] == 1
+    assert stats["latency_histogram"]["le_5.0"] == 1
+    assert stats["latency_histogram"]["inf"] == 1
+    assert stats["latency_p50"] == 0.3
+
+
+def test_monitor_counts_skipped_calls():
+    clock = Clock()
+    monitor = HealthMonitor(clock=clock, min_calls=2, cooldown=5)
+    monitor.record("target", 1.0, "blocked")
+    monitor.record("target", 1.0, "error")
+    assert not monitor.allow("target")
+    assert monitor.stats()["target"]["skipped"] == 1
+    clock.now = 5
+    assert monitor.allow("target")
+    monitor.record("target", 0.2, "ok")
+    assert monitor.state("target") == "closed"
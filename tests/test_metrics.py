@@ -0,0 +1,77 @@
+import sqlite3
+import pytest
+from slash.src.modules.metrics import Registry, site_label, timed
+
+
+def test_counter_renders_labelled_series():
+    registry = Registry()
+    fetches = registry.counter("fetches_total", "Fetches.", ["site", "source"])
+    fetches.inc(site="amazon", source="network")
+    fetches.inc(2, site="amazon", source="cache")
+    assert fetches.value(site="amazon", source="cache") == 2
+    assert registry.render().splitlines() == [
+        "# HELP fetches_total Fetches.",
+        "# TYPE fetches_total counter",
+        'fetches_total{site="amazon",source="cache"} 2',
+        'fetches_total{site="amazon",source="network"} 1',
+    ]
+
+
+def test_counter_rejects_wrong_labels():
+    counter = Registry().counter("errors_total", "Errors.", ["site"])
+    with pytest.raises(ValueError):
+        counter.inc(host="amazon")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, stage="parse")
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="parse",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{stage="parse",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{stage="parse"} 4.05' in lines
+    assert 'latency_seconds_count{stage="parse"} 4' in lines
+
+
+def test_callback_metrics_are_read_at_render_time():
+    registry = Registry()
+    depth = {"queued": 3}
+    registry.gauge("queue_depth", "Queued jobs.", ["pool"], lambda: {("parser",): depth["queued"]})
+    assert 'queue_depth{pool="parser"} 3' in registry.render()
+    depth["queued"] = 0
+    assert 'queue_depth{pool="parser"} 0' in registry.render()
+
+
+def test_broken_callback_does_not_break_render():
+    registry = Registry()
+    registry.gauge("broken", "Broken.", callback=lambda: 1 / 0)
+    registry.counter("ok_total", "Ok.").inc()
+    body = registry.render()
+    assert "# broken unavailable" in body
+    assert "ok_total 1" in body
+
+
+def test_timed_records_calls_and_errors():
+    registry = Registry()
+    seconds = registry.histogram("db_seconds", "DB time.", ["operation"])
+    errors = registry.counter("db_errors_total", "DB errors.", ["operation"])
+
+    @timed(seconds, errors)
+    def get_user(fail=False):
+        if fail:
+            raise sqlite3.OperationalError("locked")
+        return "user"
+    assert get_user() == "user"
+    with pytest.raises(sqlite3.OperationalError):
+        get_user(fail=True)
+    assert seconds.count(operation="get_user") == 2
+    assert errors.value(operation="get_user") == 1
+
+
+def test_site_label_uses_retailer_domain():
+    assert site_label("https://www.amazon.com/s?k=tv") == "amazon"
+    assert site_label("https://redsky.target.com/redsky_aggregations/v1") == "target"
+    assert site_label("https://svcs.ebay.com/services/search/FindingService/v1") == "ebay"
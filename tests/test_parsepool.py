@@ -0,0 +1,82 @@
+import pytest
+from slash.src.modules import scraper
+from slash.src.modules.cache import ResponseCache, MemoryCache
+from slash.src.modules.parsepool import ParsePool, parse_products, unpack
+from slash.src.modules.recorder import Recorder
+from slash.src.modules.transport import Transport
+from .fakes import FakeResponse, FakeSession
+
+ITEM = ('<div data-component-type="s-search-result"><div class="inner"><h2><a class="a-link-normal" '
+        'href="/dp/{0}"><span>Item {0}</span></a></h2><img class="s-image" src="/{0}.jpg">'
+        '<span class="a-price"><span>${0}.99</span></span></div></div>')
+PAGE = ("<html><body>" + "".join(ITEM.format(i) for i in range(1, 11)) + "</body></html>").encode()
+
+
+def without_timestamps(products):
+    return [{k: v for k, v in product.items() if k != "timestamp"} for product in products]
+
+
+def test_parse_products_matches_in_thread_parse():
+    columns, rows, skipped, timings = parse_products("amazon", PAGE, scraper.PAGE_STRAINERS["amazon"], 0, None)
+    expected = scraper.parseAmazon(scraper.parsePage(PAGE, scraper.PAGE_STRAINERS["amazon"]), 0, None)
+    assert without_timestamps(unpack(columns, rows)) == without_timestamps(expected)
+    assert len(rows) == 10 and skipped == 0 and all(isinstance(row, tuple) for row in rows)
+    assert set(timings) == {"parse", "extract", "format"}
+    assert all(start <= end for start, end in timings.values())
+
+
+def test_parse_products_empty_page():
+    assert parse_products("amazon", b"<html></html>", None, 0, None)[:3] == ((), [], 0)
+
+
+def test_parse_products_stops_at_limit():
+    columns, rows, skipped, _ = parse_products("amazon", PAGE, None, 0, None, limit=3)
+    assert [product["title"] for product in unpack(columns, rows)] == ["Item 1", "Item 2", "Item 3"]
+    assert skipped == 7
+
+
+def test_accepts_counts_decisions():
+    pool = ParsePool(workers=0, min_bytes=10)
+    assert not pool.accepts(PAGE)
+    pool.configure(workers=2)
+    assert pool.accepts(PAGE)
+    assert not pool.accepts(b"<p></p>")
+    assert pool.stats() == {"offloaded": 1, "in_thread": 2, "workers": 2}
+    assert pool.executor is None
+
+
+def test_warm_starts_workers_up_front():
+    pool = ParsePool(workers=0)
+    assert pool.warm() == [] and pool.executor is None
+    pool.configure(workers=1)
+    try:
+        assert len(pool.warm()) == 1 and pool.executor is not None
+    finally:
+        pool.shutdown()
+
+
+@pytest.fixture
+def pooled(monkeypatch):
+    session = FakeSession(FakeResponse(PAGE, headers={"Content-Type": "text/html"}))
+    pool = ParsePool(workers=1, min_bytes=1024)
+    monkeypatch.setattr(scraper, "PARSE_POOL", pool)
+    monkeypatch.setattr(scraper, "STREAM_PARSING", False)
+    monkeypatch.setattr(scraper, "RECORDER", Recorder())
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", ResponseCache(MemoryCache(), None))
+    monkeypatch.setattr(scraper, "TRANSPORT", Transport())
+    monkeypatch.setattr(scraper, "get_async_session", lambda: session)
+    yield pool
+    pool.shutdown()
+
+
+def test_search_parses_large_pages_in_pool(pooled):
+    products = scraper.run_async(scraper.async_searchAmazon("tv", 0, None))
+    assert [p["title"] for p in products] == [f"Item {i}" for i in range(1, 11)]
+    assert pooled.stats()["offloaded"] == 1 and pooled.executor is not None
+
+
+def test_search_parses_small_pages_in_thread(pooled):
+    pooled.configure(min_bytes=len(PAGE) + 1)
+    products = scraper.run_async(scraper.async_searchAmazon("tv", 0, None))
+    assert len(products) == 10
+    assert pooled.stats()["in_thread"] == 1 and pooled.executor is None
@@ -0,0 +1,68 @@
+import time
+import pytest
+from slash.src.modules import scraper
+from slash.src.modules.recorder import Recorder, Corpus, MissingRecording, RECORD, REPLAY
+from slash.src.modules.transport import Transport
+from .fakes import FakeResponse, FakeSession
+
+AMAZON_PAGE = b"""<html><body><div data-component-type="s-search-result">
+<h2><a class="a-link-normal" href="http://example.com/a"><span>Recorded Amazon</span></a></h2>
+<span class="a-price"><span>$10.99</span></span></div></body></html>"""
+BESTBUY_PAGE = b"""<html><body><li class="sku-item"><h4 class="sku-title">
+<a href="http://example.com/b">Recorded Bestbuy</a></h4>
+<div class="priceView-customer-price"><span>$25.99</span></div></li></body></html>"""
+
+
+def live_page(url):
+    """Stands in for the retailers while recording."""
+    pages = {"amazon.com": AMAZON_PAGE, "bestbuy.com": BESTBUY_PAGE}
+    page = next(page for host, page in pages.items() if host in url)
+    return FakeResponse(page, headers={"Content-Type": "text/html"})
+
+
+class OfflineSession:
+    def get(self, url, **kwargs):
+        raise AssertionError("replay must not touch the network")
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    recorder = Recorder(RECORD, str(tmp_path))
+    monkeypatch.setattr(scraper, "RECORDER", recorder)
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", None)
+    monkeypatch.setattr(scraper, "TRANSPORT", Transport())
+    return recorder
+
+
+def test_corpus_round_trip(tmp_path):
+    corpus = Corpus(str(tmp_path))
+    corpus.save("https://www.amazon.com/s?k=tv", None, 200, b"\x00body", {"A": "b"}, 0.25)
+    assert corpus.load("https://WWW.amazon.com/s?k=tv") == (200, b"\x00body", {"A": "b"}, 0.25)
+    assert len(corpus) == 1
+    with pytest.raises(MissingRecording):
+        corpus.load("https://www.amazon.com/s?k=radio")
+
+
+def test_recorded_search_replays_offline(recorder, monkeypatch):
+    monkeypatch.setattr(scraper, "get_async_session", lambda: FakeSession(live_page))
+    recorded = scraper.driver("tv", None, sites=["amazon", "bestbuy"])
+    assert recorder.stats()["recorded"] == 2
+    monkeypatch.setattr(scraper, "get_async_session", OfflineSession)
+    recorder.configure(REPLAY, recorder.corpus.directory)
+    replayed = scraper.driver("tv", None, sites=["amazon", "bestbuy"])
+    assert replayed["title"].tolist() == recorded["title"].tolist() == ["Recorded Amazon", "Recorded Bestbuy"]
+    assert replayed.attrs["site_status"] == {"amazon": "ok", "bestbuy": "ok"}
+
+
+def test_replay_can_reproduce_latency(recorder):
+    recorder.corpus.save("https://www.walmart.com/search?q=tv", None, 200, b"<html></html>", {}, 0.2)
+    recorder.configure(REPLAY, recorder.corpus.directory, replay_latency=True)
+    started = time.monotonic()
+    assert scraper.fetch("https://www.walmart.com/search?q=tv").content == b"<html></html>"
+    assert time.monotonic() - started >= 0.2
+
+
+def test_unrecorded_request_fails_in_replay(recorder):
+    recorder.configure(REPLAY, recorder.corpus.directory)
+    with pytest.raises(MissingRecording):
+        scraper.fetch("https://www.target.com/unknown")
@@ -0,0 +1,74 @@
+import asyncio
+from slash.src.modules.scheduler import Scheduler, SchedulerSaturated, FairLimiter
+
+
+def test_site_limit_caps_concurrency():
+    scheduler = Scheduler(max_workers=10, default_site_limit=2)
+    running, peak = [0], [0]
+
+    async def work():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(scheduler.run("amazon", i, work) for i in range(6)))
+    asyncio.run(main())
+    assert peak[0] == 2
+
+
+def test_waiters_are_served_round_robin_by_request():
+    limiter = FairLimiter(1)
+    order = []
+
+    async def job(request_id, tag):
+        await limiter.acquire(request_id)
+        order.append(tag)
+        await asyncio.sleep(0)
+        limiter.release()
+
+    async def main():
+        await limiter.acquire("holder")
+        tasks = [asyncio.ensure_future(job("batch", f"b{i}")) for i in range(3)]
+        tasks.append(asyncio.ensure_future(job("user", "u0")))
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+    asyncio.run(main())
+    assert order == ["b0", "u0", "b1", "b2"]
+
+
+def test_full_queue_rejects_instead_of_waiting():
+    scheduler = Scheduler(max_workers=1, max_queue=1)
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(scheduler.run("walmart", i, work) for i in range(3)),
+                                    return_exceptions=True)
+    results = asyncio.run(main())
+    assert results[:2] == ["done", "done"]
+    assert isinstance(results[2], SchedulerSaturated)
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_cancelled_waiter_frees_its_place():
+    scheduler = Scheduler(max_workers=1)
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(scheduler.run("bjs", 1, work))
+        second = asyncio.ensure_future(scheduler.run("bjs", 2, work))
+        await asyncio.sleep(0)
+        second.cancel()
+        assert await first == "done"
+        assert await scheduler.run("bjs", 3, work) == "done"
+        return scheduler.stats()
+    stats = asyncio.run(main())
+    assert stats["active"] == 0 and stats["queued"] == 0
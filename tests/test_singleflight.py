@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import pytest
+from slash.src.modules import scraper
+from slash.src.modules.singleflight import SingleFlight, AsyncSingleFlight
+from .fakes import FakeResponse, FakeSession
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return object()
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+    assert len(calls) == 1
+    assert len(results) == 6 and all(r is results[0] for r in results)
+    assert flight.stats()["shared"] == 5
+
+
+def test_errors_propagate_and_are_not_remembered():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_concurrent_calls_share_one_task():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "page"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", slow) for _ in range(10)))
+    assert asyncio.run(main()) == ["page"] * 10
+    assert len(calls) == 1
+
+
+def test_async_cancelled_waiter_does_not_cancel_others():
+    flight = AsyncSingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "page"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", slow))
+        second = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+    assert asyncio.run(main()) == ("page", True)
+
+
+def test_async_last_waiter_cancels_shared_task():
+    flight = AsyncSingleFlight()
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+
+    async def main():
+        waiter = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.2)
+    asyncio.run(main())
+    assert finished == []
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_fetch_coalesces_identical_requests(monkeypatch):
+    calls = []
+    session = FakeSession(FakeResponse(b"<html></html>", delay=0.05), calls)
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", None)
+    monkeypatch.setattr(scraper, "get_async_session", lambda: session)
+
+    async def main():
+        return await asyncio.gather(*(scraper.async_fetch("https://www.amazon.com/s?k=tv") for _ in range(20)))
+    responses = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r.content == b"<html></html>" for r in responses)
+
+
+def test_coalesced_pages_note_the_response_for_every_caller(monkeypatch):
+    session = FakeSession(FakeResponse(b"<html>captcha</html>", delay=0.05))
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", None)
+    monkeypatch.setattr(scraper, "get_async_session", lambda: session)
+
+    async def site_search():
+        responses = []
+        scraper.SITE_RESPONSES.set(responses)
+        await scraper.async_httpsGet("https://www.amazon.com/s?k=tv")
+        return responses
+
+    async def main():
+        return await asyncio.gather(site_search(), site_search())
+    assert asyncio.run(main()) == [[(200, b"<html>captcha</html>")]] * 2
+    assert len(session.calls) == 1
@@ -0,0 +1,106 @@
+import pytest
+from bs4 import SoupStrainer
+from slash.src.modules import scraper
+from slash.src.modules.cache import ResponseCache, MemoryCache
+from slash.src.modules.recorder import Recorder
+from slash.src.modules.streaming import ContainerParser
+from slash.src.modules.transport import Transport
+from .fakes import FakeResponse, FakeSession
+
+ITEM = ('<div data-component-type="s-search-result"><div class="inner"><h2><a class="a-link-normal" '
+        'href="/dp/{0}"><span>Item {0} &amp; more</span></a></h2><img class="s-image" src="/{0}.jpg">'
+        '<span class="a-price"><span>${0}.99</span></span></div></div>')
+PAGE = ("<html><head><script>var s = '<div data-component-type=\"s-search-result\">';</script></head><body>"
+        + "".join(ITEM.format(i) for i in range(1, 11)) + "</body></html>").encode()
+STRAINER = scraper.PAGE_STRAINERS["amazon"]
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_container_parser_keeps_only_containers():
+    parser = ContainerParser(STRAINER)
+    for chunk in chunks(PAGE, 37):
+        parser.feed(chunk)
+    parser.close()
+    assert len(parser.fragments) == 10
+    assert parser.fragments[0] == ITEM.format(1)
+    assert parser.body() == PAGE
+
+
+def test_container_parser_stops_at_limit():
+    parser = ContainerParser(STRAINER, limit=3)
+    fed = 0
+    for chunk in chunks(PAGE, 64):
+        fed += 1
+        parser.feed(chunk)
+        if parser.done:
+            break
+    assert len(parser.fragments) == 3
+    assert fed < len(chunks(PAGE, 64)) / 2
+
+
+def test_container_parser_matches_class_strainers():
+    parser = ContainerParser(SoupStrainer("li", class_="sku-item"))
+    parser.feed(b'<ul><li class="sku-item wide"><b>a</b></li><li class="other">b</li></ul>')
+    parser.close()
+    assert parser.fragments == ['<li class="sku-item wide"><b>a</b></li>']
+
+
+@pytest.fixture
+def streaming(monkeypatch):
+    reads = []
+    session = FakeSession(lambda url: FakeResponse(PAGE, headers={"Content-Type": "text/html; charset=utf-8"},
+                                                   chunk_size=200, reads=reads))
+    monkeypatch.setattr(scraper, "STREAM_PARSING", True)
+    monkeypatch.setattr(scraper, "RECORDER", Recorder())
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", ResponseCache(MemoryCache(), None))
+    monkeypatch.setattr(scraper, "TRANSPORT", Transport())
+    monkeypatch.setattr(scraper, "get_async_session", lambda: session)
+    return reads
+
+
+def test_streamed_search_stops_downloading_at_limit(streaming):
+    products = scraper.run_async(scraper.async_searchAmazon("tv", 0, None, limit=2))
+    assert [p["title"] for p in products] == ["Item 1 & more", "Item 2 & more"]
+    assert sum(streaming) < len(PAGE) / 2
+    assert scraper.RESPONSE_CACHE.get("https://www.amazon.com/s?k=tv") is None
+
+
+def test_streamed_search_caches_complete_body(streaming):
+    products = scraper.run_async(scraper.async_searchAmazon("tv", 0, None, limit=50))
+    assert len(products) == 10
+    assert scraper.RESPONSE_CACHE.get("https://www.amazon.com/s?k=tv")[0] == PAGE
+    reads = len(streaming)
+    again = scraper.run_async(scraper.async_searchAmazon("tv", 0, None, limit=3))
+    assert len(again) == 3 and len(streaming) == reads
+
+
+def test_driver_streams_with_num(streaming):
+    df = scraper.driver("tv", None, num=1, sites=["amazon"])
+    assert df["title"].tolist() == ["Item 1 & more"]
+    assert sum(streaming) < len(PAGE)
+
+
+def test_sync_stream_page_stops_at_limit(streaming, monkeypatch):
+    reads = []
+
+    class Response:
+        status_code = 200
+        headers = {"Content-Type": "text/html"}
+
+        def iter_content(self, size):
+            for chunk in chunks(PAGE, 200):
+                reads.append(chunk)
+                yield chunk
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+    monkeypatch.setattr(scraper.SESSION, "get", lambda url, **kwargs: Response())
+    products = scraper.searchAmazon("tv", 0, None, limit=1)
+    assert [p["title"] for p in products] == ["Item 1 & more"]
+    assert len(reads) < len(chunks(PAGE, 200)) / 2
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from slash.src.modules.tracing import Tracer, span, record_span, traced, in_current_span, write_chrome_trace
+from slash.src.modules.scheduler import Scheduler
+
+
+def names(node):
+    return [node["name"], [names(child) for child in node["children"]]]
+
+
+def test_spans_nest_under_the_trace():
+    tracer = Tracer()
+    with tracer.trace("driver", force=True, query="tv") as root:
+        with span("site", concurrent=True, site="amazon"):
+            with span("fetch"):
+                pass
+            with span("parse") as parse:
+                parse.set(bytes=10)
+    tree = tracer.traces()[0].tree()
+    assert names(tree["spans"][0]) == ["driver", [["site", [["fetch", []], ["parse", []]]]]]
+    assert tree["spans"][0]["attrs"] == {"query": "tv"}
+    assert root.trace is tracer.traces()[0]
+
+
+def test_unsampled_searches_are_not_traced():
+    tracer = Tracer(sample_rate=0)
+    with tracer.trace("driver") as root:
+        with span("site") as child:
+            record_span("dns", 0, 1)
+    assert root is None and child is None
+    assert tracer.traces() == []
+
+
+def test_nested_trace_becomes_a_span():
+    tracer = Tracer()
+    with tracer.trace("search", force=True):
+        with tracer.trace("driver"):
+            pass
+    assert len(tracer.traces()) == 1
+    assert names(tracer.traces()[0].tree()["spans"][0]) == ["search", [["driver", []]]]
+
+
+def test_span_records_errors():
+    tracer = Tracer()
+    try:
+        with tracer.trace("driver", force=True):
+            with span("fetch"):
+                raise ConnectionError("reset")
+    except ConnectionError:
+        pass
+    fetch = tracer.traces()[0].tree()["spans"][0]["children"][0]
+    assert fetch["attrs"]["error"] == "ConnectionError('reset')"
+
+
+def test_traced_decorator():
+    tracer = Tracer()
+
+    @traced("db.get_user")
+    def get_user():
+        return "user"
+    assert get_user() == "user"
+    with tracer.trace("search", force=True):
+        get_user()
+    assert names(tracer.traces()[0].tree()["spans"][0]) == ["search", [["db.get_user", []]]]
+
+
+def test_spans_follow_tasks_and_blocking_calls():
+    tracer = Tracer()
+    scheduler = Scheduler()
+
+    def parse():
+        with span("parse"):
+            return "page"
+
+    async def site(name):
+        with span("site", concurrent=True, site=name):
+            return await scheduler.run_blocking(parse)
+
+    async def search():
+        return await asyncio.gather(site("amazon"), site("walmart"))
+
+    with tracer.trace("driver", force=True):
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(in_current_span(search())) == ["page", "page"]
+        finally:
+            loop.close()
+    root = tracer.traces()[0].tree()["spans"][0]
+    assert [names(child) for child in root["children"]] == [["site", [["parse", []]]]] * 2
+
+
+def test_chrome_trace_export(tmp_path):
+    tracer = Tracer()
+    with tracer.trace("driver", force=True):
+        with span("site", concurrent=True, site="amazon"):
+            with span("fetch"):
+                pass
+    path = tmp_path / "trace.json"
+    write_chrome_trace(tracer.traces(), str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["driver", "site", "fetch"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    driver_event, site_event, fetch_event = events
+    assert site_event["tid"] == fetch_event["tid"] != driver_event["tid"]
+    assert site_event["args"]["site"] == "amazon"
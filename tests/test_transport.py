@@ -0,0 +1,83 @@
+import asyncio
+import time
+import pytest
+import requests
+from email.utils import formatdate
+from slash.src.modules.transport import RetryPolicy, TokenBucket, RateLimiter, Transport, parse_retry_after
+from slash.src.modules import scraper
+from .fakes import FakeResponse
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(attempts=10, backoff=0.1, max_backoff=0.5)
+    for attempt in range(9):
+        assert 0 <= policy.delay(attempt) <= min(0.1 * 2 ** attempt, 0.5)
+    assert policy.delay(9) is None
+
+
+def test_retry_after_is_honored_up_to_a_limit():
+    policy = RetryPolicy(max_retry_after=5)
+    assert policy.delay(0, "2") == 2
+    assert policy.delay(0, "60") is None
+    assert 0 < parse_retry_after(formatdate(time.time() + 3, usegmt=True)) <= 3
+    assert parse_retry_after("soon") is None
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.02)
+
+
+def test_rate_limits_are_per_host():
+    limiter = RateLimiter(default_rate=(1, 1), host_rates={"target.com": (100, 5)})
+    assert limiter.reserve("https://www.amazon.com/s?k=a") == 0
+    assert limiter.reserve("https://www.amazon.com/s?k=b") > 0
+    assert limiter.reserve("https://www.walmart.com/search?q=a") == 0
+    assert all(limiter.reserve("https://redsky.target.com/x") == 0 for _ in range(5))
+
+
+def test_fetch_retries_throttled_and_failed_requests(monkeypatch):
+    responses = [FakeResponse(b"{}", 429, {"Retry-After": "0"}), requests.ConnectionError("reset"),
+                 FakeResponse(b"{}", 200)]
+
+    def fake_get(url, **kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    transport = Transport(RetryPolicy(attempts=3, backoff=0), RateLimiter())
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", None)
+    monkeypatch.setattr(scraper, "TRANSPORT", transport)
+    monkeypatch.setattr(scraper.SESSION, "get", fake_get)
+    assert scraper.fetch("https://www.amazon.com/s?k=tv").status_code == 200
+    assert transport.stats()["retries"] == 2
+
+
+def test_fetch_gives_up_after_the_last_attempt(monkeypatch):
+    calls = []
+
+    def fake_get(url, **kwargs):
+        calls.append(url)
+        return FakeResponse(b"{}", 503)
+    monkeypatch.setattr(scraper, "RESPONSE_CACHE", None)
+    monkeypatch.setattr(scraper, "TRANSPORT", Transport(RetryPolicy(attempts=2, backoff=0)))
+    monkeypatch.setattr(scraper.SESSION, "get", fake_get)
+    assert scraper.fetch("https://www.amazon.com/s?k=tv").status_code == 503
+    assert len(calls) == 2
+
+
+def test_async_request_retries_connection_errors():
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise asyncio.TimeoutError()
+        return FakeResponse(b"{}", 200)
+    transport = Transport(RetryPolicy(attempts=3, backoff=0))
+    assert asyncio.run(transport.async_request("https://www.bjs.com/", send)).status_code == 200
+    with pytest.raises(asyncio.TimeoutError):
+        attempts.clear()
+        asyncio.run(Transport(RetryPolicy(attempts=2, backoff=0)).async_request("https://www.bjs.com/", send))